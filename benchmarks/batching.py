@@ -0,0 +1,92 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+"""Record handoff benchmark
+
+Compares the per-record cost, on the event loop, of handing records over to
+a consumer through an ``asyncio.Queue``, one record at a time, with handing
+them over in batches through :class:`target_datadotworld.batching.BatchQueue`.
+
+Usage::
+
+    python benchmarks/batching.py --records 1000000
+"""
+import asyncio
+import time
+
+import click
+
+from target_datadotworld.batching import BatchQueue
+from target_datadotworld.utils import to_chunks
+
+
+async def record_queue(records, batch_size, loop):
+    queue = asyncio.Queue(maxsize=batch_size)
+
+    async def consume():
+        chunk = []
+        while True:
+            record = await queue.get()
+            queue.task_done()
+            if record is None:
+                break
+            chunk.append(record)
+            if len(chunk) == batch_size:
+                chunk = []
+
+    consumer = loop.create_task(consume())
+    for i in range(records):
+        await queue.put(i)
+    await queue.put(None)
+    await consumer
+
+
+async def batch_queue(records, batch_size, loop):
+    queue = BatchQueue(batch_size, loop=loop)
+
+    async def consume():
+        async for _ in to_chunks(queue, batch_size):  # noqa: F841
+            pass
+
+    consumer = loop.create_task(consume())
+    for i in range(records):
+        if queue.full():
+            await queue.put(i)
+        else:
+            queue.put_nowait(i)
+    queue.close()
+    await consumer
+
+
+@click.command()
+@click.option('--records', default=1000000, help='Number of records')
+@click.option('--batch-size', default=1000, help='Records per batch')
+def benchmark(records, batch_size):
+    loop = asyncio.get_event_loop()
+    for label, handoff in (('asyncio.Queue', record_queue),
+                           ('BatchQueue', batch_queue)):
+        start = time.perf_counter()
+        loop.run_until_complete(handoff(records, batch_size, loop))
+        elapsed = time.perf_counter() - start
+        click.echo('{:14} {:8.0f} ns/record'.format(
+            label + ':', elapsed / records * 1e9))
+    loop.close()
+
+
+if __name__ == '__main__':
+    benchmark()
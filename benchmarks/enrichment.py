@@ -0,0 +1,83 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+"""Record enrichment benchmark
+
+Compares the per-record cost, on the event loop, of enriching records with
+``singer_timestamp`` and ``singer_version`` as they are queued with queuing
+them as pending records, as well as the cost of enriching them in batches.
+
+Usage::
+
+    python benchmarks/enrichment.py --records 1000000
+"""
+import time
+
+import click
+from singer import utils
+
+from target_datadotworld.enrichment import PendingRecord, enrich
+
+
+def enrich_on_loop(records, time_extracted):
+    for record in records:
+        record.update({
+            'singer_timestamp': utils.strftime(
+                time_extracted or utils.now()),
+            'singer_version': 1
+        })
+
+
+def queue_pending(records, time_extracted):
+    return [PendingRecord(record, None, time_extracted, time.time(), 1)
+            for record in records]
+
+
+def measure(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+@click.command()
+@click.option('--records', default=1000000, help='Number of records')
+@click.option('--batch-size', default=1000, help='Records per batch')
+def benchmark(records, batch_size):
+    time_extracted = utils.now()
+    for label, extracted in (('time_extracted', time_extracted),
+                             ('time received', None)):
+        before, _ = measure(enrich_on_loop,
+                            [{'id': i} for i in range(records)], extracted)
+        after, pending = measure(queue_pending,
+                                 [{'id': i} for i in range(records)],
+                                 extracted)
+        batches, _ = measure(lambda: [
+            enrich(pending[i:i + batch_size])
+            for i in range(0, records, batch_size)])
+
+        click.echo('{}:'.format(label))
+        click.echo('  on loop, before: {:8.0f} ns/record'.format(
+            before / records * 1e9))
+        click.echo('  on loop, after:  {:8.0f} ns/record'.format(
+            after / records * 1e9))
+        click.echo('  in workers:      {:8.0f} ns/record'.format(
+            batches / records * 1e9))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,192 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+"""Synthetic Singer tap
+
+Emits SCHEMA, RECORD, STATE and ACTIVATE_VERSION messages for any number
+of streams, to load the target at scale. Output is deterministic for a
+given seed.
+
+Usage::
+
+    python benchmarks/generate_tap.py --streams 5 --rows 2000000 \\
+        | target-datadotworld -c config.json
+"""
+import json
+import random
+from datetime import datetime, timedelta
+
+import click
+
+FIELD_TYPES = ['string', 'integer', 'number', 'boolean', 'date-time']
+WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur',
+         'adipiscing', 'elit', 'sed', 'do', 'eiusmod', 'tempor']
+START_TIME = datetime(2017, 11, 8)
+POOL_SIZE = 256  # Distinct values per field
+
+
+def field_schema(field_type):
+    if field_type == 'date-time':
+        return {'type': ['null', 'string'], 'format': 'date-time'}
+    return {'type': ['null', field_type]}
+
+
+def nested_schema(depth, width):
+    properties = {'level': {'type': 'integer'}}
+    for i in range(width):
+        properties['field_{}'.format(i)] = field_schema(
+            FIELD_TYPES[i % len(FIELD_TYPES)])
+    if depth > 1:
+        properties['child'] = nested_schema(depth - 1, width)
+    return {'type': 'object', 'properties': properties}
+
+
+def stream_schema(width, depth):
+    schema = nested_schema(depth + 1, width)
+    schema['properties']['id'] = {'type': 'integer'}
+    schema['properties']['updated_at'] = field_schema('date-time')
+    del schema['properties']['level']
+    return schema
+
+
+class StreamGenerator(object):
+    def __init__(self, name, rng, width, depth, duplicate_rate):
+        self.name = name
+        self.version = rng.randrange(1, 1 << 40)
+        self._rng = rng
+        self._width = width
+        self._depth = depth
+        self._duplicate_rate = duplicate_rate
+        self._next_id = 0
+        self._time = START_TIME
+        self._names = ['field_{}'.format(i) for i in range(width)]
+        # Field values are drawn from pools, for speed
+        self._pools = [[random_value(rng, FIELD_TYPES[i % len(FIELD_TYPES)])
+                        for _ in range(POOL_SIZE)]
+                       for i in range(width * (depth + 1))]
+
+    def schema_message(self):
+        return {'type': 'SCHEMA', 'stream': self.name,
+                'schema': stream_schema(self._width, self._depth),
+                'key_properties': ['id'],
+                'bookmark_properties': ['updated_at']}
+
+    def version_message(self):
+        return {'type': 'ACTIVATE_VERSION', 'stream': self.name,
+                'version': self.version}
+
+    def record_message(self):
+        rng = self._rng
+        if self._next_id > 0 and rng.random() < self._duplicate_rate:
+            record_id = rng.randrange(self._next_id)
+        else:
+            record_id = self._next_id
+            self._next_id += 1
+
+        self._time += timedelta(milliseconds=rng.randrange(1000))
+        timestamp = '{}Z'.format(self._time.isoformat())
+        choices = iter(rng.getrandbits(
+            8 * len(self._pools)).to_bytes(len(self._pools), 'little'))
+
+        record = self._fields(self._depth, choices)
+        record['id'] = record_id
+        record['updated_at'] = timestamp
+        del record['level']
+        return {'type': 'RECORD', 'stream': self.name, 'record': record,
+                'version': self.version, 'time_extracted': timestamp}
+
+    def _fields(self, depth, choices):
+        pools = self._pools
+        offset = (self._depth - depth) * self._width
+        fields = {'level': depth}
+        for i, name in enumerate(self._names):
+            fields[name] = pools[offset + i][next(choices)]
+        if depth > 0:
+            fields['child'] = self._fields(depth - 1, choices)
+        return fields
+
+
+def random_value(rng, field_type):
+    if field_type == 'string':
+        return ' '.join(rng.choice(WORDS) for _ in range(rng.randrange(1, 6)))
+    elif field_type == 'integer':
+        return rng.randrange(-1 << 31, 1 << 31)
+    elif field_type == 'number':
+        return round(rng.uniform(-1e6, 1e6), 4)
+    elif field_type == 'boolean':
+        return rng.random() < 0.5
+    else:
+        return '{}Z'.format((START_TIME + timedelta(
+            seconds=rng.randrange(1 << 26))).isoformat())
+
+
+@click.command()
+@click.option('--streams', default=1, help='Number of streams')
+@click.option('--rows', default=10000, help='Records per stream')
+@click.option('--width', default=10,
+              help='Fields per record (and per nested object)')
+@click.option('--depth', default=0, help='Levels of nested objects')
+@click.option('--duplicate-rate', default=0.0,
+              help='Fraction of records repeating the key of an earlier one')
+@click.option('--state-every', default=10000,
+              help='Records between STATE messages')
+@click.option('--full-table/--incremental', default=True,
+              help='Wrap each stream in ACTIVATE_VERSION messages')
+@click.option('--seed', default=0, help='Seed of the random generator')
+@click.option('--output', type=click.File('w'), default='-',
+              help='Path to output file (default: stdout)')
+def generate(streams, rows, width, depth, duplicate_rate, state_every,
+             full_table, seed, output):
+    rng = random.Random(seed)
+    generators = [StreamGenerator('stream_{}'.format(i), rng, width, depth,
+                                  duplicate_rate)
+                  for i in range(streams)]
+    remaining = {g.name: rows for g in generators}
+    dumps = json.JSONEncoder(separators=(', ', ': ')).encode
+    write = output.write
+
+    def emit(message):
+        write(dumps(message) + '\n')
+
+    for g in generators:
+        emit(g.schema_message())
+        if full_table:
+            emit(g.version_message())
+
+    bookmarks = {}
+    active = list(generators) if rows > 0 else []
+    count = 0
+    while active:
+        g = rng.choice(active)
+        message = g.record_message()
+        emit(message)
+        bookmarks[g.name] = message['time_extracted']
+
+        remaining[g.name] -= 1
+        if remaining[g.name] == 0:
+            active.remove(g)
+            if full_table:
+                emit(g.version_message())
+
+        count += 1
+        if count % state_every == 0 or not active:
+            emit({'type': 'STATE', 'value': {'bookmarks': dict(bookmarks)}})
+
+
+if __name__ == '__main__':
+    generate()
@@ -0,0 +1,113 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+"""Offline pipeline benchmark
+
+Runs a Singer stream (e.g. produced by ``generate_tap.py``) through
+``process_lines`` end to end, writing batches to a local sink rather than
+data.world, and reports throughput.
+
+Usage::
+
+    python benchmarks/generate_tap.py --streams 4 --rows 250000 \\
+        --output input.jsonl
+    python benchmarks/pipeline.py input.jsonl --passthrough
+    python benchmarks/pipeline.py input.jsonl --event-loop uvloop
+"""
+import asyncio
+import logging
+import tempfile
+import time
+
+import click
+
+from target_datadotworld import logger
+from target_datadotworld.target import TargetDataDotWorld
+from target_datadotworld.utils import read_file_blocks, new_event_loop, \
+    EVENT_LOOPS
+from target_datadotworld.validation import VALIDATION_MODES
+
+API_TOKEN = ('eyJhbGciOiJIUzUxMiJ9.eyJzdWIiOiJwcm9kLXVzZXItY2xpZW50OnJhZmFlb'
+             'CIsImlzcyI6ImFnZW50OnJhZmFlbDo6YjY1NTgxODItMjRkNy00MWZiLTkxNTA'
+             'tNjZlNDBhNjNjNjQ5IiwiaWF0IjoxNTA1MTY0NTQ4LCJyb2xlIjpbInVzZXJfY'
+             'XBpX3JlYWQiLCJ1c2VyX2FwaV93cml0ZSJdLCJnZW5lcmFsLXB1cnBvc2UiOnR'
+             'ydWV9.n9FsdsBZ03wx0A-QK1wq2tGyinaqUcjaotp-rnWCMoMOY83ivypuB3Fcj'
+             'TGzJPFIGZbJsES_bx0itijwz5mQvg')
+
+
+@click.command()
+@click.argument('input_file', type=click.File('rb'))
+@click.option('--batch-size', default=1000, help='Records per batch')
+@click.option('--validation-mode', type=click.Choice(VALIDATION_MODES),
+              default='full')
+@click.option('--passthrough', is_flag=True, default=False,
+              help='Keep the JSON text of records as received')
+@click.option('--compress', is_flag=True, default=False,
+              help='Compress batches written to the sink')
+@click.option('--latency', default=0.0,
+              help='Simulated latency of each operation, in seconds')
+@click.option('--sink-dir', type=click.Path(file_okay=False),
+              help='Directory where batches are written '
+                   '(default: a temporary directory)')
+@click.option('--event-loop', type=click.Choice(EVENT_LOOPS),
+              default='asyncio', help='Event loop implementation')
+def benchmark(input_file, batch_size, validation_mode, passthrough,
+              compress, latency, sink_dir, event_loop):
+    logging.getLogger('singer').setLevel(logging.WARNING)
+    logger.setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = {
+            'api_token': API_TOKEN,
+            'dataset_owner': 'owner',
+            'dataset_id': 'dataset',
+            'validation_mode': validation_mode,
+            'passthrough_records': passthrough,
+            'sink_dir': sink_dir or tmp,
+            'sink_compress': compress,
+            'sink_latency': latency
+        }
+        target = TargetDataDotWorld(config, batch_size=batch_size)
+
+        lines = 0
+
+        async def count(blocks):
+            nonlocal lines
+            async for block in blocks:
+                lines += len(block)
+                yield block
+
+        loop = new_event_loop(event_loop)
+
+        async def run():
+            # Reads input as the CLI does
+            return [s async for s in target.process_lines(
+                count(read_file_blocks(input_file, loop=loop)), loop=loop)]
+
+        asyncio.set_event_loop(loop)
+        start = time.perf_counter()
+        states = loop.run_until_complete(run())
+        elapsed = time.perf_counter() - start
+        loop.close()
+
+    click.echo('{} lines, {} states in {:.2f}s: {:.0f} lines/s'.format(
+        lines, len(states), elapsed, lines / elapsed))
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,118 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+"""Input reading benchmark
+
+Compares reading (and, optionally, parsing) a large Singer stream line by
+line through Python's text I/O layer with reading it in binary blocks on a
+thread, as the target does, using
+:func:`target_datadotworld.utils.read_file_blocks`.
+
+Usage::
+
+    python benchmarks/read_lines.py --size-gb 2 --parse
+"""
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+
+import click
+import singer
+
+from target_datadotworld.utils import read_file_blocks
+
+
+def write_input(path, size):
+    record = {'id': 0, 'name': 'Lorem ipsum dolor sit amet',
+              'updated_at': '2017-11-08T00:00:00.000000Z', 'price': 12.5,
+              'active': True, 'description': 'é' * 64}
+    lines = []
+    for i in range(10000):
+        record['id'] = i
+        lines.append(json.dumps({'type': 'RECORD', 'stream': 'products',
+                                 'record': record}))
+    block = ('\n'.join(lines) + '\n').encode('utf-8')
+
+    with open(path, 'wb') as f:
+        written = 0
+        while written < size:
+            f.write(block)
+            written += len(block)
+    return written
+
+
+def consume(lines, parse):
+    count = 0
+    if parse:
+        for line in lines:
+            singer.parse_message(line)
+            count += 1
+    else:
+        for _ in lines:
+            count += 1
+    return count
+
+
+async def consume_blocks(blocks, parse):
+    count = 0
+    async for block in blocks:
+        count += consume(block, parse)
+    return count
+
+
+@click.command()
+@click.option('--size-gb', default=2.0, help='Size of the generated input')
+@click.option('--block-size', default=1 << 20,
+              help='Block size used by read_file_blocks, in bytes')
+@click.option('--parse', is_flag=True, default=False,
+              help='Parse lines into Singer messages')
+@click.option('--dir', 'directory', type=click.Path(exists=True),
+              help='Directory where the input is generated')
+def benchmark(size_gb, block_size, parse, directory):
+    fd, path = tempfile.mkstemp(suffix='.jsonl', dir=directory)
+    os.close(fd)
+    try:
+        size = write_input(path, int(size_gb * (1 << 30)))
+        click.echo('Generated {:.2f} GB of input'.format(size / (1 << 30)))
+
+        with open(path, 'rb') as f:
+            start = time.perf_counter()
+            count = consume(io.TextIOWrapper(f, encoding='utf-8'), parse)
+            text_time = time.perf_counter() - start
+
+        loop = asyncio.new_event_loop()
+        with open(path, 'rb') as f:
+            start = time.perf_counter()
+            loop.run_until_complete(consume_blocks(
+                read_file_blocks(f, loop=loop, block_size=block_size),
+                parse))
+            binary_time = time.perf_counter() - start
+        loop.close()
+    finally:
+        os.remove(path)
+
+    for name, elapsed in (('text', text_time), ('binary', binary_time)):
+        click.echo('{:>6}: {:8.2f}s {:10.1f} MB/s {:12.0f} lines/s'.format(
+            name, elapsed, size / (1 << 20) / elapsed, count / elapsed))
+
+
+if __name__ == '__main__':
+    benchmark()
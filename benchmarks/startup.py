@@ -0,0 +1,135 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+"""Cold-start benchmark
+
+Measures, over fresh interpreters, the time it takes to import the CLI
+and the time from launching ``target-datadotworld`` until its first
+upload reaches a local stand-in for data.world's API.
+
+Usage::
+
+    python benchmarks/startup.py --runs 10 --output startup.json
+"""
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from os import path
+
+import click
+
+ROOT_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, path.join(ROOT_DIR, 'tests'))
+
+from stub_api import StubApiServer  # noqa: E402
+
+API_TOKEN = ('eyJhbGciOiJIUzUxMiJ9.eyJzdWIiOiJwcm9kLXVzZXItY2xpZW50OnJhZmFlb'
+             'CIsImlzcyI6ImFnZW50OnJhZmFlbDo6YjY1NTgxODItMjRkNy00MWZiLTkxNTA'
+             'tNjZlNDBhNjNjNjQ5IiwiaWF0IjoxNTA1MTY0NTQ4LCJyb2xlIjpbInVzZXJfY'
+             'XBpX3JlYWQiLCJ1c2VyX2FwaV93cml0ZSJdLCJnZW5lcmFsLXB1cnBvc2UiOnR'
+             'ydWV9.n9FsdsBZ03wx0A-QK1wq2tGyinaqUcjaotp-rnWCMoMOY83ivypuB3Fcj'
+             'TGzJPFIGZbJsES_bx0itijwz5mQvg')
+
+
+def measure_import():
+    start = time.perf_counter()
+    subprocess.check_call(
+        [sys.executable, '-c', 'import target_datadotworld.cli'])
+    return time.perf_counter() - start
+
+
+def measure_first_upload(stub, config_file, input_file):
+    del stub.requests[:]
+    del stub.request_times[:]
+
+    start = time.time()
+    subprocess.check_call(
+        [sys.executable, '-m', 'target_datadotworld.cli',
+         '-c', config_file, '--file', input_file],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    end = time.time()
+
+    uploads = [t for (method, url, _, _), t in
+               zip(stub.requests, stub.request_times)
+               if method == 'POST' and url.startswith('/v0/streams/')]
+    return uploads[0] - start, end - start
+
+
+def summarize(samples):
+    return {
+        'median': statistics.median(samples),
+        'min': min(samples),
+        'max': max(samples)
+    }
+
+
+@click.command()
+@click.option('--runs', default=10, help='Number of measurements')
+@click.option('--output', type=click.File('w'),
+              help='Path to file where results are written as JSON')
+@click.option('--max-import-time', type=float,
+              help='Fail if the median import time, in seconds, is higher')
+@click.option('--max-first-upload-time', type=float,
+              help='Fail if the median time to first upload, in seconds, '
+                   'is higher')
+def startup(runs, output, max_import_time, max_first_upload_time):
+    import_times = [measure_import() for _ in range(runs)]
+
+    with StubApiServer() as stub, tempfile.TemporaryDirectory() as tmp:
+        stub.bodies['/v0/datasets/owner/dataset'] = {'status': 'LOADED'}
+
+        config_file = path.join(tmp, 'config.json')
+        with open(config_file, 'w') as f:
+            json.dump({'api_token': API_TOKEN, 'api_url': stub.url,
+                       'dataset_owner': 'owner', 'dataset_id': 'dataset',
+                       'disable_collection': True}, f)
+
+        input_file = path.join(ROOT_DIR, 'tests', 'fixtures', 'fixerio.jsonl')
+        first_upload_times, total_times = zip(*[
+            measure_first_upload(stub, config_file, input_file)
+            for _ in range(runs)])
+
+    results = {
+        'import_time': summarize(import_times),
+        'time_to_first_upload': summarize(first_upload_times),
+        'total_time': summarize(total_times)
+    }
+    click.echo(json.dumps(results, indent=2))
+    if output is not None:
+        json.dump(results, output, indent=2)
+
+    failed = False
+    if (max_import_time is not None and
+            results['import_time']['median'] > max_import_time):
+        click.echo('Import time above {}s'.format(max_import_time), err=True)
+        failed = True
+    if (max_first_upload_time is not None and
+            results['time_to_first_upload']['median'] >
+            max_first_upload_time):
+        click.echo('Time to first upload above {}s'.format(
+            max_first_upload_time), err=True)
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    startup()
@@ -69,6 +69,9 @@ setup(
         'requests>=2.4.0,<3.0a',
         'singer-python>=5.0.4,<6.0a',
     ],
+    extras_require={
+        'uvloop': ['uvloop>=0.9.1'],
+    },
     setup_requires=[
         'pytest-runner>=2.11,<3.0a',
     ],
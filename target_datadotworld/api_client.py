@@ -18,6 +18,7 @@
 # data.world, Inc.(http://data.world/).
 import functools
 import gzip
+from collections import OrderedDict
 from concurrent.futures import ThreadPoolExecutor
 from time import sleep
 
@@ -27,11 +28,20 @@ from requests.adapters import HTTPAdapter, BaseAdapter
 from requests.exceptions import RequestException
 from singer import metrics
 from target_datadotworld import logger
-from target_datadotworld.exceptions import convert_requests_exception
+from target_datadotworld.exceptions import convert_requests_exception, \
+    PayloadTooLargeError, RecordTooLargeError
+from target_datadotworld.journal import batch_digest
+from target_datadotworld.memory import chunk_bytes
+from target_datadotworld.scheduler import UploadScheduler
+from target_datadotworld.tracing import measure
 from target_datadotworld.utils import to_chunks, to_jsonlines, to_table_name
 
 MAX_TRIES = 10  # necessary to configure backoff decorator
 
+#: Number of batches of each stream, at most, submitted for upload at once
+#: (i.e. one uploading and the next waiting for its turn)
+MAX_PENDING_BATCHES = 2
+
 
 class ApiClient(object):
     def __init__(self, api_token, **kwargs):
@@ -47,6 +57,10 @@ class ApiClient(object):
         self._conn_timeout = kwargs.get('connect_timeout', 3.05)
         self._read_timeout = kwargs.get('read_timeout', 600)
         self._max_threads = kwargs.get('max_threads', 10)
+        self._memory_tracker = kwargs.get('memory_tracker')
+        self._max_payload_bytes = kwargs.get('max_payload_bytes')
+        self._journal = kwargs.get('upload_journal')
+        self._tracer = kwargs.get('tracer')
 
         self._session = requests.Session()
         default_headers = {
@@ -65,6 +79,12 @@ class ApiClient(object):
         self._executor = ThreadPoolExecutor(
             max_workers=self._max_threads
         )
+        # Shares the thread pool fairly among streams
+        self._scheduler = UploadScheduler(
+            self._executor, self._max_threads,
+            weights=kwargs.get('stream_weights'),
+            limit=kwargs.get('concurrency_limit'),
+            breaker=kwargs.get('circuit_breaker'))
 
     def connection_check(self):
         """Verify network connectivity
@@ -80,9 +100,12 @@ class ApiClient(object):
             except RequestException as e:
                 raise convert_requests_exception(e)
 
-    def append_stream(self, owner, dataset, stream, records):
+    def append_stream(self, owner, dataset, stream, records, trace=None):
         """Append records to a stream in a data.world dataset
 
+        Batches that are too large for a single request are split in halves,
+        recursively, until they fit.
+
         :param owner: User or organization ID of the owner of the dataset
         :type owner: str
         :param dataset: Dataset ID
@@ -91,9 +114,63 @@ class ApiClient(object):
         :type stream: str
         :param records: Objects to be appended to the stream
         :type records: iterable
+        :param trace: Trace of the batch, if traced
+        :type trace: BatchTrace
 
         :raises ApiError: Failure invoking data.world API
+        :raises RecordTooLargeError: Record too large to be uploaded
+        """
+        with measure(trace, 'serialize'):
+            data = to_jsonlines(records).encode('utf-8')
+        if self._memory_tracker is not None:
+            self._memory_tracker.add(stream, 'serialized', len(data))
+        try:
+            splits = self._append_lines(owner, dataset, stream, data, None,
+                                        trace)
+        finally:
+            if self._memory_tracker is not None:
+                self._memory_tracker.remove(stream, 'serialized', len(data))
+
+        if splits > 0:
+            with metrics.Counter(
+                    'batch_splits', tags={'stream': stream}) as counter:
+                counter.increment(splits)
+
+    def _append_lines(self, owner, dataset, stream, data, lines,
+                      trace=None):
+        """Post JSON lines, splitting them in halves if too large
+
+        :returns: Number of splits performed
+        :rtype: int
         """
+        try:
+            with measure(trace, 'http_request', bytes=len(data)):
+                self._post_lines(owner, dataset, stream, data)
+            return 0
+        except PayloadTooLargeError:
+            if lines is None:
+                lines = data.split(b'\n')
+            if len(lines) == 1:
+                raise RecordTooLargeError(stream, len(data))
+
+            logger.warning('Batch of {} records from {} stream too large. '
+                           'Splitting it in halves.'.format(
+                               len(lines), stream))
+            half = len(lines) // 2
+            splits = 1
+            for part in (lines[:half], lines[half:]):
+                splits += self._append_lines(
+                    owner, dataset, stream, b'\n'.join(part), part, trace)
+            return splits
+
+    def _post_lines(self, owner, dataset, stream, data):
+        if (self._max_payload_bytes is not None and
+                len(data) > self._max_payload_bytes):
+            raise PayloadTooLargeError(
+                None, None,
+                cause='Payload of {} bytes exceeds maximum of {}'.format(
+                    len(data), self._max_payload_bytes))
+
         with metrics.http_request_timer('append') as t:
             t.tags['stream'] = stream
 
@@ -101,7 +178,7 @@ class ApiClient(object):
                 self._session.post(
                     '{}/streams/{}/{}/{}'.format(
                         self._api_url, owner, dataset, stream),
-                    data=to_jsonlines(records).encode('utf-8'),
+                    data=data,
                     headers={'Content-Type':
                              'application/json-l; charset=utf-8'}
                 ).raise_for_status()
@@ -119,47 +196,146 @@ class ApiClient(object):
         :param stream: Stream ID
         :type stream: str
         :param queue: Queue with objects to be appended to the stream
-        :type queue: asyncio.Queue
+        :type queue: BatchQueue
         :param chunk_size: Chunk or batch size
         :type chunk_size: int
 
-        :raises ApiError: Failure invoking data.world API
+        :raises ApiError: Failure invoking data.world API, raised once the
+            next batch is ready, leaving the rest of the queue unconsumed
         """
         with metrics.Counter(
                 'batch_count', tags={'stream': stream}) as counter:
 
-            delayed_exception = None
             # noinspection PyTypeChecker
-            pending_task = None
-            async for chunk in to_chunks(queue, chunk_size):
-                if delayed_exception is None:
+            pending_tasks = OrderedDict()  # By batch number
+            try:
+                async for chunk in to_chunks(queue, chunk_size):
+                    if self._memory_tracker is not None:
+                        self._memory_tracker.move(
+                            stream, 'queued', 'batched', chunk_bytes(chunk))
+
                     try:
                         logger.info('Uploading {} records in batch #{} '
                                     'from {} stream '.format(
                                         len(chunk), counter.value, stream))
 
-                        if pending_task is not None:
-                            # Sequentially processes chunks of the same stream
-                            await pending_task
+                        trace = (self._tracer.start_batch(stream, len(chunk))
+                                 if self._tracer is not None else None)
+
+                        while len(pending_tasks) >= MAX_PENDING_BATCHES:
+                            # Uploaded one at a time, in order, by the
+                            # scheduler, with the next one waiting its turn
+                            await pending_tasks.popitem(last=False)[1]
+
+                        if self._journal is not None:
+                            # Before records are enriched, which changes
+                            # them in place, even if the upload is retried
+                            sequence = self._journal.next_sequence(stream)
+                            digest = batch_digest(chunk)
+                        else:
+                            sequence, digest = None, None
 
                         # Call API on separate thread
                         # Parallel processes different streams
-                        pending_task = loop.run_in_executor(
-                            self._executor,
-                            functools.partial(self.append_stream,
-                                              owner, dataset, stream, chunk)
-                        )
+                        if trace is not None:
+                            trace.submitted()
+                        pending_tasks[counter.value] = loop.create_task(
+                            self._upload_batch(
+                                owner, dataset, stream, chunk, sequence,
+                                digest, trace, counter.value, pending_tasks,
+                                loop))
                         counter.increment()
-                    except Exception as e:
-                        delayed_exception = e
-                else:
-                    pass  # Must exhaust queue
+                    except BaseException:
+                        self._release_batch(stream, chunk)
+                        raise  # Fail fast, leaving the queue to the caller
+
+                while len(pending_tasks) > 0:
+                    await pending_tasks.popitem(last=False)[1]
+            finally:
+                for task in pending_tasks.values():
+                    if task.done() and not task.cancelled():
+                        task.exception()  # Not needed anymore
+                    else:
+                        task.cancel()
+
+    async def _upload_batch(self, owner, dataset, stream, chunk, sequence,
+                            digest, trace, number, pending_tasks, loop):
+        try:
+            # Retried by the scheduler, if it has a circuit breaker
+            await self._scheduler.submit(
+                stream,
+                functools.partial(self._append_batch, owner, dataset,
+                                  stream, chunk, sequence, digest, trace),
+                loop=loop)
+        except Exception:
+            # Later batches must not be uploaded ahead of this one
+            for later, task in pending_tasks.items():
+                if later > number:
+                    task.cancel()
+            raise
+        finally:
+            self._release_batch(stream, chunk)
+            if trace is not None:
+                trace.finish()
+
+    def _append_batch(self, owner, dataset, stream, chunk, sequence=None,
+                      digest=None, trace=None):
+        if trace is not None:
+            trace.started()
+        if self._journal is None:
+            self.append_stream(owner, dataset, stream, chunk, trace)
+            if trace is not None:
+                trace.uploaded()
+            return
+
+        if self._journal.is_acknowledged(stream, sequence, digest):
+            logger.info('Skipping batch #{} from {} stream, uploaded '
+                        'before restart'.format(sequence, stream))
+            if trace is not None:
+                trace.uploaded()
+            return
+        self.append_stream(owner, dataset, stream, chunk, trace)
+        if trace is not None:
+            trace.uploaded()
+        self._journal.acknowledge(stream, sequence, digest)
+
+    def _release_batch(self, stream, chunk):
+        if self._memory_tracker is not None:
+            self._memory_tracker.remove(stream, 'batched', chunk_bytes(chunk))
+
+    def upload_file(self, owner, dataset, name, file_path):
+        """Upload a file to a data.world dataset, replacing existing ones
+
+        :param owner: User or organization ID of the owner of the dataset
+        :type owner: str
+        :param dataset: Dataset ID
+        :type dataset: str
+        :param name: Name of the file in the dataset
+        :type name: str
+        :param file_path: Path to the local file to be uploaded
+        :type file_path: str
+
+        :returns: Response object
+        :rtype: object
 
-            if pending_task is not None:
-                await pending_task
+        :raises ApiError: Failure invoking data.world API
+        """
+        with metrics.http_request_timer('upload_file') as t:
+            t.tags['file'] = name
 
-            if delayed_exception is not None:
-                raise delayed_exception
+            try:
+                with open(file_path, 'rb') as f:
+                    resp = self._session.put(
+                        '{}/uploads/{}/{}/files/{}'.format(
+                            self._api_url, owner, dataset, name),
+                        data=f,
+                        headers={'Content-Type': 'application/octet-stream'},
+                        timeout=(self._conn_timeout, self._read_timeout)
+                    )
+                resp.raise_for_status()
+                return resp.json()
+            except RequestException as e:
+                raise convert_requests_exception(e)
 
     def create_dataset(self, owner, dataset, **kwargs):
         """Create a new dataset
@@ -235,7 +411,7 @@ class ApiClient(object):
                 resp = self._session.get(
                     '{}/sql/{}/{}'.format(self._api_url, owner, dataset),
                     params={
-                        'query': 'SELECT * '
+                        'query': 'SELECT singer_version '
                                  'FROM `{}`.`{}`.`{}` '
                                  'LIMIT 1'.format(
                                      owner, dataset, to_table_name(stream))},
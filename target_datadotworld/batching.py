@@ -0,0 +1,137 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import asyncio
+from collections import deque
+
+
+class BatchQueue(object):
+    def __init__(self, batch_size, max_batches=1, loop=None, linger=None):
+        """Queue of records, handed over to its consumer in batches
+
+        Records are added synchronously, without switching coroutines, and
+        the consumer is only woken up once a batch is full, has lingered for
+        ``linger`` seconds since its first record, or the queue is closed.
+        Producers wait for the consumer once ``max_batches`` batches are
+        pending.
+
+        :param batch_size: Number of records per batch
+        :type batch_size: int
+        :param max_batches: Number of batches pending, at most, before
+            producers have to wait
+        :type max_batches: int
+        :param linger: Time, in seconds, after which a partial batch is
+            handed over (default: never, until closed)
+        :type linger: float
+        """
+        self._batch_size = batch_size
+        self._max_batches = max_batches
+        self._loop = loop or asyncio.get_event_loop()
+        self._linger = linger
+        self._linger_timer = None
+        self._batch = []
+        self._ready = deque()
+        self._closed = False
+        self._getter = None
+        self._putter = None
+
+    @property
+    def batch_size(self):
+        return self._batch_size
+
+    @property
+    def linger(self):
+        return self._linger
+
+    def full(self):
+        return len(self._ready) >= self._max_batches
+
+    def put_nowait(self, record):
+        """Add a record, regardless of how many batches are pending"""
+        self._batch.append(record)
+        if len(self._batch) >= self._batch_size:
+            self._hand_over()
+        elif self._linger is not None and self._linger_timer is None:
+            self._linger_timer = self._loop.call_later(
+                self._linger, self._hand_over)
+
+    async def put(self, record):
+        """Add a record, once there is room for it"""
+        while self.full():
+            self._putter = self._loop.create_future()
+            await self._putter
+        self.put_nowait(record)
+
+    def close(self):
+        """Hand over the last, partial batch and signal the end of records"""
+        self._hand_over()
+        self._closed = True
+        self._wake_getter()
+
+    def discard(self):
+        """Close the queue, returning records not handed over
+
+        :returns: Records left behind
+        :rtype: list
+        """
+        records = [r for batch in self._ready for r in batch] + self._batch
+        self._ready.clear()
+        self._batch = []
+        self._cancel_linger()
+        self._closed = True
+        self._wake_getter()
+        self._wake_putter()
+        return records
+
+    async def get_batch(self):
+        """Wait for the next batch
+
+        :returns: Records in the batch or None, once closed and emptied
+        :rtype: list
+        """
+        while len(self._ready) == 0:
+            if self._closed:
+                return None
+            self._getter = self._loop.create_future()
+            await self._getter
+
+        batch = self._ready.popleft()
+        self._wake_putter()
+        return batch
+
+    def _hand_over(self):
+        self._cancel_linger()
+        if len(self._batch) > 0:
+            self._ready.append(self._batch)
+            self._batch = []
+            self._wake_getter()
+
+    def _cancel_linger(self):
+        if self._linger_timer is not None:
+            self._linger_timer.cancel()
+            self._linger_timer = None
+
+    def _wake_getter(self):
+        if self._getter is not None and not self._getter.done():
+            self._getter.set_result(None)
+        self._getter = None
+
+    def _wake_putter(self):
+        if self._putter is not None and not self._putter.done():
+            self._putter.set_result(None)
+        self._putter = None
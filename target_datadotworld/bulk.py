@@ -0,0 +1,100 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import gzip
+import os
+import tempfile
+
+from target_datadotworld import logger
+from target_datadotworld.memory import chunk_bytes
+from target_datadotworld.utils import to_chunks, to_jsonlines, to_table_name
+
+COMPRESSION_LEVEL = 6
+
+
+class BulkLoad(object):
+    def __init__(self, stream_id, directory=None, memory_tracker=None):
+        """Compressed local file holding all records of a full-table load
+
+        :param stream_id: Stream ID
+        :type stream_id: str
+        :param directory: Directory where the file is created
+            (default: system's temporary directory)
+        :type directory: str
+        :param memory_tracker: Accounts for records waiting to be written
+        :type memory_tracker: MemoryTracker
+        """
+        self.stream_id = stream_id
+        self._memory_tracker = memory_tracker
+        self.record_count = 0
+
+        fd, self.path = tempfile.mkstemp(
+            prefix='{}-'.format(stream_id), suffix='.jsonl.gz',
+            dir=directory)
+        self._file = gzip.GzipFile(fileobj=os.fdopen(fd, 'wb'), mode='wb',
+                                   compresslevel=COMPRESSION_LEVEL)
+        self._fileobj = self._file.fileobj
+
+    @property
+    def filename(self):
+        """Name of the uploaded file, matching the stream's table name"""
+        return '{}.jsonl.gz'.format(to_table_name(self.stream_id))
+
+    def write(self, records):
+        """Append records to the file
+
+        :param records: Objects to be written
+        :type records: list
+        """
+        self._file.write((to_jsonlines(records) + '\n').encode('utf-8'))
+        self.record_count += len(records)
+
+    async def write_chunked(self, queue, chunk_size, loop):
+        """Asynchronously write records to the file, off the event loop
+
+        :param queue: Queue with objects to be written
+        :type queue: BatchQueue
+        :param chunk_size: Chunk or batch size
+        :type chunk_size: int
+        """
+        async for chunk in to_chunks(queue, chunk_size):
+            if self._memory_tracker is None:
+                await loop.run_in_executor(None, self.write, chunk)
+                continue
+
+            nbytes = chunk_bytes(chunk)
+            self._memory_tracker.move(self.stream_id, 'queued', 'batched',
+                                      nbytes)
+            try:
+                await loop.run_in_executor(None, self.write, chunk)
+            finally:
+                self._memory_tracker.remove(self.stream_id, 'batched',
+                                            nbytes)
+
+    def close(self):
+        self._file.close()
+        self._fileobj.close()
+        logger.info('Wrote {} records from {} stream to {}'.format(
+            self.record_count, self.stream_id, self.path))
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+            self._fileobj.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,137 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+
+from target_datadotworld import logger
+
+
+class FileCache(object):
+    def __init__(self, path, ttl=None):
+        """Small key/value cache persisted as a JSON file between runs
+
+        Values are written through to the file as soon as they are set.
+        Processes may share the file: writes are serialized with a lock
+        file next to it, and merged with entries written by others, which
+        are read again once the file changes.
+
+        :param path: Path to the cache file
+        :type path: str
+        :param ttl: Time, in seconds, after which entries expire
+            (default: never)
+        :type ttl: float
+        """
+        self._path = path
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._version = None
+        self._load()
+
+    def get(self, key, default=None):
+        with self._lock:
+            self._load()
+        entry = self._entries.get(key)
+        if entry is None or (self._ttl is not None and
+                             time.time() - entry['time'] > self._ttl):
+            return default
+        return entry['value']
+
+    def set(self, key, value):
+        with self._locked():
+            if (key in self._entries and
+                    self._entries[key]['value'] == value and
+                    self._ttl is None):
+                return
+            self._entries[key] = {'value': value, 'time': time.time()}
+            self._save()
+
+    def delete(self, key):
+        with self._locked():
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold the cache exclusively, with entries as last saved by anyone
+
+        The lock is taken on a file of its own, as the cache file itself is
+        replaced on every save
+        """
+        with self._lock, open(self._path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._load(force=True)
+            yield
+
+    def _load(self, force=False):
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            return
+        # Files are replaced on save, so changes show in their inode
+        version = (stat.st_ino, stat.st_mtime_ns)
+        if version == self._version and not force:
+            return
+        self._version = version
+
+        try:
+            with open(self._path) as f:
+                self._entries = json.load(f)
+        except (ValueError, OSError) as e:
+            logger.warning('Ignoring unreadable cache file {} '
+                           '(Cause: {})'.format(self._path, e))
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self._path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self._path)
+        stat = os.stat(self._path)
+        self._version = (stat.st_ino, stat.st_mtime_ns)
+
+
+class MemoryCache(object):
+    def __init__(self, ttl=None):
+        """Key/value cache held in memory, for long-running processes
+
+        :param ttl: Time, in seconds, after which entries expire
+            (default: never)
+        :type ttl: float
+        """
+        self._ttl = ttl
+        self._entries = {}
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None or (self._ttl is not None and
+                             time.time() - entry[1] > self._ttl):
+            return default
+        return entry[0]
+
+    def set(self, key, value):
+        self._entries[key] = (value, time.time())
+
+    def delete(self, key):
+        self._entries.pop(key, None)
@@ -20,15 +20,15 @@
 import asyncio
 import json
 import logging
+import signal
+import threading
 import warnings
-from concurrent.futures import ThreadPoolExecutor
 
 import click
 
 from target_datadotworld import logger
 from target_datadotworld.exceptions import Error
-from target_datadotworld.singer_analytics import send_usage_stats
-from target_datadotworld.target import TargetDataDotWorld
+from target_datadotworld.utils import read_file_blocks, new_event_loop
 
 
 async def echo_states(state_gen):
@@ -43,32 +43,51 @@ async def echo_states(state_gen):
               type=click.File('r'),
               help='Path to config file')
 @click.option('--debug', is_flag='True', default=False)
-@click.option('--file', type=click.File('r'),
+@click.option('--file', type=click.File('rb'),
               help='Path to file, if not using stdin')
+@click.option('--daemon', metavar='SOCKET',
+              help='Run as a daemon, accepting Singer streams over a Unix '
+                   'socket at this path')
 @click.pass_context
-def cli(ctx, config, debug, file):
-    loop = asyncio.get_event_loop()
-
+def cli(ctx, config, debug, file, daemon):
     if debug:
         logger.setLevel(logging.DEBUG)
         warnings.simplefilter('default')
-        loop.set_debug(debug)
 
+    loop = None
     # noinspection PyBroadException
     try:
         config_obj = json.load(config)
 
+        loop = new_event_loop(config_obj.get('event_loop', 'asyncio'))
+        asyncio.set_event_loop(loop)
+        loop.set_debug(debug)
+
         if not config_obj.get('disable_collection', False):
             logger.info('Sending version information to singer.io. ' +
                         'To disable sending anonymous usage data, set ' +
                         'the config parameter "disable_collection" to true')
-            loop.run_in_executor(ThreadPoolExecutor(max_workers=1),
-                                 send_usage_stats)
-
-        target = TargetDataDotWorld(config_obj)
-        data_file = file or click.get_text_stream('stdin')
-
-        loop.run_until_complete(echo_states(target.process_lines(data_file)))
+            # Daemon thread, so that exiting never waits for collection
+            threading.Thread(target=_send_usage_stats, daemon=True).start()
+
+        # Deferred imports keep start up fast when failing early
+        if daemon is not None:
+            from target_datadotworld.daemon import TargetDaemon
+            target_daemon = TargetDaemon(config_obj)
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(sig, target_daemon.stop)
+            loop.run_until_complete(target_daemon.serve(daemon, loop=loop))
+        else:
+            if config_obj.get('worker_processes', 1) > 1:
+                from target_datadotworld.sharding import ShardedTarget
+                target = ShardedTarget(config_obj)
+            else:
+                from target_datadotworld.target import TargetDataDotWorld
+                target = TargetDataDotWorld(config_obj)
+            data_file = file or click.get_binary_stream('stdin')
+
+            loop.run_until_complete(echo_states(target.process_lines(
+                read_file_blocks(data_file, loop=loop), loop=loop)))
 
     except Error as e:
         logger.fatal(e.message)
@@ -77,10 +96,16 @@ def cli(ctx, config, debug, file):
         logger.fatal('Unexpected failure', exc_info=True)
         ctx.exit(1)
     finally:
-        loop.close()
+        if loop is not None:
+            loop.close()
 
     logger.info('Exiting normally')
 
 
+def _send_usage_stats():
+    from target_datadotworld.singer_analytics import send_usage_stats
+    send_usage_stats()
+
+
 if __name__ == '__main__':
     cli()
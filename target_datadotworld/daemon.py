@@ -0,0 +1,127 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import asyncio
+import itertools
+import json
+import os
+import stat
+
+from target_datadotworld import logger
+from target_datadotworld.cache import FileCache, MemoryCache
+from target_datadotworld.exceptions import Error
+from target_datadotworld.target import TargetDataDotWorld
+from target_datadotworld.utils import read_line_blocks
+
+#: Options that only apply to single runs of the target
+UNSUPPORTED_OPTIONS = ('worker_processes', 'upload_journal',
+                       'memory_accounting', 'trace_file')
+
+
+class TargetDaemon(object):
+    def __init__(self, config, **kwargs):
+        """Long-running target, accepting Singer streams over a Unix socket
+
+        Every connection is a session, processed independently of others
+        by its own :class:`TargetDataDotWorld`. Sessions share the API client
+        (and, with it, connections and upload threads) and knowledge of
+        which datasets were recently found in good state, so that they
+        don't pay for start up and dataset checks every time.
+
+        Clients send Singer messages and then shut down their side of the
+        connection. The daemon responds with a STATE message for every state
+        committed and, if the session fails, an ERROR message with a
+        ``message`` describing the failure, before closing the connection.
+        """
+        self._config = {k: v for k, v in config.items()
+                        if k not in UNSUPPORTED_OPTIONS}
+        for option in UNSUPPORTED_OPTIONS:
+            if option in config:
+                logger.warning('Ignoring {} option, not supported in '
+                               'daemon mode'.format(option))
+
+        self._target_kwargs = kwargs
+        ttl = self._config.get('dataset_cache_ttl', 300)
+        self._dataset_cache = (
+            FileCache(self._config['dataset_cache'], ttl=ttl)
+            if 'dataset_cache' in self._config else MemoryCache(ttl=ttl))
+        self._api_client = TargetDataDotWorld(
+            self._config, dataset_cache=self._dataset_cache,
+            **kwargs).api_client
+        self._session_ids = itertools.count(1)
+        self._stopped = None
+
+    async def serve(self, path, loop=None):
+        """Accept sessions on a Unix socket, until stopped
+
+        :param path: Path of the socket
+        :type path: str
+        """
+        loop = loop or asyncio.get_event_loop()
+        self._stopped = loop.create_future()
+
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)  # Left behind by a previous daemon
+        server = await asyncio.start_unix_server(
+            self._handle_session, path=path)
+        logger.info('Accepting Singer streams on {}'.format(path))
+        try:
+            await self._stopped
+        finally:
+            server.close()
+            await server.wait_closed()
+            os.remove(path)
+
+    def stop(self):
+        """Stop accepting sessions"""
+        if self._stopped is not None and not self._stopped.done():
+            self._stopped.set_result(None)
+
+    async def _handle_session(self, reader, writer):
+        session = next(self._session_ids)
+        logger.info('Session #{} started'.format(session))
+
+        def respond(msg):
+            writer.write((json.dumps(msg) + '\n').encode('utf-8'))
+
+        # noinspection PyBroadException
+        try:
+            target = TargetDataDotWorld(
+                self._config, api_client=self._api_client,
+                dataset_cache=self._dataset_cache, **self._target_kwargs)
+            async for state in target.process_lines(
+                    read_line_blocks(reader)):
+                if state is not None:
+                    respond({'type': 'STATE', 'value': state})
+                    await writer.drain()
+            logger.info('Session #{} complete'.format(session))
+        except Error as e:
+            logger.error('Session #{} failed: {}'.format(
+                session, e.message))
+            respond({'type': 'ERROR', 'message': e.message})
+        except Exception as e:
+            logger.error('Unexpected failure in session #{}'.format(
+                session), exc_info=True)
+            respond({'type': 'ERROR', 'message': repr(e)})
+        finally:
+            writer.close()
+            if hasattr(writer, 'wait_closed'):  # Python 3.7+
+                try:
+                    await writer.wait_closed()
+                except ConnectionError:
+                    pass  # Client went away, with nothing left to flush
@@ -0,0 +1,95 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import time
+from collections import namedtuple
+
+from singer import utils
+
+from target_datadotworld.passthrough import splice
+
+#: Record queued for upload, to be enriched with singer fields when its
+#: batch is serialized. ``received_at`` (seconds since the epoch) stands in
+#: for ``time_extracted`` when the tap doesn't provide it, and ``size`` is
+#: the length of the message it was received in.
+PendingRecord = namedtuple('PendingRecord', [
+    'record', 'raw_record', 'time_extracted', 'received_at', 'version',
+    'size'])
+
+
+class TimestampFormatter(object):
+    def __init__(self):
+        """Formats singer timestamps, reusing work across a batch
+
+        Timestamps of records extracted at the same time are formatted
+        once, and times of reception share the formatting of whole seconds.
+        """
+        self._datetimes = {}
+        self._seconds = {}
+
+    def format_datetime(self, dt):
+        formatted = self._datetimes.get(dt)
+        if formatted is None:
+            formatted = self._datetimes[dt] = utils.strftime(dt)
+        return formatted
+
+    def format_time(self, t):
+        seconds = int(t)
+        microseconds = round((t - seconds) * 1e6)
+        if microseconds == 1000000:
+            seconds, microseconds = seconds + 1, 0
+
+        prefix = self._seconds.get(seconds)
+        if prefix is None:
+            prefix = self._seconds[seconds] = time.strftime(
+                '%Y-%m-%dT%H:%M:%S.', time.gmtime(seconds))
+        return '{}{:06d}Z'.format(prefix, microseconds)
+
+
+def enrich(records):
+    """Add singer_timestamp and singer_version to pending records
+
+    :param records: Records to be uploaded, pending or not
+    :type records: iterable
+
+    :returns: Records (dicts) or, in passthrough mode, their JSON text
+    :rtype: list
+    """
+    formatter = TimestampFormatter()
+    enriched = []
+    for r in records:
+        if not isinstance(r, PendingRecord):
+            enriched.append(r)
+            continue
+
+        if r.time_extracted is not None:
+            singer_timestamp = formatter.format_datetime(r.time_extracted)
+        else:
+            singer_timestamp = formatter.format_time(r.received_at)
+
+        if r.raw_record is not None:
+            enriched.append(
+                splice(r.raw_record, singer_timestamp, r.version))
+        else:
+            record = r.record
+            record.update({
+                'singer_timestamp': singer_timestamp,
+                'singer_version': r.version
+            })
+            enriched.append(record)
+    return enriched
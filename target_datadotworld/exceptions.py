@@ -26,6 +26,7 @@ def convert_requests_exception(req_exception):
         401: UnauthorizedError,
         403: ForbiddenError,
         404: NotFoundError,
+        413: PayloadTooLargeError,
         429: TooManyRequestsError
     }
 
@@ -41,6 +42,19 @@ def convert_requests_exception(req_exception):
         return req_exception
 
 
+def is_transient(error):
+    """Check whether a failure is likely to go away if retried later
+
+    Connection failures, timeouts, throttling (HTTP 429) and server errors
+    (HTTP 5xx) are considered transient
+    """
+    if isinstance(error, (ConnectionError, TooManyRequestsError,
+                          rqex.Timeout)):
+        return True
+    return (isinstance(error, ApiError) and error.status_code is not None and
+            error.status_code >= 500)
+
+
 class Error(Exception):
     """Base class for all custom exceptions"""
 
@@ -99,6 +113,8 @@ class UnparseableMessageError(Error):
     """
 
     def __init__(self, message, cause):
+        if isinstance(message, bytes):
+            message = message.decode('utf-8', errors='replace')
         super(UnparseableMessageError, self).__init__(
             'Unable to parse message {} (Cause: {})'.format(message, cause))
 
@@ -131,6 +147,31 @@ class InvalidDatasetStateError(Error):
                 owner, dataset))
 
 
+class RecordTooLargeError(Error):
+    """Record too large error
+
+    Used to indicate that a single record exceeds the maximum size of
+    requests accepted by data.world's API, and can't be uploaded
+    """
+
+    def __init__(self, stream, size):
+        super(RecordTooLargeError, self).__init__(
+            'Found record for stream {} too large to upload '
+            '({} bytes)'.format(stream, size))
+
+
+class WorkerError(Error):
+    """Worker process error
+
+    Used to indicate that a worker process, responsible for a subset of the
+    streams, failed
+    """
+
+    def __init__(self, worker, cause):
+        super(WorkerError, self).__init__(
+            'Worker #{} failed (Cause: {})'.format(worker, cause))
+
+
 class ApiError(Error):
     """Base class for all API exceptions"""
 
@@ -141,6 +182,7 @@ class ApiError(Error):
         except (ValueError, AttributeError):
             server_message = 'unspecified'
 
+        self.status_code = getattr(response, 'status_code', None)
         message = 'Error invoking {}: {}. {}. Server message: {}'.format(
             request.url if hasattr(request, 'url') else 'unspecified',
             cause, solution, server_message
@@ -201,6 +243,20 @@ class NotFoundError(ApiError):
             request, response, cause, solution)
 
 
+class PayloadTooLargeError(ApiError):
+    """Payload Too Large error
+
+    Used to indicate that the server returned an HTTP 413 error, or that a
+    request would exceed the configured maximum size
+    """
+
+    def __init__(self, request, response,
+                 cause='Payload too large',
+                 solution='Send less data per request'):
+        super(PayloadTooLargeError, self).__init__(
+            request, response, cause, solution)
+
+
 class TooManyRequestsError(ApiError):
     """Too Many Requests error
 
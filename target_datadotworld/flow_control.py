@@ -0,0 +1,160 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import time
+
+from singer import metrics
+
+from target_datadotworld import logger
+
+#: Latency, relative to the lowest seen, beyond which the API is considered
+#: to be slowing down under load
+LATENCY_TOLERANCE = 2.0
+
+#: Weight of the latest latency in its moving average
+LATENCY_SMOOTHING = 0.2
+
+
+class AdaptiveLimit(object):
+    def __init__(self, initial, minimum=1, maximum=None):
+        """Limit on concurrent uploads, adapted to latency and errors
+
+        The limit grows by one for every window of uploads that succeed
+        without slowing down, and shrinks by half on failures (i.e. additive
+        increase, multiplicative decrease). Uploads slow down once their
+        moving average latency exceeds ``LATENCY_TOLERANCE`` times the
+        lowest latency seen, which shrinks the limit gently.
+
+        :param initial: Initial limit
+        :type initial: int
+        :param minimum: Lowest limit
+        :type minimum: int
+        :param maximum: Highest limit (default: initial)
+        :type maximum: int
+        """
+        self._minimum = minimum
+        self._maximum = maximum if maximum is not None else initial
+        self._limit = float(initial)
+        self._baseline = None
+        self._average = None
+
+    @property
+    def value(self):
+        return int(self._limit)
+
+    def on_success(self, latency):
+        """Account for an upload that succeeded
+
+        :param latency: Time, in seconds, that the upload took
+        :type latency: float
+        """
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        self._average = (latency if self._average is None else
+                         LATENCY_SMOOTHING * latency +
+                         (1 - LATENCY_SMOOTHING) * self._average)
+
+        if self._average > LATENCY_TOLERANCE * self._baseline:
+            self._set(self._limit * 0.9)
+        else:
+            self._set(self._limit + 1 / self._limit)
+
+    def on_failure(self):
+        """Account for an upload that failed, but could be retried"""
+        self._set(self._limit / 2)
+
+    def _set(self, limit):
+        previous = self.value
+        self._limit = min(max(limit, self._minimum), self._maximum)
+        if self.value != previous:
+            logger.debug('Upload concurrency limit changed from {} to '
+                         '{}'.format(previous, self.value))
+
+
+class CircuitBreaker(object):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        """Circuit breaker pausing uploads while they keep failing
+
+        Once ``failure_threshold`` uploads fail in a row, the circuit opens
+        and no upload starts for ``cooldown`` seconds. Then, a single upload
+        is let through (i.e. half-open): the circuit closes if it succeeds,
+        or opens again if it fails.
+
+        :param failure_threshold: Number of consecutive failures that open
+            the circuit
+        :type failure_threshold: int
+        :param cooldown: Time, in seconds, that the circuit stays open
+        :type cooldown: float
+        """
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.state = CircuitBreaker.CLOSED
+
+    def allow(self):
+        """Check whether an upload can start, claiming the probe if half-open
+
+        :rtype: bool
+        """
+        if self.state == CircuitBreaker.CLOSED:
+            return True
+        if self.state == CircuitBreaker.OPEN and self.retry_after() == 0:
+            logger.info('Retrying uploads after pause')
+            self.state = CircuitBreaker.HALF_OPEN
+        if self.state == CircuitBreaker.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def retry_after(self):
+        """Time, in seconds, until uploads can be retried"""
+        if self.state != CircuitBreaker.OPEN:
+            return 0
+        return max(0.0, self._opened_at + self._cooldown - time.monotonic())
+
+    def on_success(self):
+        if self.state != CircuitBreaker.CLOSED:
+            logger.info('Uploads recovered')
+        self._failures = 0
+        self._probing = False
+        self.state = CircuitBreaker.CLOSED
+
+    def on_cancelled(self):
+        """Account for an upload cancelled, or failed for reasons other
+        than the API's health"""
+        self._probing = False
+
+    def on_failure(self):
+        self._failures += 1
+        self._probing = False
+        if (self.state == CircuitBreaker.HALF_OPEN or
+                self._failures >= self._failure_threshold):
+            if self.state != CircuitBreaker.OPEN:
+                logger.warning('{} uploads failed in a row. Pausing uploads '
+                               'for {} seconds.'.format(self._failures,
+                                                        self._cooldown))
+                with metrics.Counter('circuit_breaker_opened') as counter:
+                    counter.increment()
+            self.state = CircuitBreaker.OPEN
+            self._opened_at = time.monotonic()
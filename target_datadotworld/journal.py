@@ -0,0 +1,143 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import hashlib
+import json
+import os
+import threading
+
+import simplejson
+
+from target_datadotworld import logger
+from target_datadotworld.enrichment import PendingRecord
+
+
+class UploadJournal(object):
+    def __init__(self, path):
+        """Local record of batches acknowledged since the last emitted state
+
+        Batches of each stream are numbered in the order they are uploaded,
+        starting over at every checkpoint (i.e. once a state is emitted).
+        A run replaying the same input after a failure finds batches with
+        the same number and contents in the journal, and skips them. Once
+        a batch doesn't match, the rest of the stream is uploaded. Batches
+        handed over after lingering depend on timing, and may not match.
+
+        :param path: Path to the journal file
+        :type path: str
+        """
+        self._path = path
+        self._lock = threading.Lock()
+        self._acknowledged = {}
+        self._sequences = {}
+
+        try:
+            with open(path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._acknowledged.setdefault(entry['stream'], {})[
+                        entry['sequence']] = entry['hash']
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, OSError) as e:
+            # Likely the last entry, if interrupted while being written
+            logger.warning('Ignoring rest of unreadable journal file {} '
+                           '(Cause: {})'.format(path, e))
+
+        self._file = open(path, 'a')
+
+    def next_sequence(self, stream):
+        """Number the next batch of a stream"""
+        sequence = self._sequences.get(stream, 0)
+        self._sequences[stream] = sequence + 1
+        return sequence
+
+    def is_acknowledged(self, stream, sequence, digest):
+        """Check whether a batch was acknowledged before a restart
+
+        :param stream: Stream ID
+        :type stream: str
+        :param sequence: Number of the batch
+        :type sequence: int
+        :param digest: Digest of the batch's contents
+        :type digest: str
+        """
+        with self._lock:
+            entries = self._acknowledged.get(stream)
+            if entries is None:
+                return False
+            if entries.get(sequence) == digest:
+                return True
+
+            # Replay diverged from the journaled run
+            del self._acknowledged[stream]
+            return False
+
+    def acknowledge(self, stream, sequence, digest):
+        """Record that a batch was uploaded"""
+        with self._lock:
+            self._file.write(json.dumps({
+                'stream': stream, 'sequence': sequence,
+                'hash': digest}) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def discard(self, stream):
+        """Forget batches of a stream, e.g. if its records are truncated"""
+        with self._lock:
+            self._acknowledged.pop(stream, None)
+
+    def checkpoint(self):
+        """Start over, once all batches journaled are covered by a state"""
+        with self._lock:
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._acknowledged = {}
+            self._sequences = {}
+
+    def close(self):
+        self._file.close()
+
+
+def batch_digest(records):
+    """Compute a digest of a batch, as received, before it is enriched
+
+    Times of reception are left out, so that replayed batches match
+
+    :param records: Records in the batch, pending or not
+    :type records: list
+
+    :returns: Hex digest
+    :rtype: str
+    """
+    digest = hashlib.sha1()
+    for r in records:
+        if isinstance(r, PendingRecord):
+            line = '{}|{}|{}'.format(
+                r.raw_record if r.raw_record is not None
+                else simplejson.dumps(r.record, sort_keys=True),
+                r.version, r.time_extracted)
+        elif isinstance(r, str):
+            line = r
+        else:
+            line = simplejson.dumps(r, sort_keys=True)
+        digest.update(line.encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
@@ -0,0 +1,183 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import os
+import threading
+import tracemalloc
+from collections import defaultdict
+
+from singer import metrics
+
+from target_datadotworld import logger
+
+#: Stages where records are buffered, in order
+STAGES = ('queued', 'batched', 'serialized')
+
+
+def current_rss():
+    """Resident set size of the current process, in bytes
+
+    Falls back to the peak resident set size where /proc is not available
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        import sys
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Reported in kilobytes, except on macOS
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def chunk_bytes(chunk):
+    """Estimated size of a chunk of records, as received by the target"""
+    return sum(getattr(r, 'size', 0) for r in chunk)
+
+
+class MemoryTracker(object):
+    def __init__(self, sample_interval=1.0, trace=False):
+        """Accounts for records buffered by stream and stage
+
+        Buffered bytes are estimates, based on the size of records as
+        received. Process RSS is sampled in the background and, when
+        tracing, a tracemalloc snapshot is taken whenever RSS peaks.
+
+        :param sample_interval: Time, in seconds, between RSS samples
+        :type sample_interval: float
+        :param trace: If True, attribute peaks to lines of code with
+            tracemalloc (expensive)
+        :type trace: bool
+        """
+        self._sample_interval = sample_interval
+        self._trace = trace
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = None
+
+        self._buffered = defaultdict(int)  # By (stream, stage)
+        self._peaks = defaultdict(int)
+        self._total = 0
+        self._peak_total = 0
+        self._peak_rss = 0
+        self._at_peak_rss = {}
+        self._snapshot = None
+
+    def add(self, stream, stage, nbytes):
+        with self._lock:
+            key = (stream, stage)
+            self._buffered[key] += nbytes
+            self._peaks[key] = max(self._peaks[key], self._buffered[key])
+            self._total += nbytes
+            self._peak_total = max(self._peak_total, self._total)
+
+    def remove(self, stream, stage, nbytes):
+        self.add(stream, stage, -nbytes)
+
+    def move(self, stream, source, target, nbytes):
+        with self._lock:
+            self._buffered[(stream, source)] -= nbytes
+            self._total -= nbytes
+        self.add(stream, target, nbytes)
+
+    def start(self):
+        if self._trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._stopped.clear()
+        self._sampler = threading.Thread(target=self._sample_rss,
+                                         name='memory-sampler', daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        self.sample()
+        if self._trace and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def sample(self):
+        rss = current_rss()
+        if rss <= self._peak_rss:
+            return
+        with self._lock:
+            self._peak_rss = rss
+            self._at_peak_rss = {k: v for k, v in self._buffered.items()
+                                 if v > 0}
+        if self._trace and tracemalloc.is_tracing():
+            self._snapshot = tracemalloc.take_snapshot()
+
+    def _sample_rss(self):
+        while not self._stopped.wait(self._sample_interval):
+            self.sample()
+
+    def report(self):
+        """Peak usage observed so far
+
+        :returns: Peak RSS, peak of buffered bytes overall and by stream
+            and stage, bytes buffered by stream and stage when RSS peaked
+            and, when tracing, top allocation sites at that time
+        :rtype: dict
+        """
+        with self._lock:
+            report = {
+                'peak_rss': self._peak_rss,
+                'peak_buffered': self._peak_total,
+                'peak_buffered_by_stream': {},
+                'buffered_at_peak_rss': {}
+            }
+            for (stream, stage), peak in self._peaks.items():
+                report['peak_buffered_by_stream'].setdefault(
+                    stream, {})[stage] = peak
+            for (stream, stage), nbytes in self._at_peak_rss.items():
+                report['buffered_at_peak_rss'].setdefault(
+                    stream, {})[stage] = nbytes
+
+        if self._snapshot is not None:
+            report['top_allocations'] = [
+                (str(stat.traceback), stat.size) for stat in
+                self._snapshot.statistics('lineno')[:10]]
+        return report
+
+    def log_report(self):
+        """Log peak usage, in human-readable form and as metrics"""
+        report = self.report()
+
+        logger.info('Peak memory usage: {:.1f} MB RSS, {:.1f} MB in '
+                    'buffered records'.format(
+                        report['peak_rss'] / (1 << 20),
+                        report['peak_buffered'] / (1 << 20)))
+        for stream, stages in sorted(
+                report['peak_buffered_by_stream'].items()):
+            logger.info('Peak buffered bytes of {} stream: {}'.format(
+                stream, ', '.join('{} {}'.format(stage, stages[stage])
+                                  for stage in STAGES if stage in stages)))
+        for location, size in report.get('top_allocations', []):
+            logger.info('{:.1f} MB allocated at {}'.format(
+                size / (1 << 20), location))
+
+        metrics_logger = metrics.get_logger()
+        metrics.log(metrics_logger, metrics.Point(
+            'gauge', 'peak_rss_bytes', report['peak_rss'], {}))
+        for stream, stages in report['peak_buffered_by_stream'].items():
+            for stage, peak in stages.items():
+                metrics.log(metrics_logger, metrics.Point(
+                    'gauge', 'peak_buffered_bytes', peak,
+                    {'stream': stream, 'stage': stage}))
+        return report
@@ -0,0 +1,126 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import re
+from decimal import Decimal
+
+import simplejson
+import singer
+from singer import utils
+
+try:
+    # Same parser as singer.parse_message, when available
+    from ciso8601 import parse_datetime
+except ImportError:  # pragma: no cover
+    parse_datetime = utils.strptime_to_utc
+
+# Same number handling as singer.parse_message
+_scan_once = simplejson.JSONDecoder(parse_float=Decimal).scan_once
+# Opening brace or comma, followed by a key (without escapes) and a colon
+_MEMBER = re.compile(r'[ \t\n\r]*([{,])[ \t\n\r]*'
+                     r'"([^"\\]*)"[ \t\n\r]*:[ \t\n\r]*')
+_END = re.compile(r'[ \t\n\r]*}[ \t\n\r]*$')
+
+
+def parse_message(line):
+    """Parse a Singer message, keeping the original JSON text of records
+
+    The top-level object of the message is walked one member at a time,
+    so that the position of the record object in the line is known after
+    a single decoding pass. Lines that can't be walked this way (e.g. with
+    escaped keys) are left to singer.
+
+    :param line: JSON encoded Singer message
+    :type line: str or bytes
+
+    :returns: Message and, for record messages, the JSON text of the record
+    :rtype: tuple
+    """
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+
+    members = _decode_members(line)
+    if members is None:
+        # Unusual or invalid, for singer to parse or report
+        return singer.parse_message(line), None
+
+    obj, record_start, record_end = members
+    if (obj.get('type') != 'RECORD' or 'stream' not in obj or
+            not isinstance(obj.get('record'), dict)):
+        return singer.parse_message(line), None
+
+    time_extracted = obj.get('time_extracted')
+    if time_extracted:
+        try:
+            time_extracted = parse_datetime(time_extracted)
+        except (ValueError, OverflowError):
+            time_extracted = None
+
+    msg = singer.RecordMessage(stream=obj['stream'],
+                               record=obj['record'],
+                               version=obj.get('version'),
+                               time_extracted=time_extracted)
+    return msg, line[record_start:record_end]
+
+
+def splice(raw_record, singer_timestamp, singer_version):
+    """Add singer fields to the JSON text of a record, without re-encoding it
+
+    Parsing the result is equivalent to parsing the record and updating it
+    with the new fields, given that JSON parsers keep the last value of
+    repeated keys.
+
+    :param raw_record: JSON text of a record (an object)
+    :type raw_record: str
+    :param singer_timestamp: Value for the singer_timestamp field
+    :type singer_timestamp: str
+    :param singer_version: Value for the singer_version field
+    :type singer_version: object
+
+    :returns: JSON text of the record, including the new fields
+    :rtype: str
+    """
+    body = raw_record[:-1].rstrip()
+    separator = '' if body.endswith('{') else ', '
+    return '{}{}"singer_timestamp": {}, "singer_version": {}}}'.format(
+        body, separator, simplejson.dumps(singer_timestamp),
+        simplejson.dumps(singer_version))
+
+
+def _decode_members(line):
+    obj = {}
+    record_start = record_end = None
+    idx = 0
+    delimiter = '{'
+    while True:
+        match = _MEMBER.match(line, idx)
+        if match is None or match.group(1) != delimiter:
+            return None
+
+        key = match.group(2)
+        start = match.end()
+        try:
+            obj[key], idx = _scan_once(line, start)
+        except StopIteration:
+            return None
+        if key == 'record':
+            record_start, record_end = start, idx
+
+        if _END.match(line, idx):
+            return obj, record_start, record_end
+        delimiter = ','
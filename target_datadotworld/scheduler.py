@@ -0,0 +1,219 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+
+from singer import metrics
+from target_datadotworld import logger
+from target_datadotworld.exceptions import is_transient
+
+#: Number of times, at most, that an upload is attempted while the circuit
+#: breaker lets it be retried
+MAX_ATTEMPTS = 5
+
+
+class UploadScheduler(object):
+    def __init__(self, executor, max_concurrency, weights=None, limit=None,
+                 breaker=None):
+        """Weighted fair scheduler of uploads from multiple streams
+
+        Uploads are handed to the executor at most ``max_concurrency`` at a
+        time. Whenever a slot frees up, the next upload is taken from the
+        stream that, relative to its weight, has been served the least
+        (i.e. stride scheduling), so that busy streams can't hold back
+        others. Uploads of each stream run one at a time, in the order
+        submitted, so weights apply while more streams have uploads
+        waiting than there are slots.
+
+        :param executor: Executor where uploads run
+        :type executor: concurrent.futures.Executor
+        :param max_concurrency: Maximum number of uploads running at once
+        :type max_concurrency: int
+        :param weights: Share of upload slots of each stream, relative to
+            others (default: 1)
+        :type weights: dict
+        :param limit: Limit, adapted to latency and errors, on the number of
+            uploads running at once, up to ``max_concurrency``
+        :type limit: AdaptiveLimit
+        :param breaker: Circuit breaker pausing uploads while they keep
+            failing. If set, uploads that fail due to transient errors are
+            retried, up to ``MAX_ATTEMPTS`` times.
+        :type breaker: CircuitBreaker
+        """
+        self._executor = executor
+        self._max_concurrency = max_concurrency
+        self._weights = weights or {}
+        self._limit = limit
+        self._breaker = breaker
+        self._loop = None
+        self._wake_timer = None
+
+        self._waiting = {}  # Slots requested, by stream
+        self._busy = set()  # Streams with an upload running
+        self._passes = {}  # Service received, by stream
+        self._ready = []  # Heap of streams waiting for slots
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._running = 0
+
+    def weight(self, stream):
+        return self._weights.get(stream, 1)
+
+    async def submit(self, stream, fn, loop=None):
+        """Run a function on the executor, once the stream is granted a slot
+
+        :param stream: Stream ID
+        :type stream: str
+        :param fn: Function to be called with no arguments
+        :type fn: callable
+
+        :returns: Value returned by the function
+        """
+        loop = loop or asyncio.get_event_loop()
+        self._loop = loop
+
+        attempts = 1
+        slot = self._request(stream, loop)
+        while True:
+            await self._acquire(stream, slot)
+            started = time.monotonic()
+            try:
+                result = await loop.run_in_executor(self._executor, fn)
+            except asyncio.CancelledError:
+                self._on_cancelled()
+                self._release(stream)
+                raise
+            except Exception as e:
+                if not self._should_retry(stream, e, attempts):
+                    self._release(stream)
+                    raise
+                attempts += 1
+                # Ahead of later uploads of the stream
+                slot = self._request(stream, loop, first=True)
+                self._release(stream)
+            else:
+                self._on_success(time.monotonic() - started)
+                self._release(stream)
+                return result
+
+    def _request(self, stream, loop, first=False):
+        slot = loop.create_future()
+        waiting = self._waiting.setdefault(stream, deque())
+        if stream not in self._busy and len(waiting) == 0:
+            # Idle streams don't accumulate credit
+            self._passes[stream] = max(
+                self._passes.get(stream, 0.0), self._virtual_time)
+            self._push(stream)
+        if first:
+            waiting.appendleft(slot)
+        else:
+            waiting.append(slot)
+        self._dispatch()
+        return slot
+
+    async def _acquire(self, stream, slot):
+        with metrics.Timer('upload_queue_wait', {'stream': stream}):
+            try:
+                await slot
+            except asyncio.CancelledError:
+                if slot.done() and not slot.cancelled():
+                    self._on_cancelled()
+                    self._release(stream)
+                raise
+
+    def _on_success(self, latency):
+        if self._limit is not None:
+            self._limit.on_success(latency)
+        if self._breaker is not None:
+            self._breaker.on_success()
+
+    def _on_cancelled(self):
+        if self._breaker is not None:
+            self._breaker.on_cancelled()
+
+    def _should_retry(self, stream, error, attempts):
+        if not is_transient(error):
+            # Says nothing about the API's health, but may have been a probe
+            self._on_cancelled()
+            return False
+        if self._limit is not None:
+            self._limit.on_failure()
+        if self._breaker is None:
+            return False
+
+        self._breaker.on_failure()
+        if attempts >= MAX_ATTEMPTS:
+            return False
+        logger.warning('Upload from {} stream failed (attempt {} of {}). '
+                       'Retrying. (Cause: {})'.format(
+                           stream, attempts, MAX_ATTEMPTS, error))
+        with metrics.Counter('upload_retries',
+                             tags={'stream': stream}) as counter:
+            counter.increment()
+        return True
+
+    def _capacity(self):
+        if self._limit is not None:
+            return min(self._limit.value, self._max_concurrency)
+        return self._max_concurrency
+
+    def _push(self, stream):
+        heapq.heappush(self._ready, (self._passes[stream],
+                                     next(self._sequence), stream))
+
+    def _dispatch(self):
+        while self._running < self._capacity() and self._ready:
+            _, _, stream = self._ready[0]
+            waiting = self._waiting[stream]
+            if (self._breaker is not None and not waiting[0].cancelled() and
+                    not self._breaker.allow()):
+                self._wake_after(self._breaker.retry_after())
+                break
+
+            stream_pass, _, stream = heapq.heappop(self._ready)
+            slot = waiting.popleft()
+
+            if not slot.cancelled():
+                self._virtual_time = stream_pass
+                self._passes[stream] = stream_pass + 1 / self.weight(stream)
+                self._running += 1
+                self._busy.add(stream)
+                slot.set_result(None)
+            elif len(waiting) > 0:
+                self._push(stream)
+
+    def _wake_after(self, delay):
+        # Half-open circuits are woken up by the result of their probe
+        if delay > 0 and self._wake_timer is None:
+            self._wake_timer = self._loop.call_later(delay, self._wake)
+
+    def _wake(self):
+        self._wake_timer = None
+        self._dispatch()
+
+    def _release(self, stream):
+        self._running -= 1
+        self._busy.discard(stream)
+        if len(self._waiting[stream]) > 0:
+            # Waits its turn again, with others
+            self._push(stream)
+        self._dispatch()
@@ -0,0 +1,292 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import asyncio
+import functools
+import json
+import multiprocessing
+import queue
+import re
+import zlib
+from collections import deque
+
+import simplejson
+from target_datadotworld import logger
+from target_datadotworld.exceptions import Error, UnparseableMessageError, \
+    WorkerError
+from target_datadotworld.target import TargetDataDotWorld
+from target_datadotworld.utils import line_blocks, new_event_loop
+
+#: Number of lines sent to a worker at once
+LINES_PER_MESSAGE = 500
+
+#: Maximum number of messages waiting to be processed by a worker
+MAX_PENDING_MESSAGES = 20
+
+#: Leading type and stream members of messages, as written by singer-python
+MESSAGE_PREFIX = (r'\s*\{\s*"type"\s*:\s*"([A-Z_]+)"\s*,'
+                  r'\s*"stream"\s*:\s*"([^"\\]*)"')
+MESSAGE_PREFIX_RE = re.compile(MESSAGE_PREFIX)
+MESSAGE_PREFIX_BYTES_RE = re.compile(MESSAGE_PREFIX.encode('ascii'))
+
+#: Options for local files that each worker keeps its own of
+WORKER_FILE_OPTIONS = ('upload_journal', 'trace_file')
+
+
+class ShardedTarget(object):
+    def __init__(self, config, **kwargs):
+        """Singer target that partitions streams across worker processes
+
+        The parent process only routes lines, by stream name, to workers.
+        Each worker runs its own :class:`TargetDataDotWorld` (with its own
+        API client and session) and acknowledges every STATE message once
+        it has committed all records that preceded it. States are emitted
+        once acknowledged by all workers.
+        """
+        # Batches are journaled and traced by workers, each in files of
+        # their own
+        self._worker_files = {k: v for k, v in config.items()
+                              if k in WORKER_FILE_OPTIONS}
+        self._target = TargetDataDotWorld(
+            {k: v for k, v in config.items()
+             if k not in WORKER_FILE_OPTIONS},
+            **kwargs)
+        self._num_workers = self.config.get('worker_processes', 2)
+        self._mp_context = kwargs.get('mp_context',
+                                      multiprocessing.get_context())
+        self._worker_kwargs = {
+            k: v for k, v in kwargs.items() if k in ('batch_size',)}
+        self._lingering = (self.config.get('linger_seconds') is not None or
+                           len(self.config.get('stream_linger_seconds',
+                                               {})) > 0)
+
+        self._workers = []
+        self._inboxes = []
+        self._outbox = None
+        self._buffers = []
+        self._pending_states = deque()
+        self._acked_states = []
+        self._finished_workers = set()
+
+    @property
+    def config(self):
+        return self._target.config
+
+    async def process_lines(self, lines, loop=None):
+        loop = loop or asyncio.get_event_loop()
+        await self._target.prepare()
+        sync_trigger = self._target.sync_trigger()
+
+        self._start_workers()
+        try:
+            async for block in line_blocks(lines):
+                for line in block:
+                    msg = self._parse(line)
+                    if msg.get('type') == 'STATE':
+                        for worker in range(self._num_workers):
+                            self._buffers[worker].append(line)
+                            await self._flush(worker, loop)
+                        self._pending_states.append(msg.get('value'))
+                        states = list(self._collect_states())
+                        if len(states) > 0:
+                            sync_trigger.checkpoint(loop)
+                        for state in states:
+                            yield state
+                    else:
+                        if msg.get('type') == 'RECORD':
+                            sync_trigger.record_received()
+                        worker = shard_for(msg.get('stream'),
+                                           self._num_workers)
+                        self._buffers[worker].append(line)
+                        if len(self._buffers[worker]) >= LINES_PER_MESSAGE:
+                            await self._flush(worker, loop)
+
+                if self._lingering:
+                    # Lines must not wait for more input, so that partial
+                    # batches linger in workers only
+                    for worker in range(self._num_workers):
+                        await self._flush(worker, loop)
+
+            for worker in range(self._num_workers):
+                await self._flush(worker, loop)
+                await self._send(worker, None, loop)
+
+            # Waits in the executor, so that syncs in progress keep going
+            while len(self._finished_workers) < self._num_workers:
+                await loop.run_in_executor(
+                    None, functools.partial(self._receive, block=True))
+                states = list(self._collect_states())
+                if len(states) > 0:
+                    sync_trigger.checkpoint(loop)
+                for state in states:
+                    yield state
+
+            await sync_trigger.finish(loop)
+        except BaseException:
+            sync_trigger.cancel()
+            raise
+        finally:
+            self._stop_workers()
+
+    @staticmethod
+    def _parse(line):
+        """Parse a message, as far as needed to route it
+
+        Only the type and stream of messages starting with them are
+        extracted, leaving full parsing to workers, except for STATE
+        messages and messages in other shapes
+        """
+        if isinstance(line, bytes):
+            match = MESSAGE_PREFIX_BYTES_RE.match(line)
+            prefix = match and [g.decode('utf-8') for g in match.groups()]
+        else:
+            match = MESSAGE_PREFIX_RE.match(line)
+            prefix = match and match.groups()
+        if prefix and prefix[0] != 'STATE':
+            return {'type': prefix[0], 'stream': prefix[1]}
+
+        try:
+            return json.loads(line)
+        except (json.JSONDecodeError, simplejson.JSONDecodeError) as e:
+            raise UnparseableMessageError(line, str(e))
+
+    def _start_workers(self):
+        self._outbox = self._mp_context.Queue()
+        for worker in range(self._num_workers):
+            inbox = self._mp_context.Queue(maxsize=MAX_PENDING_MESSAGES)
+            process = self._mp_context.Process(
+                target=_run_worker,
+                args=(worker, self._worker_config(worker),
+                      self._worker_kwargs, inbox, self._outbox),
+                daemon=True)
+            process.start()
+            self._workers.append(process)
+            self._inboxes.append(inbox)
+            self._buffers.append([])
+            self._acked_states.append(0)
+
+    def _worker_config(self, worker):
+        return dict(self.config, **{
+            option: '{}.{}'.format(path, worker)
+            for option, path in self._worker_files.items()})
+
+    def _stop_workers(self):
+        for process in self._workers:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+    async def _flush(self, worker, loop):
+        if len(self._buffers[worker]) > 0:
+            await self._send(worker, self._buffers[worker], loop)
+            self._buffers[worker] = []
+
+    async def _send(self, worker, message, loop):
+        try:
+            self._inboxes[worker].put_nowait(message)
+        except queue.Full:
+            # Waits in the executor, so that syncs in progress keep going
+            await loop.run_in_executor(
+                None, functools.partial(self._put, worker, message))
+
+    def _put(self, worker, message):
+        while True:
+            try:
+                self._inboxes[worker].put(message, timeout=1)
+                return
+            except queue.Full:
+                # Surface worker failures instead of blocking forever
+                self._receive(block=False)
+                self._check_workers()
+
+    def _receive(self, block):
+        while True:
+            try:
+                event = self._outbox.get(block=block, timeout=1)
+            except queue.Empty:
+                if not block:
+                    return
+                self._check_workers()
+                continue
+
+            kind, worker = event[0], event[1]
+            if kind == 'state':
+                self._acked_states[worker] += 1
+            elif kind == 'done':
+                self._finished_workers.add(worker)
+            elif kind == 'error':
+                raise WorkerError(worker, event[2])
+
+            block = False
+
+    def _check_workers(self):
+        for worker, process in enumerate(self._workers):
+            if (worker not in self._finished_workers and
+                    not process.is_alive()):
+                raise WorkerError(worker, 'Process exited with code '
+                                          '{}'.format(process.exitcode))
+
+    def _collect_states(self):
+        """Pop states that have been acknowledged by all workers"""
+        self._receive(block=False)
+        while (len(self._pending_states) > 0 and
+               min(self._acked_states) > 0):
+            self._acked_states = [n - 1 for n in self._acked_states]
+            yield self._pending_states.popleft()
+
+
+def shard_for(stream, num_workers):
+    """Deterministically assign a stream to one of the worker processes"""
+    return zlib.crc32((stream or '').encode('utf-8')) % num_workers
+
+
+async def _worker_lines(inbox, loop):
+    while True:
+        try:
+            lines = inbox.get_nowait()
+        except queue.Empty:
+            # Waits in the executor, so that partial batches can linger
+            lines = await loop.run_in_executor(None, inbox.get)
+        if lines is None:
+            return
+        yield lines
+
+
+def _run_worker(worker, config, kwargs, inbox, outbox):
+    loop = new_event_loop(config.get('event_loop', 'asyncio'))
+    asyncio.set_event_loop(loop)
+
+    async def process(target):
+        async for _ in target.process_lines(  # noqa: F841
+                _worker_lines(inbox, loop), loop=loop):
+            outbox.put(('state', worker))
+
+    # noinspection PyBroadException
+    try:
+        target = TargetDataDotWorld(config, check_dataset=False,
+                                    sync_dataset=False, **kwargs)
+        loop.run_until_complete(process(target))
+        outbox.put(('done', worker))
+    except Error as e:
+        outbox.put(('error', worker, e.message))
+    except Exception as e:
+        logger.fatal('Unexpected failure in worker #{}'.format(worker),
+                     exc_info=True)
+        outbox.put(('error', worker, repr(e)))
+    finally:
+        loop.close()
@@ -19,7 +19,7 @@
 import requests
 import target_datadotworld
 from target_datadotworld import logger
-from requests import HTTPError
+from requests import RequestException
 
 
 def send_usage_stats():
@@ -34,5 +34,5 @@ def send_usage_stats():
                                 'se_la': version,
                             }, timeout=0.5)
         resp.raise_for_status()
-    except HTTPError:
+    except RequestException:
         logger.debug('Collection request failed')
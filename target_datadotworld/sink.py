@@ -0,0 +1,129 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import gzip
+import itertools
+import json
+import os
+import shutil
+import threading
+import time
+
+from singer import metrics
+
+from target_datadotworld.api_client import ApiClient
+from target_datadotworld.tracing import measure
+from target_datadotworld.utils import to_jsonlines
+
+
+class LocalSinkClient(ApiClient):
+    def __init__(self, api_token, directory, **kwargs):
+        """Stand-in for data.world's API that writes to a local directory
+
+        Each batch appended to a stream is written as a JSON lines file
+        under a directory named after the stream, and every operation is
+        acknowledged in ``acks.jsonl`` after a simulated latency. Used to
+        benchmark the target without network effects.
+
+        :param api_token: API Authorization Token (not used)
+        :type api_token: str
+        :param directory: Directory where batches are written
+        :type directory: str
+        :param compress: If True, batches are gzip compressed
+        :type compress: bool
+        :param latency: Time, in seconds, that each operation takes
+        :type latency: float
+        """
+        super(LocalSinkClient, self).__init__(api_token, **kwargs)
+        self._directory = directory
+        self._compress = kwargs.get('compress', False)
+        self._latency = kwargs.get('latency', 0)
+        self._lock = threading.Lock()
+        self._batch_numbers = itertools.count()
+
+        os.makedirs(directory, exist_ok=True)
+        self._acks = open(os.path.join(directory, 'acks.jsonl'), 'a')
+
+    def connection_check(self):
+        self._acknowledge('user')
+
+    def append_stream(self, owner, dataset, stream, records, trace=None):
+        with metrics.http_request_timer('append') as t:
+            t.tags['stream'] = stream
+
+            with measure(trace, 'serialize'):
+                data = (to_jsonlines(records) + '\n').encode('utf-8')
+            size = len(data)
+            if self._memory_tracker is not None:
+                self._memory_tracker.add(stream, 'serialized', size)
+            try:
+                stream_dir = os.path.join(self._directory, stream)
+                os.makedirs(stream_dir, exist_ok=True)
+                file_path = os.path.join(stream_dir, '{:08d}.jsonl'.format(
+                    next(self._batch_numbers)))
+                if self._compress:
+                    file_path += '.gz'
+                    data = gzip.compress(data)
+                # Stands in for the request, including simulated latency
+                with measure(trace, 'http_request', bytes=len(data)):
+                    with open(file_path, 'wb') as f:
+                        f.write(data)
+                    self._acknowledge('append', stream=stream,
+                                      file=file_path)
+            finally:
+                if self._memory_tracker is not None:
+                    self._memory_tracker.remove(stream, 'serialized', size)
+
+    def upload_file(self, owner, dataset, name, file_path):
+        shutil.copyfile(file_path, os.path.join(self._directory, name))
+        self._acknowledge('upload_file', file=name)
+        return {}
+
+    def create_dataset(self, owner, dataset, **kwargs):
+        self._acknowledge('create_dataset')
+        return {}
+
+    def get_dataset(self, owner, dataset):
+        self._acknowledge('dataset')
+        return {'status': 'LOADED'}
+
+    def get_current_version(self, owner, dataset, stream):
+        self._acknowledge('fetch_latest_version', stream=stream)
+        return None
+
+    def set_stream_schema(self, owner, dataset, stream, **kwargs):
+        self._acknowledge('set_stream_schema', stream=stream)
+        return {}
+
+    def sync(self, owner, dataset):
+        self._acknowledge('sync')
+        return {}
+
+    def truncate_stream_records(self, owner, dataset, stream):
+        shutil.rmtree(os.path.join(self._directory, stream),
+                      ignore_errors=True)
+        self._acknowledge('truncate_stream_records', stream=stream)
+        return {}
+
+    def _acknowledge(self, operation, **kwargs):
+        if self._latency > 0:
+            time.sleep(self._latency)
+        ack = dict(kwargs, operation=operation, time=time.time())
+        with self._lock:
+            self._acks.write(json.dumps(ack) + '\n')
+            self._acks.flush()
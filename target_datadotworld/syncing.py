@@ -0,0 +1,146 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import asyncio
+import time
+
+from singer import metrics
+
+from target_datadotworld import logger
+
+
+class SyncTrigger(object):
+    def __init__(self, sync, dataset_status, **kwargs):
+        """Triggers ingestion of uploaded records as replication progresses
+
+        Syncs are only started at checkpoints (i.e. once all records
+        received so far are acknowledged), never overlap and, optionally,
+        are followed by polling until ingestion completes.
+
+        :param sync: Function that triggers a sync of the dataset
+        :type sync: callable
+        :param dataset_status: Function that returns the dataset's status
+        :type dataset_status: callable
+        :param interval: Time, in seconds, after which a checkpoint
+            triggers a sync (default: never)
+        :type interval: float
+        :param record_count: Number of records after which a checkpoint
+            triggers a sync (default: never)
+        :type record_count: int
+        :param wait: If True, wait for ingestion after each sync and report
+            how long records took to become queryable
+        :type wait: bool
+        :param poll_interval: Time, in seconds, between status checks
+        :type poll_interval: float
+        :param wait_timeout: Time, in seconds, after which waiting for
+            ingestion is given up
+        :type wait_timeout: float
+        """
+        self._sync = sync
+        self._dataset_status = dataset_status
+        self._interval = kwargs.get('interval')
+        self._record_count = kwargs.get('record_count')
+        self._wait = kwargs.get('wait', False)
+        self._poll_interval = kwargs.get('poll_interval', 5)
+        self._wait_timeout = kwargs.get('wait_timeout', 600)
+
+        self._unsynced = 0
+        self._oldest_unsynced = None
+        self._last_sync = time.time()
+        self._in_flight = None
+
+    def record_received(self):
+        if self._unsynced == 0:
+            self._oldest_unsynced = time.time()
+        self._unsynced += 1
+
+    def checkpoint(self, loop):
+        """Start a sync, if due and none is in progress
+
+        Must only be called once records received so far are acknowledged
+        """
+        if self._in_flight is not None:
+            if not self._in_flight.done():
+                return  # Debounced, until the next checkpoint
+            self._in_flight.result()  # Fail fast
+            self._in_flight = None
+
+        if self._unsynced == 0:
+            return
+        if ((self._record_count is not None and
+                self._unsynced >= self._record_count) or
+                (self._interval is not None and
+                 time.time() - self._last_sync >= self._interval)):
+            self._in_flight = loop.create_task(self._start(loop))
+
+    async def finish(self, loop):
+        """Wait for any sync in progress and run a final one"""
+        if self._in_flight is not None:
+            await self._in_flight
+            self._in_flight = None
+        await self._start(loop)
+
+    def cancel(self):
+        if self._in_flight is not None:
+            if self._in_flight.done() and not self._in_flight.cancelled():
+                self._in_flight.exception()  # Not needed anymore
+            else:
+                self._in_flight.cancel()
+            self._in_flight = None
+
+    def _start(self, loop):
+        """Submit a sync to the executor
+
+        The sync is submitted right away, so that it progresses even if
+        the caller doesn't give control back to the event loop for a while
+
+        :returns: Coroutine that completes with the sync and, optionally,
+            ingestion
+        """
+        covered_since = self._oldest_unsynced
+        logger.info('Syncing dataset ({} records since last sync)'.format(
+            self._unsynced))
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+        return self._complete(loop.run_in_executor(None, self._sync),
+                              covered_since, loop)
+
+    async def _complete(self, synced, covered_since, loop):
+        await synced
+        if self._wait:
+            await self._wait_for_ingestion(covered_since, loop)
+
+    async def _wait_for_ingestion(self, covered_since, loop):
+        with metrics.Timer('sync_ingestion', {}) as timer:
+            while await loop.run_in_executor(
+                    None, self._dataset_status) != 'LOADED':
+                if timer.elapsed() > self._wait_timeout:
+                    logger.warning(
+                        'Ingestion not complete after {}s'.format(
+                            self._wait_timeout))
+                    timer.tags['status'] = 'timeout'
+                    return
+                await asyncio.sleep(self._poll_interval)
+
+        if covered_since is not None:
+            freshness = time.time() - covered_since
+            logger.info('Records queryable {:.1f}s after received'.format(
+                freshness))
+            metrics.log(metrics.get_logger(), metrics.Point(
+                'timer', 'sync_freshness', freshness, {}))
@@ -18,7 +18,10 @@
 # data.world, Inc.(http://data.world/).
 
 import asyncio
+import fnmatch
+import functools
 import json
+import time
 from copy import copy
 
 import jwt
@@ -26,13 +29,29 @@ import simplejson
 import singer
 from jsonschema import validate, ValidationError, SchemaError
 from jwt import DecodeError
-from singer import metrics, utils
-from target_datadotworld import logger
+from singer import metrics
+from target_datadotworld import logger, passthrough
 from target_datadotworld.api_client import ApiClient
+from target_datadotworld.batching import BatchQueue
+from target_datadotworld.bulk import BulkLoad
+from target_datadotworld.cache import FileCache
+from target_datadotworld.enrichment import PendingRecord
+from target_datadotworld.flow_control import AdaptiveLimit, CircuitBreaker
+from target_datadotworld.journal import UploadJournal
+from target_datadotworld.memory import MemoryTracker
+from target_datadotworld.sink import LocalSinkClient
+from target_datadotworld.syncing import SyncTrigger
+from target_datadotworld.tracing import BatchTracer
 from target_datadotworld.exceptions import NotFoundError, TokenError, \
     ConfigError, MissingSchemaError, InvalidRecordError, \
     UnparseableMessageError, InvalidDatasetStateError
-from target_datadotworld.utils import to_stream_id
+from target_datadotworld.utils import to_stream_id, schema_fingerprint, \
+    line_blocks, EVENT_LOOPS
+from target_datadotworld.validation import stream_validator, VALIDATION_MODES
+
+#: Number of uploads running at once, at most, that adaptive concurrency
+#: grows to unless configured otherwise
+ADAPTIVE_MAX_UPLOAD_THREADS = 50
 
 #: Json schema specifying what is required in the config.json file
 CONFIG_SCHEMA = config_schema = {
@@ -57,9 +76,230 @@ CONFIG_SCHEMA = config_schema = {
             'type': 'string',
             'pattern': '^[a-z0-9](?:-(?!-)|[a-z0-9]){1,29}[a-z0-9]$'
         },
+        'dataset_routes': {
+            'description': 'Datasets that streams matching a name or '
+                           'pattern are written to, instead of dataset_id',
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'streams': {
+                        'description': 'Stream name or shell-style '
+                                       'pattern (e.g. orders_*)',
+                        'type': 'string'
+                    },
+                    'dataset_id': {
+                        'type': 'string',
+                        'pattern': '^[a-z0-9](?:-(?!-)|[a-z0-9]){1,93}'
+                                   '[a-z0-9]$'
+                    },
+                    'dataset_owner': {
+                        'type': 'string',
+                        'pattern': '^[a-z0-9](?:-(?!-)|[a-z0-9]){1,29}'
+                                   '[a-z0-9]$'
+                    }
+                },
+                'required': ['streams', 'dataset_id']
+            }
+        },
         'disable_collection': {
             'description': 'If False, disables Singer usage data collection',
             'type': 'boolean'
+        },
+        'api_url': {
+            'description': 'Base URL of data.world\'s API (for testing)',
+            'type': 'string'
+        },
+        'event_loop': {
+            'description': 'Event loop implementation: asyncio\'s own '
+                           '(asyncio) or uvloop, if installed (uvloop)',
+            'type': 'string',
+            'enum': list(EVENT_LOOPS)
+        },
+        'worker_processes': {
+            'description': 'Number of worker processes that streams are '
+                           'partitioned across',
+            'type': 'integer',
+            'minimum': 1
+        },
+        'bulk_load': {
+            'description': 'If True, records of full-table replications '
+                           'are uploaded as a single compressed file per '
+                           'table',
+            'type': 'boolean'
+        },
+        'bulk_load_dir': {
+            'description': 'Directory for temporary bulk load files',
+            'type': 'string'
+        },
+        'prefetch_versions': {
+            'description': 'If True, current versions of streams are '
+                           'fetched as soon as their schemas are received',
+            'type': 'boolean'
+        },
+        'version_cache': {
+            'description': 'Path to file where stream versions are cached '
+                           'between runs',
+            'type': 'string'
+        },
+        'schema_cache': {
+            'description': 'Path to file where fingerprints of stream '
+                           'schemas set on data.world are cached between '
+                           'runs',
+            'type': 'string'
+        },
+        'upload_journal': {
+            'description': 'Path to file where batches uploaded since the '
+                           'last state are journaled, so that they are '
+                           'skipped if replayed after a failure',
+            'type': 'string'
+        },
+        'dataset_cache': {
+            'description': 'Path to file where datasets known to be in '
+                           'good state are cached between runs',
+            'type': 'string'
+        },
+        'dataset_cache_ttl': {
+            'description': 'Time, in seconds, for which the state of a '
+                           'dataset is cached',
+            'type': 'number',
+            'minimum': 0
+        },
+        'validation_mode': {
+            'description': 'Records validated against their stream schema: '
+                           'all of them (full), a sample (sampled) or '
+                           'none (off)',
+            'type': 'string',
+            'enum': list(VALIDATION_MODES)
+        },
+        'validation_sample_rate': {
+            'description': 'In sampled mode, validate one in every N records',
+            'type': 'integer',
+            'minimum': 1
+        },
+        'passthrough_records': {
+            'description': 'If True, records are uploaded as they were '
+                           'received, instead of being re-encoded',
+            'type': 'boolean'
+        },
+        'memory_accounting': {
+            'description': 'If True, memory used by buffered records is '
+                           'accounted for and peak usage is reported',
+            'type': 'boolean'
+        },
+        'memory_sample_interval': {
+            'description': 'Time, in seconds, between samples of the '
+                           'process\' resident set size',
+            'type': 'number',
+            'minimum': 0.01
+        },
+        'memory_tracemalloc': {
+            'description': 'If True, peaks of memory usage are attributed '
+                           'to lines of code with tracemalloc',
+            'type': 'boolean'
+        },
+        'trace_file': {
+            'description': 'If set, spans of each batch, from input lines '
+                           'to acknowledgement, are written to this local '
+                           'file in the Trace Event Format',
+            'type': 'string'
+        },
+        'sink_dir': {
+            'description': 'If set, batches are written to this local '
+                           'directory instead of data.world (for '
+                           'benchmarking)',
+            'type': 'string'
+        },
+        'sink_compress': {
+            'description': 'If True, batches written to sink_dir are '
+                           'compressed',
+            'type': 'boolean'
+        },
+        'sink_latency': {
+            'description': 'Time, in seconds, that operations against '
+                           'sink_dir take',
+            'type': 'number',
+            'minimum': 0
+        },
+        'max_payload_bytes': {
+            'description': 'Maximum size, in bytes, of requests appending '
+                           'records to a stream',
+            'type': 'integer',
+            'minimum': 1
+        },
+        'stream_weights': {
+            'description': 'Share of upload slots of each stream, by '
+                           'stream name, relative to others (default: 1)',
+            'type': 'object',
+            'additionalProperties': {
+                'type': 'number',
+                'minimum': 0.01
+            }
+        },
+        'max_upload_threads': {
+            'description': 'Number of uploads running at once, at most',
+            'type': 'integer',
+            'minimum': 1
+        },
+        'adaptive_concurrency': {
+            'description': 'If True, the number of uploads running at once '
+                           'adapts to their latency and errors',
+            'type': 'boolean'
+        },
+        'adaptive_max_upload_threads': {
+            'description': 'Number of uploads running at once, at most, '
+                           'that adaptive_concurrency can grow to. Defaults '
+                           'to max_upload_threads, if set, or 50',
+            'type': 'integer',
+            'minimum': 1
+        },
+        'circuit_breaker': {
+            'description': 'If True, uploads are paused while they keep '
+                           'failing, and retried',
+            'type': 'boolean'
+        },
+        'circuit_breaker_threshold': {
+            'description': 'Number of consecutive upload failures that '
+                           'pause uploads',
+            'type': 'integer',
+            'minimum': 1
+        },
+        'circuit_breaker_cooldown': {
+            'description': 'Time, in seconds, that uploads are paused for',
+            'type': 'number',
+            'minimum': 0
+        },
+        'linger_seconds': {
+            'description': 'Time, in seconds, after which a partial batch '
+                           'is uploaded instead of waiting for more records',
+            'type': 'number',
+            'minimum': 0
+        },
+        'stream_linger_seconds': {
+            'description': 'Linger time of each stream, by stream name, '
+                           'overriding linger_seconds',
+            'type': 'object',
+            'additionalProperties': {
+                'type': 'number',
+                'minimum': 0
+            }
+        },
+        'sync_interval_seconds': {
+            'description': 'Time, in seconds, after which records are '
+                           'synced at the next checkpoint',
+            'type': 'number',
+            'minimum': 0
+        },
+        'sync_record_count': {
+            'description': 'Number of records after which records are '
+                           'synced at the next checkpoint',
+            'type': 'integer',
+            'minimum': 1
+        },
+        'sync_wait': {
+            'description': 'If True, wait for syncs to be ingested and '
+                           'report data freshness',
+            'type': 'boolean'
         }
     },
     'required': ['api_token', 'dataset_id']
@@ -70,132 +310,528 @@ class TargetDataDotWorld(object):
     def __init__(self, config, **kwargs):
         """Singer target for data.world"""
         self.config = config
-        self._api_client = kwargs.get('api_client',
-                                      ApiClient(self.config['api_token']))
         self._batch_size = kwargs.get('batch_size', 1000)
+        # Startup checks and sync can be left to a coordinating process
+        self._check_dataset = kwargs.get('check_dataset', True)
+        self._sync_dataset = kwargs.get('sync_dataset', True)
+        self._sync_poll_interval = kwargs.get('sync_poll_interval', 5)
+        self._sync_wait_timeout = kwargs.get('sync_wait_timeout', 600)
+        self._dataset_cache = kwargs.get('dataset_cache')
+        if self._dataset_cache is None and 'dataset_cache' in self.config:
+            self._dataset_cache = FileCache(
+                self.config['dataset_cache'],
+                ttl=self.config.get('dataset_cache_ttl', 300))
+        self._startup = None
+        self._consumer_failure = None
+        self._bulk_load = self.config.get('bulk_load', False)
+        self._bulk_load_dir = self.config.get('bulk_load_dir')
+        self._prefetch_versions = self.config.get('prefetch_versions', False)
+        self._version_cache = (FileCache(self.config['version_cache'])
+                               if 'version_cache' in self.config else None)
+        self._schema_cache = (FileCache(self.config['schema_cache'])
+                              if 'schema_cache' in self.config else None)
+        self._schema_fingerprints = {}
+        self._upload_journal = (UploadJournal(self.config['upload_journal'])
+                                if 'upload_journal' in self.config else None)
+        self._schema_updates_skipped = {}
+        self._validation_mode = self.config.get('validation_mode', 'full')
+        self._validation_sample_rate = self.config.get(
+            'validation_sample_rate', 100)
+        self._passthrough_records = self.config.get('passthrough_records',
+                                                    False)
+        self._linger = self.config.get('linger_seconds')
+        self._stream_linger = {
+            to_stream_id(stream): linger for stream, linger
+            in self.config.get('stream_linger_seconds', {}).items()}
+        self._memory_tracker = (
+            MemoryTracker(self.config.get('memory_sample_interval', 1.0),
+                          self.config.get('memory_tracemalloc', False))
+            if self.config.get('memory_accounting', False) else None)
+        self._tracer = (BatchTracer(self.config['trace_file'])
+                        if 'trace_file' in self.config else None)
+        self._api_client = kwargs.get('api_client')
+        if self._api_client is None and 'sink_dir' in self.config:
+            self._api_client = LocalSinkClient(
+                self.config['api_token'], self.config['sink_dir'],
+                compress=self.config.get('sink_compress', False),
+                latency=self.config.get('sink_latency', 0),
+                **self._api_client_options())
+        elif self._api_client is None:
+            self._api_client = ApiClient(self.config['api_token'],
+                                         **self._api_client_options())
+
+    def _api_client_options(self):
+        options = {}
+        if 'api_url' in self.config:
+            options['api_url'] = self.config['api_url']
+        if 'max_payload_bytes' in self.config:
+            options['max_payload_bytes'] = self.config['max_payload_bytes']
+        if 'stream_weights' in self.config:
+            options['stream_weights'] = {
+                to_stream_id(stream): weight for stream, weight
+                in self.config['stream_weights'].items()}
+        if self._memory_tracker is not None:
+            options['memory_tracker'] = self._memory_tracker
+        if self._upload_journal is not None:
+            options['upload_journal'] = self._upload_journal
+        if self._tracer is not None:
+            options['tracer'] = self._tracer
+        if 'max_upload_threads' in self.config:
+            options['max_threads'] = self.config['max_upload_threads']
+        if self.config.get('adaptive_concurrency', False):
+            # The limit starts where a fixed one would and grows from there,
+            # so the thread pool is sized to the limit's ceiling instead
+            max_threads = self.config.get(
+                'adaptive_max_upload_threads',
+                options.get('max_threads', ADAPTIVE_MAX_UPLOAD_THREADS))
+            options['max_threads'] = max_threads
+            options['concurrency_limit'] = AdaptiveLimit(
+                min(10, self.config.get('max_upload_threads', 10),
+                    max_threads),
+                maximum=max_threads)
+        if self.config.get('circuit_breaker', False):
+            options['circuit_breaker'] = CircuitBreaker(
+                self.config.get('circuit_breaker_threshold', 5),
+                self.config.get('circuit_breaker_cooldown', 30))
+        return options
 
     async def process_lines(self, lines, loop=None):
+        """Process Singer messages, yielding states once committed
 
+        :param lines: Lines with Singer messages or, if read asynchronously
+            (e.g. from a socket), an async iterable of lists of lines
+        :type lines: iterable
+        """
         loop = loop or asyncio.get_event_loop()
         api = self._api_client
 
-        schemas = {}
+        validators = {}
         active_versions = {}
+        version_lookups = {}
 
         queues = {}
         consumers = {}
+        schema_updates = {}
 
-        logger.info('Checking network connectivity')
-        api.connection_check()  # Fail fast
-
-        logger.info('Ensuring dataset exists and is in good state')
-        await self._fix_dataset()
-
-        with metrics.record_counter() as counter:
-            for line in lines:
-                try:
-                    msg = singer.parse_message(line)
-                except (json.JSONDecodeError, simplejson.JSONDecodeError) as e:
-                    raise UnparseableMessageError(line, str(e))
-
-                if isinstance(msg, singer.RecordMessage):
-                    await self._handle_record_msg(
-                        msg, schemas, active_versions, loop, queues, consumers)
-                    counter.increment()
-                    logger.debug('Line #{} in {} queued for upload'.format(
-                        counter.value, msg.stream))
-                elif isinstance(msg, singer.SchemaMessage):
-                    logger.info('Schema found for {}'.format(msg.stream))
-                    schemas[msg.stream] = await self._handle_schema_msg(msg)
-                elif isinstance(msg, singer.StateMessage):
-                    logger.info('State message found: {}'.format(msg.value))
-                    state = await self._handle_state_msg(msg, queues,
+        # Startup checks run while the first records are read and queued
+        if self._check_dataset:
+            self._startup = loop.create_task(self.prepare())
+            await asyncio.sleep(0)  # Hands the first check to the executor
+        self._consumer_failure = None
+
+        # Records of full-table loads are only committed once their file
+        # is uploaded, so states are held until all loads are complete
+        bulk_loads = {}
+        held_states = []
+
+        sync_trigger = self.sync_trigger() if self._sync_dataset else None
+
+        if self._memory_tracker is not None:
+            self._memory_tracker.start()
+
+        # Ingestion of records is timed only if batches are traced
+        tracer = self._tracer
+        read_start = tracer.now() if tracer is not None else None
+
+        try:
+            with metrics.record_counter() as counter:
+                async for block in line_blocks(lines):
+                    for line in block:
+                        read_end = tracer.now() if tracer is not None else None
+                        if self._startup is not None and self._startup.done():
+                            self._startup.result()  # Fail fast
+                            self._startup = None
+                        self._check_consumers()
+
+                        try:
+                            if self._passthrough_records:
+                                msg, raw_record = \
+                                    passthrough.parse_message(line)
+                            else:
+                                msg, raw_record = \
+                                    singer.parse_message(line), None
+                        except (json.JSONDecodeError,
+                                simplejson.JSONDecodeError) as e:
+                            raise UnparseableMessageError(line, str(e))
+
+                        if isinstance(msg, singer.RecordMessage):
+                            timings = ((read_start, read_end, tracer.now())
+                                       if tracer is not None else None)
+                            await self._handle_record_msg(
+                                msg, validators, active_versions, loop, queues,
+                                consumers, bulk_loads, schema_updates,
+                                raw_record, len(line), timings)
+                            if sync_trigger is not None:
+                                sync_trigger.record_received()
+                            counter.increment()
+                            logger.debug(
+                                'Line #{} in {} queued for upload'.format(
+                                    counter.value, msg.stream))
+                        elif isinstance(msg, singer.SchemaMessage):
+                            logger.info(
+                                'Schema found for {}'.format(msg.stream))
+                            validators[msg.stream] = stream_validator(
+                                msg.schema,
+                                self._validation_mode,
+                                self._validation_sample_rate)
+                            schema_updates[msg.stream] = loop.create_task(
+                                self._handle_schema_msg(
+                                    msg, schema_updates.get(msg.stream), loop))
+                            if (self._prefetch_versions and
+                                    msg.stream not in active_versions and
+                                    msg.stream not in version_lookups and
+                                    self._cached_version(msg.stream) is None):
+                                version_lookups[msg.stream] = \
+                                    loop.create_task(self._fetch_version(
+                                        msg.stream, loop))
+                        elif isinstance(msg, singer.StateMessage):
+                            logger.info(
+                                'State message found: {}'.format(msg.value))
+                            state = await self._handle_state_msg(msg, queues,
+                                                                 consumers)
+                            queues = {}
+                            if len(bulk_loads) > 0:
+                                # All of them, so that every state received
+                                # is emitted (e.g. acknowledged, by workers)
+                                held_states.append(state)
+                            else:
+                                if sync_trigger is not None:
+                                    sync_trigger.checkpoint(loop)
+                                yield state
+                                self._checkpoint_journal()
+                        elif isinstance(msg, singer.ActivateVersionMessage):
+                            logger.info('Version message found: {}/{}'.format(
+                                msg.stream, msg.version))
+
+                            await self._ready()
+                            if self._bulk_load:
+                                await self._drain_stream(msg.stream, queues,
                                                          consumers)
-                    queues = {}
-                    yield state
-                elif isinstance(msg, singer.ActivateVersionMessage):
-                    logger.info('Version message found: {}/{}'.format(
-                        msg.stream, msg.version))
-
-                    current_version = active_versions.get(msg.stream)
-                    active_version = await self._handle_active_version_msg(
-                        msg, current_version, api)
-                    active_versions[msg.stream] = active_version
+                            if msg.stream in bulk_loads:
+                                await self._finish_bulk_load(
+                                    msg.stream, bulk_loads.pop(msg.stream),
+                                    loop)
+                                if len(bulk_loads) == 0:
+                                    if (sync_trigger is not None and
+                                            len(held_states) > 0):
+                                        sync_trigger.checkpoint(loop)
+                                    for state in held_states:
+                                        yield state
+                                        self._checkpoint_journal()
+                                    held_states = []
+
+                            current_version = active_versions.get(msg.stream)
+                            if current_version is None:
+                                current_version = await self._lookup_version(
+                                    msg.stream, version_lookups, loop)
+                            active_version, truncated = \
+                                await self._handle_active_version_msg(
+                                    msg, current_version, api)
+                            active_versions[msg.stream] = active_version
+
+                            if self._bulk_load and truncated:
+                                bulk_loads[msg.stream] = BulkLoad(
+                                    to_stream_id(msg.stream),
+                                    self._bulk_load_dir,
+                                    memory_tracker=self._memory_tracker)
+                        else:
+                            logger.warn(
+                                'Unrecognized message ({})'.format(msg))
+
+                        if tracer is not None:
+                            read_start = tracer.now()
+
+            await self._drain_queues(queues, consumers)
+            await self._ready()
+            for schema_update in schema_updates.values():
+                await schema_update
+            while len(bulk_loads) > 0:
+                stream, bulk_load = bulk_loads.popitem()
+                await self._finish_bulk_load(stream, bulk_load, loop)
+            for state in held_states:
+                yield state
+                self._checkpoint_journal()
+        except BaseException:
+            if sync_trigger is not None:
+                sync_trigger.cancel()
+            raise
+        finally:
+            for bulk_load in bulk_loads.values():
+                bulk_load.discard()
+            for task in (list(consumers.values()) +
+                         list(version_lookups.values()) +
+                         list(schema_updates.values()) +
+                         [self._startup]):
+                if task is None:
+                    continue
+                if task.done() and not task.cancelled():
+                    task.exception()  # Not needed anymore
                 else:
-                    logger.warn('Unrecognized message ({})'.format(msg))
+                    task.cancel()
+            self._startup = None
+            self._log_schema_updates_skipped()
+            if self._memory_tracker is not None:
+                self._memory_tracker.stop()
+                self._memory_tracker.log_report()
+            if tracer is not None:
+                tracer.close()
+
+        if sync_trigger is not None:
+            await sync_trigger.finish(loop)
+
+    async def prepare(self):
+        """Verify connectivity and ensure that datasets are ready
+
+        Datasets that streams are routed to are checked concurrently
+        """
+        loop = asyncio.get_event_loop()
+        datasets = []
+        for owner, dataset in self._datasets:
+            cache_key = '{}/{}'.format(owner, dataset)
+            if (self._dataset_cache is not None and
+                    self._dataset_cache.get(cache_key) == 'LOADED'):
+                logger.info('Dataset {} recently found in good state'.format(
+                    cache_key))
+            else:
+                datasets.append((owner, dataset))
+        if len(datasets) == 0:
+            return
+
+        logger.info('Checking network connectivity')
+        await loop.run_in_executor(
+            None, self._api_client.connection_check)  # Fail fast
+
+        await asyncio.gather(*[
+            loop.run_in_executor(None, self._prepare_dataset, owner, dataset)
+            for owner, dataset in datasets])
 
-        await TargetDataDotWorld._drain_queues(queues, consumers)
-        self._api_client.sync(self.config['dataset_owner'],
-                              self.config['dataset_id'])
+    def _prepare_dataset(self, owner, dataset):
+        logger.info('Ensuring dataset {}/{} exists and is in good '
+                    'state'.format(owner, dataset))
+        self._fix_dataset(owner, dataset)
 
-    async def _fix_dataset(self):
+        if self._dataset_cache is not None:
+            self._dataset_cache.set('{}/{}'.format(owner, dataset), 'LOADED')
+
+    async def _ready(self):
+        """Wait for startup checks to complete"""
+        if self._startup is not None:
+            await self._startup
+
+    @property
+    def _datasets(self):
+        """Datasets written to, as (owner, dataset ID) pairs"""
+        datasets = [(self.config['dataset_owner'], self.config['dataset_id'])]
+        for route in self.config.get('dataset_routes', []):
+            dataset = (route['dataset_owner'], route['dataset_id'])
+            if dataset not in datasets:
+                datasets.append(dataset)
+        return datasets
+
+    def _dataset_for(self, stream):
+        """Dataset that a stream is written to
+
+        Streams are routed by the first route matching their name, if any,
+        or written to the dataset set by dataset_id otherwise
+
+        :param stream: Stream name
+        :type stream: str
+
+        :returns: Owner and ID of the dataset
+        :rtype: tuple
+        """
+        dataset = self._stream_datasets.get(stream)
+        if dataset is None:
+            dataset = (self.config['dataset_owner'],
+                       self.config['dataset_id'])
+            for route in self.config.get('dataset_routes', []):
+                if fnmatch.fnmatchcase(stream, route['streams']):
+                    dataset = (route['dataset_owner'], route['dataset_id'])
+                    break
+            self._stream_datasets[stream] = dataset
+        return dataset
+
+    def sync(self):
+        """Trigger ingest of all records uploaded to datasets"""
+        for owner, dataset in self._datasets:
+            self._api_client.sync(owner, dataset)
+
+    def sync_trigger(self):
+        """Create a trigger of syncs, as configured, for a replication"""
+        return SyncTrigger(
+            self.sync, self._dataset_status,
+            interval=self.config.get('sync_interval_seconds'),
+            record_count=self.config.get('sync_record_count'),
+            wait=self.config.get('sync_wait', False),
+            poll_interval=self._sync_poll_interval,
+            wait_timeout=self._sync_wait_timeout)
+
+    def _dataset_status(self):
+        """Status of datasets, LOADED only once all of them are"""
+        for owner, dataset in self._datasets:
+            status = self._api_client.get_dataset(
+                owner, dataset).get('status')
+            if status != 'LOADED':
+                return status
+        return 'LOADED'
+
+    def _fix_dataset(self, owner, dataset_id):
         try:
-            dataset = self._api_client.get_dataset(
-                self.config['dataset_owner'],
-                self.config['dataset_id'])
+            dataset = self._api_client.get_dataset(owner, dataset_id)
 
             if dataset.get('status') != 'LOADED':
-                raise InvalidDatasetStateError(
-                    self.config['dataset_owner'],
-                    self.config['dataset_id'])
+                raise InvalidDatasetStateError(owner, dataset_id)
         except NotFoundError:
             logger.info('Creating new dataset {}/{}'.format(
-                self.config['dataset_owner'],
-                self.config['dataset_id']))
+                owner, dataset_id))
             self._api_client.create_dataset(
-                self.config['dataset_owner'],
-                self.config['dataset_id'],
-                title=self.config['dataset_id'],
+                owner, dataset_id,
+                title=dataset_id,
                 visibility='PRIVATE')
 
+    def _checkpoint_journal(self):
+        """Forget journaled batches, once covered by an emitted state"""
+        if self._upload_journal is not None:
+            self._upload_journal.checkpoint()
+
+    def _cached_version(self, stream):
+        if self._version_cache is None:
+            return None
+        return self._version_cache.get('{}/{}/{}'.format(
+            *self._dataset_for(stream), to_stream_id(stream)))
+
+    async def _fetch_version(self, stream, loop):
+        await self._ready()
+        return await loop.run_in_executor(None, functools.partial(
+            self._api_client.get_current_version,
+            *self._dataset_for(stream),
+            to_stream_id(stream)))
+
+    async def _lookup_version(self, stream, version_lookups, loop):
+        cached_version = self._cached_version(stream)
+        if cached_version is not None:
+            return cached_version
+        lookup = version_lookups.pop(stream, None)
+        if lookup is not None:
+            return await lookup
+        return await self._fetch_version(stream, loop)
+
     async def _handle_active_version_msg(self, msg, current_version, api):
-        if current_version is None:
-            current_version = api.get_current_version(
-                self.config['dataset_owner'],
-                self.config['dataset_id'],
-                to_stream_id(msg.stream))
-        if str(msg.version) != str(current_version):
+        truncated = str(msg.version) != str(current_version)
+        if truncated:
             api.truncate_stream_records(
-                self.config['dataset_owner'],
-                self.config['dataset_id'],
+                *self._dataset_for(msg.stream),
                 to_stream_id(msg.stream))
-        return msg.version
-
-    async def _handle_record_msg(self, msg, schemas, active_versions,
-                                 loop, queues, consumers):
-        if msg.stream not in schemas:
+            if self._upload_journal is not None:
+                # Replayed batches are no longer in the stream
+                self._upload_journal.discard(to_stream_id(msg.stream))
+        if self._version_cache is not None:
+            self._version_cache.set('{}/{}/{}'.format(
+                *self._dataset_for(msg.stream),
+                to_stream_id(msg.stream)), msg.version)
+        return msg.version, truncated
+
+    async def _finish_bulk_load(self, stream, bulk_load, loop):
+        try:
+            bulk_load.close()
+            logger.info('Uploading {} records from {} stream as {}'.format(
+                bulk_load.record_count, bulk_load.stream_id,
+                bulk_load.filename))
+            await loop.run_in_executor(None, functools.partial(
+                self._api_client.upload_file,
+                *self._dataset_for(stream),
+                bulk_load.filename,
+                bulk_load.path))
+        finally:
+            bulk_load.discard()
+
+    async def _handle_record_msg(self, msg, validators, active_versions,
+                                 loop, queues, consumers, bulk_loads,
+                                 schema_updates, raw_record=None, size=0,
+                                 timings=None):
+        if msg.stream not in validators:
             raise MissingSchemaError(msg.stream)
-        schema = schemas[msg.stream]
 
         try:
-            validate(msg.record, schema)
+            validators[msg.stream](msg.record)
         except (SchemaError, ValidationError) as e:
             raise InvalidRecordError(msg.stream, e.message)
+        if timings is not None and msg.stream not in bulk_loads:
+            self._tracer.record_queued(to_stream_id(msg.stream), *timings)
 
         if msg.stream not in queues:
             # Creates one queue per stream
-            queue = asyncio.Queue(maxsize=self._batch_size)
+            linger = (None if msg.stream in bulk_loads else
+                      self._stream_linger.get(to_stream_id(msg.stream),
+                                              self._linger))
+            queue = BatchQueue(self._batch_size, loop=loop, linger=linger)
             queues[msg.stream] = queue
 
             # Schedules one consumer per queue
-            consumers[msg.stream] = asyncio.ensure_future(
-                self._api_client.append_stream_chunked(
-                    self.config['dataset_owner'],
-                    self.config['dataset_id'],
+            if msg.stream in bulk_loads:
+                consumer = bulk_loads[msg.stream].write_chunked(
+                    queue, self._batch_size, loop)
+            else:
+                consumer = self._api_client.append_stream_chunked(
+                    *self._dataset_for(msg.stream),
                     to_stream_id(msg.stream),
                     queue,
-                    self._batch_size, loop=loop), loop=loop)
-
-        # Add record to queue
-        record = msg.record
-        record.update({
-            'singer_timestamp': utils.strftime(
-                msg.time_extracted or utils.now()),
-            'singer_version': active_versions.get(msg.stream)
-        })
-        await queues[msg.stream].put(record)
-
-    async def _handle_schema_msg(self, msg):
+                    self._batch_size, loop=loop)
+            consumers[msg.stream] = loop.create_task(
+                self._consume_when_ready(
+                    consumer, queue, schema_updates.get(msg.stream)))
+            consumers[msg.stream].add_done_callback(functools.partial(
+                self._on_consumer_done, to_stream_id(msg.stream), queue,
+                consumers))
+
+        # Add record to queue, to be enriched by upload workers
+        record = PendingRecord(msg.record, raw_record, msg.time_extracted,
+                               time.time(), active_versions.get(msg.stream),
+                               size)
+        if self._memory_tracker is not None:
+            self._memory_tracker.add(to_stream_id(msg.stream), 'queued', size)
+        queue = queues[msg.stream]
+        if queue.full():
+            await queue.put(record)  # Waits for the consumer
+        else:
+            queue.put_nowait(record)
+
+    async def _consume_when_ready(self, consumer, queue, schema_update):
+        try:
+            await self._ready()
+            if schema_update is not None:
+                await schema_update
+        except Exception:
+            consumer.close()
+            raise
+        await consumer
+
+    def _on_consumer_done(self, stream, queue, consumers, consumer):
+        if not consumer.cancelled() and consumer.exception() is None:
+            return
+
+        # Records left behind are discarded, so that reading isn't blocked
+        for record in queue.discard():
+            if self._memory_tracker is not None:
+                self._memory_tracker.remove(stream, 'queued', record.size)
+
+        if not consumer.cancelled() and self._consumer_failure is None:
+            self._consumer_failure = consumer.exception()
+            logger.error('Upload of {} failed. Cancelling all '
+                         'uploads.'.format(stream))
+            for other in consumers.values():
+                if not other.done():
+                    other.cancel()
+
+    def _check_consumers(self):
+        """Fail fast, if uploads of any stream failed"""
+        if self._consumer_failure is not None:
+            raise self._consumer_failure
+
+    async def _handle_schema_msg(self, msg, previous_update, loop):
+        if previous_update is not None:
+            await previous_update
+
         if (msg.key_properties is not None and
                 len(msg.key_properties) > 0):
 
@@ -210,32 +846,73 @@ class TargetDataDotWorld(object):
                     'extracted.'.format(msg.stream))
                 bookmark_properties = 'singer_timestamp'
 
+            cache_key = '{}/{}/{}'.format(
+                *self._dataset_for(msg.stream), to_stream_id(msg.stream))
+            fingerprint = schema_fingerprint(
+                msg.key_properties, bookmark_properties, msg.schema)
+            if fingerprint == self._schema_fingerprint(cache_key):
+                logger.debug('Schema of {} unchanged. Skipping update of '
+                             'data.world schema'.format(msg.stream))
+                self._schema_updates_skipped[msg.stream] = \
+                    self._schema_updates_skipped.get(msg.stream, 0) + 1
+                return
+
             logger.info('Setting data.world schema {}/{}'.format(
                 msg.key_properties, bookmark_properties))
 
-            self._api_client.set_stream_schema(
-                self.config['dataset_owner'],
-                self.config['dataset_id'],
+            await self._ready()
+            await loop.run_in_executor(None, functools.partial(
+                self._api_client.set_stream_schema,
+                *self._dataset_for(msg.stream),
                 to_stream_id(msg.stream),
                 primaryKeyFields=msg.key_properties,
                 sequenceField=bookmark_properties,
-                updateMethod='TRUNCATE')
-
-        return msg.schema
+                updateMethod='TRUNCATE'))
+
+            self._schema_fingerprints[cache_key] = fingerprint
+            if self._schema_cache is not None:
+                self._schema_cache.set(cache_key, fingerprint)
+
+    def _schema_fingerprint(self, cache_key):
+        if self._schema_cache is not None:
+            # Shared with other processes, which may have set schemas since
+            return self._schema_cache.get(cache_key)
+        return self._schema_fingerprints.get(cache_key)
+
+    def _log_schema_updates_skipped(self):
+        metrics_logger = metrics.get_logger()
+        for stream, skipped in self._schema_updates_skipped.items():
+            metrics.log(metrics_logger, metrics.Point(
+                'counter', 'schema_updates_skipped', skipped,
+                {'stream': stream}))
+        self._schema_updates_skipped = {}
 
     async def _handle_state_msg(self, msg, queues, consumers):
-        await TargetDataDotWorld._drain_queues(queues, consumers)
+        await self._drain_queues(queues, consumers)
         return msg.value
 
-    @staticmethod
-    async def _drain_queues(queues, consumers):
+    async def _drain_stream(self, stream, queues, consumers):
+        if stream in queues:
+            await self._drain_queue(queues[stream], consumers[stream])
+            del queues[stream]
+
+    async def _drain_queues(self, queues, consumers):
         for q in queues:
-            # Mark the end of each queue
-            await queues[q].put(None)
-            # Wait until all items in the queue are consumed
-            await queues[q].join()
-            # Make sure consumers are done
-            await consumers[q]
+            await self._drain_queue(queues[q], consumers[q])
+
+    async def _drain_queue(self, queue, consumer):
+        self._check_consumers()
+        # Mark the end of the queue
+        queue.close()
+        # Wait until all items in the queue are consumed
+        await asyncio.wait([consumer])
+        self._check_consumers()
+        # Make sure the consumer is done
+        consumer.result()
+
+    @property
+    def api_client(self):
+        return self._api_client
 
     @property
     def config(self):
@@ -262,3 +939,9 @@ class TargetDataDotWorld(object):
         self._config['dataset_id'] = config.get('dataset_id')
         self._config['dataset_owner'] = config.get(
             'dataset_owner', sub_parties[1])
+        if 'dataset_routes' in config:
+            self._config['dataset_routes'] = [
+                dict(route, dataset_owner=route.get(
+                    'dataset_owner', self._config['dataset_owner']))
+                for route in config['dataset_routes']]
+        self._stream_datasets = {}
@@ -0,0 +1,192 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+
+class BatchTracer(object):
+    def __init__(self, path):
+        """Tracer of batches, from input lines to acknowledgement of uploads
+
+        Each batch is given an ID and traced as a span with one child span
+        per stage, written to a file in the Trace Event Format (i.e. as
+        async events, that trace viewers like Perfetto or chrome://tracing
+        show in a track per batch). Records are read, parsed and validated
+        one at a time, interleaved with others, so ``read``, ``parse`` and
+        ``validate`` spans start with a batch's first record and last as
+        long as all of its records spent in that stage, combined.
+
+        :param path: Path to the trace file
+        :type path: str
+        """
+        self._lock = threading.Lock()
+        self._pending = {}  # Ingestion times of queued records, by stream
+        self._batch_ids = itertools.count(1)
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+        self._file = open(path, 'w')
+        self._file.write('[')
+        self._separator = '\n'
+        self._write({'name': 'process_name', 'ph': 'M', 'pid': self._pid,
+                     'args': {'name': 'target-datadotworld'}})
+
+    @staticmethod
+    def now():
+        return time.perf_counter()
+
+    def record_queued(self, stream, read_start, read_end, parsed_at):
+        """Account for a record being queued for upload, once validated
+
+        :param stream: Stream ID
+        :type stream: str
+        :param read_start: Time when reading the record's line started
+        :type read_start: float
+        :param read_end: Time when the line was read
+        :type read_end: float
+        :param parsed_at: Time when the line was parsed
+        :type parsed_at: float
+        """
+        self._pending.setdefault(stream, deque()).append(
+            (read_start, read_end, parsed_at, self.now()))
+
+    def start_batch(self, stream, size):
+        """Start tracing the next batch of a stream, once taken from its queue
+
+        :param stream: Stream ID
+        :type stream: str
+        :param size: Number of records in the batch
+        :type size: int
+
+        :rtype: BatchTrace
+        """
+        pending = self._pending.get(stream, ())
+        records = [pending.popleft() for _ in range(min(size, len(pending)))]
+        trace = BatchTrace(self, next(self._batch_ids), stream)
+        if len(records) == 0:
+            trace.begin(self.now(), records=size)
+            return trace
+
+        start = records[0][0]
+        trace.begin(start, records=size)
+        for name, (begin, end) in (('read', (0, 1)), ('parse', (1, 2)),
+                                   ('validate', (2, 3))):
+            duration = sum(r[end] - r[begin] for r in records)
+            trace.span(name, start, start + duration)
+        trace.ready_at = records[-1][3]
+        return trace
+
+    def emit(self, phase, name, batch_id, t, args=None):
+        event = {'name': name, 'cat': 'batch', 'ph': phase,
+                 'id': batch_id, 'ts': round((t - self._origin) * 1e6, 1),
+                 'pid': self._pid, 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        self._write(event)
+
+    def _write(self, event):
+        line = json.dumps(event)
+        with self._lock:
+            self._file.write(self._separator + line)
+            self._separator = ',\n'
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write('\n]\n')
+            self._file.close()
+
+
+class BatchTrace(object):
+    def __init__(self, tracer, batch_id, stream):
+        """Spans of a single batch, from any thread"""
+        self._tracer = tracer
+        self.batch_id = batch_id
+        self.stream = stream
+        self.ready_at = None
+        self.submitted_at = None
+        self.uploaded_at = None
+
+    def begin(self, t, **args):
+        args['stream'] = self.stream
+        self._tracer.emit('b', 'batch', self.batch_id, t, args)
+
+    def span(self, name, start, end, **args):
+        self._tracer.emit('b', name, self.batch_id, start, args)
+        self._tracer.emit('e', name, self.batch_id, end)
+
+    def submitted(self):
+        """Mark the batch as submitted for upload, ending its queue wait"""
+        self.submitted_at = self._tracer.now()
+        if self.ready_at is not None:
+            self.span('queue_wait', self.ready_at, self.submitted_at)
+
+    def started(self):
+        """Mark the upload as started on a thread"""
+        if self.submitted_at is not None:
+            self.span('executor_wait', self.submitted_at,
+                      self._tracer.now())
+
+    def uploaded(self):
+        """Mark the batch as accepted, or found in the upload journal"""
+        self.uploaded_at = self._tracer.now()
+
+    def finish(self):
+        """End the batch, once the upload is acknowledged or has failed"""
+        now = self._tracer.now()
+        if self.uploaded_at is not None:
+            self.span('acknowledge', self.uploaded_at, now)
+            self._tracer.emit('e', 'batch', self.batch_id, now)
+        else:
+            self._tracer.emit('e', 'batch', self.batch_id, now,
+                              {'failed': True})
+
+
+def measure(trace, name, **args):
+    """Span the execution of a block, if the batch is traced
+
+    :param trace: Trace of the batch, or None
+    :type trace: BatchTrace
+    :param name: Name of the span
+    :type name: str
+    """
+    return _Measure(trace, name, args)
+
+
+class _Measure(object):
+    def __init__(self, trace, name, args):
+        self._trace = trace
+        self._name = name
+        self._args = args
+        self._start = None
+
+    def __enter__(self):
+        if self._trace is not None:
+            self._start = BatchTracer.now()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._trace is not None:
+            self._trace.span(self._name, self._start, BatchTracer.now(),
+                             **self._args)
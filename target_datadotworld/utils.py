@@ -17,30 +17,50 @@
 # This product includes software developed at
 # data.world, Inc.(http://data.world/).
 
-import json
+import asyncio
+import hashlib
+import io
+import itertools
 import re
 
+import simplejson
+
+from target_datadotworld import logger
+from target_datadotworld.enrichment import enrich
+
+#: Event loop implementations that the target can run on
+EVENT_LOOPS = ('asyncio', 'uvloop')
+
 
 def to_jsonlines(records):
     """Convert objects into JSON lines
 
-    :param records: Objects to be converted into JSON lines
+    Pending records are enriched as part of the conversion, which runs on
+    upload workers rather than on the event loop
+
+    :param records: Objects to be converted into JSON lines, strings
+        already holding JSON text or pending records
     :type records: iterable
 
     :return: A JSON lines string
     :rtype: str
     """
-    json_lines = [json.dumps(r) for r in records]
+    # simplejson serializes decimals, used by singer to parse numbers
+    json_lines = [r if isinstance(r, str) else simplejson.dumps(r)
+                  for r in enrich(records)]
     return '\n'.join(json_lines)
 
 
 async def to_chunks(queue, chunk_size):
     """Asynchronously convert objects into chunks of JSON lines
 
-    This async generator will consume objects in a queue and emit chunks
+    This async generator will consume batches of objects in a queue and
+    emit chunks, re-chunking batches that are not of the given size. Partial
+    batches, handed over when the queue is closed or once they've lingered,
+    are emitted right away rather than held back for more objects.
 
     :param queue: Queue with objects
-    :type queue: asyncio.Queue
+    :type queue: BatchQueue
     :param chunk_size: Chunk or batch size
     :type chunk_size: int
 
@@ -49,21 +69,156 @@ async def to_chunks(queue, chunk_size):
     """
     lines = []
     while True:
-        line = await queue.get()
+        if len(lines) > 0 and queue.linger is not None:
+            # Objects left over from re-chunking linger as well
+            try:
+                batch = await asyncio.wait_for(queue.get_batch(),
+                                               queue.linger)
+            except asyncio.TimeoutError:
+                yield lines
+                lines = []
+                continue
+        else:
+            batch = await queue.get_batch()
 
-        if line is None:
+        if batch is None:
             if len(lines) > 0:
                 yield lines
-            queue.task_done()
             break
 
-        lines.append(line)
+        if len(lines) == 0 and len(batch) == chunk_size:
+            yield batch
+            continue
 
-        if len(lines) == chunk_size:
+        lines.extend(batch)
+        while len(lines) >= chunk_size:
+            yield lines[:chunk_size]
+            lines = lines[chunk_size:]
+
+        if len(batch) < queue.batch_size and len(lines) > 0:
             yield lines
             lines = []
 
-        queue.task_done()
+
+async def read_line_blocks(reader, read_size=1 << 16):
+    """Read lines from a stream, in blocks of those available at once
+
+    :param reader: Stream to read from
+    :type reader: asyncio.StreamReader
+    :param read_size: Number of bytes read at a time
+    :type read_size: int
+
+    :returns: Lists of lines, including line terminators
+    :rtype: list
+    """
+    async for block in _split_line_blocks(reader.read, read_size):
+        yield block
+
+
+async def read_file_blocks(file, loop=None, block_size=1 << 20):
+    """Read lines from a binary file on a thread, in blocks of those available
+
+    Lines are not decoded, given that the JSON parser accepts UTF-8 encoded
+    bytes. Reading doesn't block the event loop while waiting for input
+    (e.g. from a tap that emits records slowly), so that timers and tasks
+    keep running in the meantime
+
+    :param file: Binary file-like object (e.g. stdin's buffer)
+    :type file: io.BufferedIOBase
+    :param block_size: Number of bytes read at a time, at most
+    :type block_size: int
+
+    :returns: Lists of lines, including line terminators
+    :rtype: list
+    """
+    loop = loop or asyncio.get_event_loop()
+    raw = getattr(file, 'raw', None)
+    reader = (io.BufferedReader(raw, buffer_size=block_size)
+              if raw is not None else file)
+    read = getattr(reader, 'read1', reader.read)
+
+    async def read_available(size):
+        return await loop.run_in_executor(None, read, size)
+
+    try:
+        async for block in _split_line_blocks(read_available, block_size):
+            yield block
+    finally:
+        if raw is not None:
+            reader.detach()  # Leaves the file open, to its owner
+
+
+async def line_blocks(lines, block_size=1000):
+    """Iterate over blocks of lines, read synchronously or not
+
+    Lines read synchronously are split into blocks, between which control
+    is given back to the event loop. Blocks are read lazily, so that lines
+    aren't read ahead of those processed.
+
+    :param lines: Lines or an async iterable of lists of lines
+    :type lines: iterable
+    :param block_size: Number of lines per block, if read synchronously
+    :type block_size: int
+
+    :returns: Lists of lines or, if read synchronously, iterators of lines
+    :rtype: iterable
+    """
+    if hasattr(lines, '__aiter__'):
+        async for block in lines:
+            yield block
+        return
+
+    lines = iter(lines)
+    read = [block_size]
+    while read[0] == block_size:
+        yield _counted(itertools.islice(lines, block_size), read)
+        await asyncio.sleep(0)
+
+
+def _counted(lines, count):
+    count[0] = 0
+    for line in lines:
+        count[0] += 1
+        yield line
+
+
+async def _split_line_blocks(read, read_size):
+    remainder = b''
+    while True:
+        data = await read(read_size)
+        if not data:
+            if len(remainder) > 0:
+                yield [remainder]
+            return
+
+        if len(remainder) > 0:
+            data = remainder + data
+        # Splits lines much faster than bytes.splitlines
+        lines = io.BytesIO(data).readlines()
+        remainder = lines.pop() if not lines[-1].endswith(b'\n') else b''
+        if len(lines) > 0:
+            yield lines
+
+
+def new_event_loop(implementation='asyncio'):
+    """Create an event loop of the given implementation
+
+    Falls back to asyncio's own event loop if uvloop isn't installed
+
+    :param implementation: One of ``asyncio`` or ``uvloop``
+    :type implementation: str
+
+    :returns: New event loop
+    :rtype: asyncio.AbstractEventLoop
+    """
+    if implementation == 'uvloop':
+        try:
+            import uvloop
+            return uvloop.new_event_loop()
+        except ImportError:
+            logger.warning('uvloop is not installed. '
+                           'Using asyncio event loop instead.')
+    return asyncio.new_event_loop()
 
 
 def to_stream_id(stream_name):
@@ -76,6 +231,24 @@ def to_table_name(stream_id):
     return stream_id.replace('-', '_')
 
 
+def schema_fingerprint(key_properties, sequence_field, schema):
+    """Compute a digest identifying the schema of a stream
+
+    :param key_properties: Primary key fields
+    :type key_properties: list
+    :param sequence_field: Field that records are sequenced by
+    :type sequence_field: str
+    :param schema: JSON schema of the stream's records
+    :type schema: dict
+
+    :returns: Hex digest, equal for equivalent schemas
+    :rtype: str
+    """
+    canonical = simplejson.dumps(
+        [key_properties, sequence_field, schema], sort_keys=True)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
 # lodash/pydash style kebab_case implementation
 
 
@@ -0,0 +1,295 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from itertools import count
+from numbers import Number
+
+from jsonschema import ValidationError, SchemaError
+from jsonschema.validators import validator_for
+
+#: Supported values for the ``validation_mode`` configuration attribute
+VALIDATION_MODES = ('full', 'sampled', 'off')
+
+# Keywords that carry no assertions and can be safely ignored.
+# Formats are only annotations, given that records are validated without
+# a format checker (same as jsonschema.validate)
+_ANNOTATIONS = {'$schema', 'id', '$id', 'title', 'description', 'default',
+                'examples', 'format', 'inclusion', 'selected'}
+
+_ASSERTIONS = {'type', 'properties', 'required', 'additionalProperties',
+               'items', 'minimum', 'maximum', 'exclusiveMinimum',
+               'exclusiveMaximum', 'minLength', 'maxLength'}
+
+_TYPE_CHECKS = {
+    'null': '{0} is None',
+    'boolean': 'isinstance({0}, bool)',
+    'integer': '(isinstance({0}, int) and not isinstance({0}, bool))',
+    'number': '(isinstance({0}, Number) and not isinstance({0}, bool))',
+    'string': 'isinstance({0}, str)',
+    'object': 'isinstance({0}, dict)',
+    'array': 'isinstance({0}, list)'
+}
+
+
+def stream_validator(schema, mode='full', sample_rate=100):
+    """Create the function used to validate the records of a stream
+
+    :param schema: JSON schema of the stream
+    :type schema: dict
+    :param mode: One of ``full`` (every record is validated), ``sampled``
+        (one in every ``sample_rate`` records is validated) or ``off``
+    :type mode: str
+    :param sample_rate: Sampling interval, used in ``sampled`` mode
+    :type sample_rate: int
+
+    :returns: Function that takes a record and raises
+        ``jsonschema.ValidationError`` if the record is invalid
+    :rtype: callable
+    """
+    if mode == 'off':
+        return _skip
+
+    validate = compile_validator(schema)
+    if mode == 'sampled' and sample_rate > 1:
+        counter = count()
+
+        def validate_sample(record):
+            if next(counter) % sample_rate == 0:
+                validate(record)
+
+        return validate_sample
+
+    return validate
+
+
+def compile_validator(schema):
+    """Compile a JSON schema into a specialized validation function
+
+    Singer taps generate a small subset of JSON schema (type unions with
+    null, formats, nested objects and arrays), which is translated into
+    plain Python checks. Schemas using any other construct are validated
+    using jsonschema.
+
+    :param schema: JSON schema
+    :type schema: dict
+
+    :returns: Function that takes a record and raises
+        ``jsonschema.ValidationError`` if the record is invalid
+    :rtype: callable
+    """
+    try:
+        validator_for(schema, default=_DefaultValidator).check_schema(schema)
+        source = _ValidatorCompiler().compile(schema)
+    except (SchemaError, _UnsupportedSchema):
+        return _jsonschema_validator(schema)
+
+    namespace = {'Number': Number, 'MISSING': _MISSING, 'fail': _fail}
+    exec(compile(source, '<compiled validator>', 'exec'), namespace)
+    return namespace['validate']
+
+
+def _skip(record):
+    pass
+
+
+def _fail(message):
+    raise ValidationError(message)
+
+
+def _jsonschema_validator(schema):
+    cls = validator_for(schema, default=_DefaultValidator)
+    try:
+        cls.check_schema(schema)
+    except SchemaError as e:
+        error = e
+
+        def invalid_schema(record):
+            raise error
+
+        return invalid_schema
+
+    return cls(schema).validate
+
+
+_DefaultValidator = validator_for({})
+_MISSING = object()
+
+
+class _UnsupportedSchema(Exception):
+    pass
+
+
+class _ValidatorCompiler(object):
+    def __init__(self):
+        """Generates the source code of a validation function"""
+        self._lines = []
+        self._num_vars = 0
+
+    def compile(self, schema):
+        self._emit(0, 'def validate(v0):')
+        self._emit_checks(schema, 'v0', 1)
+        self._emit(1, 'return None')
+        return '\n'.join(self._lines)
+
+    def _emit(self, indent, line):
+        self._lines.append('    ' * indent + line)
+
+    def _new_var(self):
+        self._num_vars += 1
+        return 'v{}'.format(self._num_vars)
+
+    def _emit_checks(self, schema, var, indent):
+        if not isinstance(schema, dict):
+            raise _UnsupportedSchema()
+        unsupported = set(schema.keys()) - _ANNOTATIONS - _ASSERTIONS
+        if unsupported:
+            raise _UnsupportedSchema()
+
+        types = schema.get('type')
+        if types is not None:
+            types = [types] if isinstance(types, str) else types
+            if any(t not in _TYPE_CHECKS for t in types):
+                raise _UnsupportedSchema()
+            self._emit(indent, 'if not ({}):'.format(
+                ' or '.join(_TYPE_CHECKS[t].format(var) for t in types)))
+            self._emit(indent + 1, 'fail("%r is not of type {}" % ({},))'
+                       .format(', '.join(repr(t) for t in types), var))
+
+        self._emit_object_checks(schema, types, var, indent)
+        self._emit_array_checks(schema, types, var, indent)
+        self._emit_number_checks(schema, types, var, indent)
+        self._emit_string_checks(schema, types, var, indent)
+
+    def _guard(self, types, json_type, var, indent):
+        """Emits a type guard, unless the instance type is already known"""
+        if types == [json_type]:
+            return indent
+        self._emit(indent, 'if {}:'.format(
+            _TYPE_CHECKS[json_type].format(var)))
+        return indent + 1
+
+    def _emit_object_checks(self, schema, types, var, indent):
+        properties = schema.get('properties', {})
+        required = schema.get('required', [])
+        additional = schema.get('additionalProperties', True)
+        if not isinstance(properties, dict) or not isinstance(additional,
+                                                              bool):
+            raise _UnsupportedSchema()
+        if (types is not None and 'object' not in types) or not (
+                properties or required or not additional):
+            return
+
+        start = len(self._lines)
+        indent = self._guard(types, 'object', var, indent)
+        guarded = len(self._lines)
+        for name in required:
+            self._emit(indent, 'if {!r} not in {}:'.format(name, var))
+            self._emit(indent + 1, 'fail({!r})'.format(
+                '{!r} is a required property'.format(name)))
+
+        if not additional:
+            self._emit(indent, 'extras = set({}).difference({!r})'.format(
+                var, sorted(properties)))
+            self._emit(indent, 'if extras:')
+            self._emit(indent + 1,
+                       'fail("Additional properties are not allowed '
+                       '(%s %s unexpected)" % (", ".join(map(repr, extras)), '
+                       '"was" if len(extras) == 1 else "were"))')
+
+        for name, subschema in properties.items():
+            child = self._new_var()
+            self._emit(indent, '{} = {}.get({!r}, MISSING)'.format(
+                child, var, name))
+            self._emit(indent, 'if {} is not MISSING:'.format(child))
+            num_lines = len(self._lines)
+            self._emit_checks(subschema, child, indent + 1)
+            if len(self._lines) == num_lines:
+                # Nothing to check for this property
+                del self._lines[-2:]
+
+        if len(self._lines) == guarded:
+            del self._lines[start:]
+
+    def _emit_array_checks(self, schema, types, var, indent):
+        items = schema.get('items')
+        if items is None or (types is not None and 'array' not in types):
+            return
+        if not isinstance(items, dict):
+            raise _UnsupportedSchema()
+
+        start = len(self._lines)
+        indent = self._guard(types, 'array', var, indent)
+        child = self._new_var()
+        self._emit(indent, 'for {} in {}:'.format(child, var))
+        num_lines = len(self._lines)
+        self._emit_checks(items, child, indent + 1)
+        if len(self._lines) == num_lines:
+            # Nothing to check for the items
+            del self._lines[start:]
+
+    def _emit_number_checks(self, schema, types, var, indent):
+        bounds = []
+        if 'minimum' in schema:
+            if schema.get('exclusiveMinimum', False):
+                bounds.append(('<=', schema['minimum'],
+                               'less than or equal to the minimum'))
+            else:
+                bounds.append(('<', schema['minimum'],
+                               'less than the minimum'))
+        if 'maximum' in schema:
+            if schema.get('exclusiveMaximum', False):
+                bounds.append(('>=', schema['maximum'],
+                               'greater than or equal to the maximum'))
+            else:
+                bounds.append(('>', schema['maximum'],
+                               'greater than the maximum'))
+        if not bounds or (types is not None and
+                          'number' not in types and 'integer' not in types):
+            return
+
+        if any(not isinstance(b[1], (int, float)) or isinstance(b[1], bool)
+               for b in bounds):
+            raise _UnsupportedSchema()
+
+        if types is not None and len(types) == 1:
+            number_indent = indent
+        else:
+            self._emit(indent, 'if {}:'.format(
+                _TYPE_CHECKS['number'].format(var)))
+            number_indent = indent + 1
+        for op, bound, description in bounds:
+            self._emit(number_indent, 'if {} {} {!r}:'.format(var, op, bound))
+            self._emit(number_indent + 1, 'fail("%r is {} of {!r}" % ({},))'
+                       .format(description, bound, var))
+
+    def _emit_string_checks(self, schema, types, var, indent):
+        lengths = []
+        if 'minLength' in schema:
+            lengths.append(('<', schema['minLength'], 'is too short'))
+        if 'maxLength' in schema:
+            lengths.append(('>', schema['maxLength'], 'is too long'))
+        if not lengths or (types is not None and 'string' not in types):
+            return
+        if any(not isinstance(n, int) for _, n, _ in lengths):
+            raise _UnsupportedSchema()
+
+        indent = self._guard(types, 'string', var, indent)
+        for op, length, description in lengths:
+            self._emit(indent, 'if len({}) {} {}:'.format(var, op, length))
+            self._emit(indent + 1, 'fail("%r {}" % ({},))'.format(
+                description, var))
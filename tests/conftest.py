@@ -17,10 +17,11 @@
 # This product includes software developed at
 # data.world, Inc.(http://data.world/).
 
-import asyncio
 from os import path
 
 import pytest
+from stub_api import StubApiServer
+from target_datadotworld.batching import BatchQueue
 
 
 @pytest.fixture(params=[5, 10, 15])
@@ -37,10 +38,10 @@ def records_queue(request, event_loop):
     async def produce(n, queue):
         for i in range(n):
             await queue.put({'id': i})
-        await queue.put(None)
+        queue.close()
 
-    queue = asyncio.Queue(loop=event_loop)
-    asyncio.ensure_future(produce(request.param, queue), loop=event_loop)
+    queue = BatchQueue(4, loop=event_loop)
+    event_loop.create_task(produce(request.param, queue))
 
     return queue, list(records_generator(request)())
 
@@ -49,3 +50,9 @@ def records_queue(request, event_loop):
 def test_files_path():
     root_dir = path.dirname(path.abspath(__file__))
     return path.join(root_dir, 'fixtures')
+
+
+@pytest.fixture()
+def api_stub():
+    with StubApiServer() as stub:
+        yield stub
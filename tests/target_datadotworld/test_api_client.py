@@ -19,16 +19,20 @@
 
 import asyncio
 import time
+from urllib.parse import parse_qs, urlparse
 
 import pytest
 import responses
 import target_datadotworld.exceptions as dwex
 from doublex import assert_that
-from hamcrest import equal_to, close_to, none
+from hamcrest import equal_to, close_to, none, has_item, has_properties, \
+    less_than_or_equal_to
 from requests import Request
 from requests.exceptions import ConnectionError
+from singer import metrics
 from target_datadotworld import api_client
 from target_datadotworld.api_client import ApiClient
+from target_datadotworld.batching import BatchQueue
 from target_datadotworld.utils import to_jsonlines
 
 
@@ -93,10 +97,9 @@ class TestApiClient(object):
                     client._api_url),
                 callback=verify_body_and_count)
 
-            consumer = asyncio.ensure_future(client.append_stream_chunked(
+            consumer = event_loop.create_task(client.append_stream_chunked(
                 'owner', 'dataset', 'stream', queue,
-                chunk_size=chunk_size, loop=event_loop), loop=event_loop)
-            await queue.join()
+                chunk_size=chunk_size, loop=event_loop))
             await consumer
 
     @pytest.mark.asyncio
@@ -116,12 +119,37 @@ class TestApiClient(object):
             status=404)
 
         with pytest.raises(dwex.ApiError):
-            consumer = asyncio.ensure_future(client.append_stream_chunked(
+            consumer = event_loop.create_task(client.append_stream_chunked(
                 'owner', 'dataset', 'stream', queue,
-                chunk_size=chunk_size, loop=event_loop), loop=event_loop)
-            await queue.join()
+                chunk_size=chunk_size, loop=event_loop))
             await consumer
 
+    @pytest.mark.asyncio
+    async def test_append_stream_chunked_weights(self, monkeypatch,
+                                                 event_loop):
+        client = ApiClient(api_token='just_a_test_token', max_threads=1,
+                           stream_weights={'heavy': 3})
+        uploads = []
+
+        def append_stream(owner, dataset, stream, records, trace=None):
+            uploads.append(stream)
+            time.sleep(0.01)
+
+        monkeypatch.setattr(client, 'append_stream', append_stream)
+
+        consumers = []
+        for stream in ('light', 'heavy'):
+            queue = BatchQueue(1, max_batches=20, loop=event_loop)
+            for i in range(20):
+                queue.put_nowait({'id': i})
+            queue.close()
+            consumers.append(client.append_stream_chunked(
+                'owner', 'dataset', stream, queue, 1, event_loop))
+        await asyncio.gather(*consumers)
+
+        # Three batches of heavy for each of light, while both have more
+        assert_that(uploads[:16].count('heavy'), close_to(12, 1))
+
     @responses.activate
     def test_append_stream_error(self, client):
         with responses.RequestsMock() as rsps:
@@ -133,6 +161,58 @@ class TestApiClient(object):
                 client.append_stream(
                     'owner', 'dataset', 'stream', [{'hello': 'world'}])
 
+    def test_append_stream_split(self, client):
+        records = [{'id': i} for i in range(5)]
+        bodies = []
+
+        def reject_large(req):
+            lines = req.body.decode('utf-8').split('\n')
+            if len(lines) > 2:
+                return 413, {}, None
+            bodies.extend(lines)
+            return 200, {}, None
+
+        with responses.RequestsMock() as rsps:
+            rsps.add_callback(
+                'POST',
+                '{}/streams/owner/dataset/stream'.format(client._api_url),
+                callback=reject_large)
+            client.append_stream('owner', 'dataset', 'stream', records)
+
+        assert_that(bodies, equal_to(to_jsonlines(records).split('\n')))
+
+    def test_append_stream_max_payload(self, monkeypatch):
+        client = ApiClient(api_token='just_a_test_token',
+                           max_payload_bytes=20)
+        records = [{'id': i} for i in range(5)]
+        points = []
+        monkeypatch.setattr(metrics, 'log',
+                            lambda logger, point: points.append(point))
+
+        with responses.RequestsMock() as rsps:
+            rsps.add(
+                'POST',
+                '{}/streams/owner/dataset/stream'.format(client._api_url),
+                status=200)
+            client.append_stream('owner', 'dataset', 'stream', records)
+            assert_that(len(rsps.calls), equal_to(3))
+            for call in rsps.calls:
+                assert_that(len(call.request.body), less_than_or_equal_to(20))
+
+        assert_that(points, has_item(has_properties(
+            metric='batch_splits', value=2)))
+
+    def test_append_stream_record_too_large(self, client):
+        with responses.RequestsMock() as rsps:
+            rsps.add(
+                'POST',
+                '{}/streams/owner/dataset/stream'.format(client._api_url),
+                status=413)
+            with pytest.raises(dwex.RecordTooLargeError):
+                client.append_stream('owner', 'dataset', 'stream',
+                                     [{'id': 1}, {'id': 2}])
+            assert_that(len(rsps.calls), equal_to(2))
+
     @responses.activate
     def test_connection_check(self, client):
         responses.add(
@@ -171,6 +251,19 @@ class TestApiClient(object):
         cur_version = client.get_current_version('owner', 'dataset', 'stream')
         assert_that(cur_version, equal_to(expected_resp[0]['singer_version']))
 
+    @responses.activate
+    def test_get_current_version_query(self, client):
+        responses.add(
+            'GET', '{}/sql/owner/dataset'.format(client._api_url),
+            json=[], status=200
+        )
+
+        client.get_current_version('owner', 'dataset', 'my-stream')
+        query = parse_qs(urlparse(responses.calls[0].request.url).query)
+        assert_that(query['query'][0], equal_to(
+            'SELECT singer_version FROM `owner`.`dataset`.`my_stream` '
+            'LIMIT 1'))
+
     @responses.activate
     def test_get_current_version_missing_column(self, client):
         expected_resp = [{'another_property': 'not_singer_version'}]
@@ -270,6 +363,32 @@ class TestApiClient(object):
         with pytest.raises(dwex.ApiError):
             client.truncate_stream_records('owner', 'dataset', 'stream')
 
+    def test_upload_file(self, api_stub, tmpdir):
+        client = ApiClient(api_token='just_a_test_token',
+                           api_url=api_stub.url)
+        file = tmpdir.join('stream.jsonl.gz')
+        file.write_binary(b'compressed')
+
+        client.upload_file('owner', 'dataset', 'stream.jsonl.gz', str(file))
+
+        method, url, headers, body = api_stub.requests[0]
+        assert_that(method, equal_to('PUT'))
+        assert_that(url, equal_to(
+            '/v0/uploads/owner/dataset/files/stream.jsonl.gz'))
+        assert_that(body, equal_to(b'compressed'))
+
+    def test_upload_file_error(self, api_stub, tmpdir):
+        client = ApiClient(api_token='just_a_test_token',
+                           api_url=api_stub.url)
+        api_stub.statuses[
+            '/v0/uploads/owner/dataset/files/stream.jsonl.gz'] = 403
+        file = tmpdir.join('stream.jsonl.gz')
+        file.write_binary(b'compressed')
+
+        with pytest.raises(dwex.ForbiddenError):
+            client.upload_file('owner', 'dataset', 'stream.jsonl.gz',
+                               str(file))
+
     @responses.activate
     def test_create_dataset(self, client):
         expected_resp = {'message': 'Success'}
@@ -0,0 +1,105 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import asyncio
+
+import pytest
+from doublex import assert_that
+from hamcrest import equal_to, none
+
+from target_datadotworld.batching import BatchQueue
+from target_datadotworld.utils import to_chunks
+
+
+@pytest.mark.asyncio
+async def test_batch_queue(event_loop):
+    queue = BatchQueue(2, loop=event_loop)
+    for i in range(5):
+        queue.put_nowait(i)
+    queue.close()
+
+    batches = []
+    while True:
+        batch = await queue.get_batch()
+        if batch is None:
+            break
+        batches.append(batch)
+    assert_that(batches, equal_to([[0, 1], [2, 3], [4]]))
+
+
+@pytest.mark.asyncio
+async def test_batch_queue_consumer_woken_by_batch(event_loop):
+    queue = BatchQueue(2, loop=event_loop)
+    getter = event_loop.create_task(queue.get_batch())
+
+    queue.put_nowait(0)
+    await asyncio.sleep(0)
+    assert_that(getter.done(), equal_to(False))
+
+    queue.put_nowait(1)
+    assert_that(await getter, equal_to([0, 1]))
+
+
+@pytest.mark.asyncio
+async def test_batch_queue_backpressure(event_loop):
+    queue = BatchQueue(2, max_batches=1, loop=event_loop)
+    queue.put_nowait(0)
+    queue.put_nowait(1)
+    assert_that(queue.full(), equal_to(True))
+
+    putter = event_loop.create_task(queue.put(2))
+    await asyncio.sleep(0)
+    assert_that(putter.done(), equal_to(False))
+
+    assert_that(await queue.get_batch(), equal_to([0, 1]))
+    await putter
+    assert_that(queue.discard(), equal_to([2]))
+    assert_that(await queue.get_batch(), none())
+
+
+@pytest.mark.asyncio
+async def test_batch_queue_linger(event_loop):
+    queue = BatchQueue(3, loop=event_loop, linger=0.05)
+    getter = event_loop.create_task(queue.get_batch())
+
+    queue.put_nowait(0)
+    await asyncio.sleep(0.01)
+    queue.put_nowait(1)
+    assert_that(getter.done(), equal_to(False))
+    assert_that(await asyncio.wait_for(getter, 1), equal_to([0, 1]))
+
+    # Lingering starts over with the next batch, and ends once it's full
+    for i in range(2, 5):
+        queue.put_nowait(i)
+    assert_that(await queue.get_batch(), equal_to([2, 3, 4]))
+    await asyncio.sleep(0.1)
+    queue.close()
+    assert_that(await queue.get_batch(), none())
+
+
+@pytest.mark.asyncio
+async def test_to_chunks_lingered(event_loop):
+    queue = BatchQueue(2, loop=event_loop, linger=0.01)
+    chunks = to_chunks(queue, 3)
+    for i in range(4):
+        queue.put_nowait(i)
+    assert_that(await chunks.__anext__(), equal_to([0, 1, 2]))
+    # The rest of the partial batch isn't held back for more records
+    assert_that(await asyncio.wait_for(chunks.__anext__(), 1),
+                equal_to([3]))
+    queue.close()
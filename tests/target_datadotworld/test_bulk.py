@@ -0,0 +1,43 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+
+import gzip
+import json
+from os import path
+
+from doublex import assert_that
+from hamcrest import equal_to
+
+from target_datadotworld.bulk import BulkLoad
+
+
+def test_bulk_load(tmpdir):
+    bulk_load = BulkLoad('my-stream', directory=str(tmpdir))
+    bulk_load.write([{'id': 1}, {'id': 2}])
+    bulk_load.write([{'id': 3}])
+    bulk_load.close()
+
+    with gzip.open(bulk_load.path, 'rt') as f:
+        records = [json.loads(line) for line in f]
+    assert_that(records, equal_to([{'id': 1}, {'id': 2}, {'id': 3}]))
+    assert_that(bulk_load.record_count, equal_to(3))
+    assert_that(bulk_load.filename, equal_to('my_stream.jsonl.gz'))
+
+    bulk_load.discard()
+    assert_that(path.exists(bulk_load.path), equal_to(False))
@@ -0,0 +1,94 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+
+import threading
+import time
+
+from doublex import assert_that
+from hamcrest import equal_to, none
+
+from target_datadotworld.cache import FileCache, MemoryCache
+
+
+def test_file_cache(tmpdir):
+    cache_file = str(tmpdir.join('cache.json'))
+    cache = FileCache(cache_file)
+    cache.set('owner/dataset/stream', 123456)
+
+    assert_that(FileCache(cache_file).get('owner/dataset/stream'),
+                equal_to(123456))
+    assert_that(FileCache(cache_file).get('owner/dataset/other'), none())
+
+    cache.delete('owner/dataset/stream')
+    assert_that(FileCache(cache_file).get('owner/dataset/stream'), none())
+
+
+def test_file_cache_expired(tmpdir, monkeypatch):
+    cache_file = str(tmpdir.join('cache.json'))
+    FileCache(cache_file, ttl=60).set('key', 'value')
+
+    assert_that(FileCache(cache_file, ttl=60).get('key'), equal_to('value'))
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert_that(FileCache(cache_file, ttl=60).get('key'), none())
+
+
+def test_file_cache_unreadable(tmpdir):
+    cache_file = tmpdir.join('cache.json')
+    cache_file.write('not json')
+
+    cache = FileCache(str(cache_file))
+    assert_that(cache.get('key'), none())
+    cache.set('key', 'value')
+    assert_that(FileCache(str(cache_file)).get('key'), equal_to('value'))
+
+
+def test_file_cache_concurrent_writers(tmpdir):
+    cache_file = str(tmpdir.join('cache.json'))
+    caches = [FileCache(cache_file), FileCache(cache_file)]
+
+    def write(n):
+        for i in range(50):
+            caches[n].set('{}/{}'.format(n, i), i)
+
+    writers = [threading.Thread(target=write, args=(n,)) for n in (0, 1)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    # Neither overwrote the other's entries, and each sees them
+    for cache in caches + [FileCache(cache_file)]:
+        assert_that([cache.get('{}/{}'.format(n, i))
+                     for n in (0, 1) for i in range(50)],
+                    equal_to(list(range(50)) * 2))
+
+
+def test_memory_cache(monkeypatch):
+    cache = MemoryCache(ttl=60)
+    cache.set('key', 'value')
+    assert_that(cache.get('key'), equal_to('value'))
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 61)
+    assert_that(cache.get('key'), none())
+
+    cache.set('key', 'value')
+    cache.delete('key')
+    assert_that(cache.get('key'), none())
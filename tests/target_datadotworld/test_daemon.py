@@ -0,0 +1,105 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import asyncio
+import json
+import os
+
+import pytest
+from doublex import assert_that
+from hamcrest import equal_to, has_entries
+
+from target_datadotworld.daemon import TargetDaemon
+from target_datadotworld.utils import read_line_blocks
+
+
+@pytest.fixture()
+def daemon_config(api_stub):
+    api_stub.bodies['/v0/datasets/rafael/my-dataset'] = {'status': 'LOADED'}
+    return {
+        'api_token': 'eyJhbGciOiJIUzUxMiJ9.eyJzdWIiOiJwcm9kLXVzZXItY2xpZW'
+                     '50OnJhZmFlbCIsImlzcyI6ImFnZW50OnJhZmFlbDo6YjY1NTgxO'
+                     'DItMjRkNy00MWZiLTkxNTAtNjZlNDBhNjNjNjQ5IiwiaWF0Ijox'
+                     'NTA1MTY0NTQ4LCJyb2xlIjpbInVzZXJfYXBpX3JlYWQiLCJ1c2V'
+                     'yX2FwaV93cml0ZSJdLCJnZW5lcmFsLXB1cnBvc2UiOnRydWV9.n'
+                     '9FsdsBZ03wx0A-QK1wq2tGyinaqUcjaotp-rnWCMoMOY83ivypu'
+                     'B3FcjTGzJPFIGZbJsES_bx0itijwz5mQvg',
+        'dataset_id': 'my-dataset',
+        'dataset_owner': 'rafael',
+        'api_url': api_stub.url
+    }
+
+
+async def send_session(path, lines):
+    reader, writer = await asyncio.open_unix_connection(path)
+    for line in lines:
+        writer.write((line + '\n').encode('utf-8'))
+    writer.write_eof()
+    responses = [json.loads(line) async for block in read_line_blocks(reader)
+                 for line in block]
+    writer.close()
+    return responses
+
+
+@pytest.mark.asyncio
+async def test_daemon_sessions(tmpdir, daemon_config, api_stub, event_loop):
+    socket_path = str(tmpdir.join('target.sock'))
+    daemon = TargetDaemon(daemon_config)
+    serving = event_loop.create_task(
+        daemon.serve(socket_path, loop=event_loop))
+    while not os.path.exists(socket_path):
+        await asyncio.sleep(0.01)
+
+    def session(number):
+        return send_session(socket_path, [
+            '{"type": "SCHEMA", "stream": "s", "key_properties": [], '
+            '"schema": {"properties": {"id": {"type": "integer"}}}}',
+            '{"type": "RECORD", "stream": "s", "record": {"id": 1}}',
+            '{"type": "STATE", "value": {"session": %d}}' % number
+        ])
+
+    assert_that(await session(1), equal_to(
+        [{'type': 'STATE', 'value': {'session': 1}}]))
+    responses = await asyncio.gather(session(2), session(3))
+    assert_that(responses, equal_to([
+        [{'type': 'STATE', 'value': {'session': 2}}],
+        [{'type': 'STATE', 'value': {'session': 3}}]]))
+
+    failed = await send_session(socket_path, ['not json'])
+    assert_that(failed[0], has_entries({'type': 'ERROR'}))
+
+    daemon.stop()
+    await serving
+    assert_that(os.path.exists(socket_path), equal_to(False))
+
+    # Sessions share the API client and the datasets found in good state
+    assert_that(sum(1 for method, url, _, _ in api_stub.requests
+                    if url == '/v0/datasets/rafael/my-dataset'),
+                equal_to(1))
+
+
+@pytest.mark.asyncio
+async def test_read_line_blocks(event_loop):
+    reader = asyncio.StreamReader(loop=event_loop)
+    reader.feed_data(b'{"a": 1}\n{"b"')
+    reader.feed_data(b': 2}\n{"c": 3}')
+    reader.feed_eof()
+
+    lines = [line async for block in read_line_blocks(reader, read_size=4)
+             for line in block]
+    assert_that(lines, equal_to([b'{"a": 1}\n', b'{"b": 2}\n', b'{"c": 3}']))
@@ -0,0 +1,64 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import json
+from datetime import datetime, timezone
+
+import pytest
+from doublex import assert_that
+from hamcrest import equal_to, same_instance
+from singer import utils
+
+from target_datadotworld.enrichment import PendingRecord, \
+    TimestampFormatter, enrich
+
+
+@pytest.mark.parametrize('t', [
+    0, 1510099200, 1510099200.5, 1510099200.000001, 1510099200.999999,
+    1510099200.9999996, 1510099200.123456
+])
+def test_format_time(t):
+    expected = utils.strftime(
+        datetime.fromtimestamp(t, timezone.utc))
+    assert_that(TimestampFormatter().format_time(t), equal_to(expected))
+
+
+def test_format_datetime():
+    formatter = TimestampFormatter()
+    dt = datetime(2017, 11, 8, 1, 2, 3, 456, tzinfo=timezone.utc)
+    formatted = formatter.format_datetime(dt)
+    assert_that(formatted, equal_to('2017-11-08T01:02:03.000456Z'))
+    assert_that(formatter.format_datetime(
+        dt.replace(microsecond=456)), same_instance(formatted))
+
+
+def test_enrich():
+    dt = datetime(2017, 11, 8, tzinfo=timezone.utc)
+    records = [
+        PendingRecord({'id': 1}, None, dt, 0, 123, 10),
+        PendingRecord(None, '{"id": 2}', None, 1510099200.5, None, 10),
+        {'id': 3}
+    ]
+    enriched = enrich(records)
+    assert_that(enriched[0], equal_to({
+        'id': 1, 'singer_timestamp': '2017-11-08T00:00:00.000000Z',
+        'singer_version': 123}))
+    assert_that(json.loads(enriched[1]), equal_to({
+        'id': 2, 'singer_timestamp': '2017-11-08T00:00:00.500000Z',
+        'singer_version': None}))
+    assert_that(enriched[2], equal_to({'id': 3}))
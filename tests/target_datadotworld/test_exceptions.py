@@ -21,10 +21,13 @@ import pytest
 import requests
 import requests.exceptions as rqex
 import responses
+from doublex import assert_that
+from hamcrest import equal_to
 
 from target_datadotworld.exceptions import ApiError, UnauthorizedError, \
     ForbiddenError, NotFoundError, TooManyRequestsError, \
-    ConnectionError, convert_requests_exception
+    ConnectionError, UnparseableMessageError, convert_requests_exception, \
+    is_transient
 
 
 @pytest.mark.parametrize("status_code,expected_error", [
@@ -52,3 +55,26 @@ def test_convert_requests_exception_offline():
             requests.get('https://acme.inc/api').raise_for_status()
         except rqex.ConnectionError as e:
             raise convert_requests_exception(e)
+
+
+def test_unparseable_message_bytes():
+    error = UnparseableMessageError(b'{"type" "RECORD"}', 'Expecting :')
+    assert_that(error.message, equal_to(
+        'Unable to parse message {"type" "RECORD"} (Cause: Expecting :)'))
+
+
+@pytest.mark.parametrize("status_code,transient", [
+    (400, False),
+    (404, False),
+    (429, True),
+    (500, True),
+    (503, True)
+])
+@responses.activate
+def test_is_transient(status_code, transient):
+    responses.add('GET', 'https://acme.inc/api/status', status=status_code)
+    try:
+        requests.get('https://acme.inc/api/status').raise_for_status()
+    except rqex.HTTPError as e:
+        assert_that(is_transient(convert_requests_exception(e)),
+                    equal_to(transient))
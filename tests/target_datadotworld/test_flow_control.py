@@ -0,0 +1,68 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import time
+
+from doublex import assert_that
+from hamcrest import equal_to
+
+from target_datadotworld.flow_control import AdaptiveLimit, CircuitBreaker
+
+
+def test_adaptive_limit():
+    limit = AdaptiveLimit(4, minimum=1, maximum=8)
+    for _ in range(40):
+        limit.on_success(0.1)
+    assert_that(limit.value, equal_to(8))
+
+    limit.on_failure()
+    assert_that(limit.value, equal_to(4))
+    for _ in range(5):
+        limit.on_failure()
+    assert_that(limit.value, equal_to(1))
+
+
+def test_adaptive_limit_latency():
+    limit = AdaptiveLimit(8)
+    limit.on_success(0.1)
+    for _ in range(10):
+        limit.on_success(1.0)
+    assert_that(limit.value < 8, equal_to(True))
+
+
+def test_circuit_breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=30)
+    breaker.on_failure()
+    assert_that(breaker.allow(), equal_to(True))
+    breaker.on_failure()
+    assert_that(breaker.state, equal_to(CircuitBreaker.OPEN))
+    assert_that(breaker.allow(), equal_to(False))
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 31)
+    # A single probe is let through once cooled down
+    assert_that(breaker.allow(), equal_to(True))
+    assert_that(breaker.allow(), equal_to(False))
+    breaker.on_failure()
+    assert_that(breaker.state, equal_to(CircuitBreaker.OPEN))
+
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 62)
+    assert_that(breaker.allow(), equal_to(True))
+    breaker.on_success()
+    assert_that(breaker.state, equal_to(CircuitBreaker.CLOSED))
+    assert_that(breaker.allow(), equal_to(True))
@@ -0,0 +1,145 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+
+import pytest
+from doublex import assert_that
+from hamcrest import equal_to, is_not
+
+from target_datadotworld.api_client import ApiClient
+from target_datadotworld.batching import BatchQueue
+from target_datadotworld.enrichment import PendingRecord
+from target_datadotworld.exceptions import ConnectionError
+from target_datadotworld.flow_control import CircuitBreaker
+from target_datadotworld.journal import UploadJournal, batch_digest
+from target_datadotworld.target import TargetDataDotWorld
+
+
+def test_journal(tmpdir):
+    journal_file = str(tmpdir.join('journal.jsonl'))
+    journal = UploadJournal(journal_file)
+    for digest in ('a', 'b'):
+        journal.acknowledge('stream', journal.next_sequence('stream'),
+                            digest)
+    journal.close()
+
+    journal = UploadJournal(journal_file)
+    assert_that(journal.is_acknowledged('stream', 0, 'a'), equal_to(True))
+    assert_that(journal.is_acknowledged('stream', 1, 'c'), equal_to(False))
+    # Diverged replays are uploaded from then on
+    assert_that(journal.is_acknowledged('stream', 0, 'a'), equal_to(False))
+    assert_that(journal.is_acknowledged('other', 0, 'a'), equal_to(False))
+
+    journal.checkpoint()
+    assert_that(journal.next_sequence('stream'), equal_to(0))
+    assert_that(UploadJournal(journal_file).is_acknowledged(
+        'stream', 0, 'a'), equal_to(False))
+
+
+def test_journal_interrupted_write(tmpdir):
+    journal_file = tmpdir.join('journal.jsonl')
+    journal_file.write('{"stream": "stream", "sequence": 0, "hash": "a"}\n'
+                       '{"stream": "stream", "seq')
+
+    journal = UploadJournal(str(journal_file))
+    assert_that(journal.is_acknowledged('stream', 0, 'a'), equal_to(True))
+
+
+def test_batch_digest():
+    def batch(received_at):
+        return [PendingRecord({'id': 1}, None, None, received_at, 1, 10),
+                PendingRecord({'id': 2}, '{"id": 2}', None, received_at, 1,
+                              10)]
+
+    assert_that(batch_digest(batch(1.0)), equal_to(batch_digest(batch(2.0))))
+    assert_that(batch_digest(batch(1.0)),
+                is_not(batch_digest(batch(1.0)[:1])))
+
+
+@pytest.mark.asyncio
+async def test_retried_batch(tmpdir, monkeypatch, event_loop):
+    journal_file = str(tmpdir.join('journal.jsonl'))
+    client = ApiClient('no_token_needed',
+                       upload_journal=UploadJournal(journal_file),
+                       circuit_breaker=CircuitBreaker(cooldown=0))
+    posts = []
+
+    def post_lines(owner, dataset, stream, data):
+        posts.append(data)
+        if len(posts) == 1:
+            raise ConnectionError(None)
+
+    monkeypatch.setattr(client, '_post_lines', post_lines)
+
+    def batch():
+        return [PendingRecord({'id': i}, None, None, 1.0, 1, 10)
+                for i in range(3)]
+
+    queue = BatchQueue(3, loop=event_loop)
+    for record in batch():
+        queue.put_nowait(record)
+    queue.close()
+    await client.append_stream_chunked('owner', 'dataset', 'stream', queue,
+                                       3, event_loop)
+
+    # Journaled as received, even though records were enriched by then
+    assert_that(len(posts), equal_to(2))
+    assert_that(UploadJournal(journal_file).is_acknowledged(
+        'stream', 0, batch_digest(batch())), equal_to(True))
+
+
+@pytest.mark.asyncio
+async def test_process_replayed_lines(tmpdir, api_stub):
+    config = {
+        'api_token': 'eyJhbGciOiJIUzUxMiJ9.eyJzdWIiOiJwcm9kLXVzZXItY2xpZW'
+                     '50OnJhZmFlbCIsImlzcyI6ImFnZW50OnJhZmFlbDo6YjY1NTgxO'
+                     'DItMjRkNy00MWZiLTkxNTAtNjZlNDBhNjNjNjQ5IiwiaWF0Ijox'
+                     'NTA1MTY0NTQ4LCJyb2xlIjpbInVzZXJfYXBpX3JlYWQiLCJ1c2V'
+                     'yX2FwaV93cml0ZSJdLCJnZW5lcmFsLXB1cnBvc2UiOnRydWV9.n'
+                     '9FsdsBZ03wx0A-QK1wq2tGyinaqUcjaotp-rnWCMoMOY83ivypu'
+                     'B3FcjTGzJPFIGZbJsES_bx0itijwz5mQvg',
+        'dataset_id': 'my-dataset',
+        'dataset_owner': 'rafael',
+        'api_url': api_stub.url,
+        'upload_journal': str(tmpdir.join('journal.jsonl'))
+    }
+    api_stub.bodies['/v0/datasets/rafael/my-dataset'] = {'status': 'LOADED'}
+
+    def lines(record_count):
+        yield ('{"type": "SCHEMA", "stream": "s", "key_properties": [], '
+               '"schema": {"properties": {"id": {"type": "integer"}}}}')
+        for i in range(record_count):
+            yield '{"type": "RECORD", "stream": "s", "record": {"id": %d}}' % i
+
+    def uploaded_records():
+        return sum(len(body.splitlines())
+                   for method, url, _, body in api_stub.requests
+                   if method == 'POST' and url.startswith('/v0/streams/'))
+
+    # Interrupted before a state was emitted, after 25 records
+    target = TargetDataDotWorld(config, batch_size=10)
+    async for _ in target.process_lines(lines(25)):  # noqa: F841
+        pass
+    assert_that(uploaded_records(), equal_to(25))
+
+    # Replayed, with more records since
+    del api_stub.requests[:]
+    target = TargetDataDotWorld(config, batch_size=10)
+    async for _ in target.process_lines(lines(30)):  # noqa: F841
+        pass
+    assert_that(uploaded_records(), equal_to(10))
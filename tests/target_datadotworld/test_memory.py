@@ -0,0 +1,83 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+from doublex import assert_that
+from hamcrest import equal_to, greater_than, has_item, has_key, is_not
+from singer import metrics
+
+from target_datadotworld.enrichment import PendingRecord
+from target_datadotworld.memory import MemoryTracker, chunk_bytes, \
+    current_rss
+
+
+def test_current_rss():
+    assert_that(current_rss(), greater_than(0))
+
+
+def test_chunk_bytes():
+    chunk = [PendingRecord({}, None, None, 0, None, 10),
+             PendingRecord({}, None, None, 0, None, 5),
+             {'id': 1}]
+    assert_that(chunk_bytes(chunk), equal_to(15))
+
+
+def test_peaks():
+    tracker = MemoryTracker()
+    tracker.add('a', 'queued', 100)
+    tracker.add('b', 'queued', 50)
+    tracker.move('a', 'queued', 'batched', 60)
+    tracker.add('a', 'serialized', 80)
+    tracker.remove('a', 'batched', 60)
+    tracker.remove('a', 'serialized', 80)
+
+    report = tracker.report()
+    assert_that(report['peak_buffered'], equal_to(230))
+    assert_that(report['peak_buffered_by_stream'], equal_to({
+        'a': {'queued': 100, 'batched': 60, 'serialized': 80},
+        'b': {'queued': 50}
+    }))
+
+
+def test_sample():
+    tracker = MemoryTracker(trace=True)
+    tracker.start()
+    tracker.add('a', 'queued', 100)
+    ballast = b'x' * (64 << 20)  # noqa: F841
+    tracker.stop()
+
+    report = tracker.report()
+    assert_that(report['peak_rss'], greater_than(64 << 20))
+    assert_that(report['buffered_at_peak_rss'], equal_to(
+        {'a': {'queued': 100}}))
+    assert_that(report, has_key('top_allocations'))
+
+
+def test_log_report(monkeypatch):
+    points = []
+    monkeypatch.setattr(metrics, 'log',
+                        lambda logger, point: points.append(point))
+
+    tracker = MemoryTracker()
+    tracker.add('a', 'queued', 100)
+    tracker.sample()
+    report = tracker.log_report()
+
+    assert_that(points, has_item(metrics.Point(
+        'gauge', 'peak_buffered_bytes', 100,
+        {'stream': 'a', 'stage': 'queued'})))
+    assert_that(report, is_not(has_key('top_allocations')))
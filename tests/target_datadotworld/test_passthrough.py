@@ -0,0 +1,126 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import glob
+from os import path
+
+import pytest
+import simplejson
+import singer
+from doublex import assert_that
+from hamcrest import equal_to, none, instance_of
+
+from target_datadotworld.passthrough import parse_message, splice
+from target_datadotworld.utils import to_jsonlines
+
+RECORD_LINES = [
+    '{"type": "RECORD", "stream": "s", "record": {"id": 1}}',
+    '{"type":"RECORD","stream":"s","record":{"id":1,"a":[1,{"b":null}]}}',
+    '  { "type" : "RECORD" , "record" : { "id" : 1 } , "stream" : "s" }\n',
+    '{"type": "RECORD", "stream": "s", "record": {}}',
+    '{"type": "RECORD", "stream": "s", "record": { }, "version": 3}',
+    '{"type": "RECORD", "stream": "s", "record": {"price": 1.10, '
+    '"big": 12345678901234567890.123456789, "e": 1e5}}',
+    '{"type": "RECORD", "stream": "s", "record": {"name": "caf\\u00e9 '
+    'é \\"}\\" \\n"}}',
+    '{"type": "RECORD", "stream": "s", "record": {"id": 1, '
+    '"singer_version": 9}, "time_extracted": "2017-11-08T01:02:03Z"}',
+]
+
+
+@pytest.mark.parametrize('line', RECORD_LINES)
+def test_parse_message(line):
+    msg, raw_record = parse_message(line)
+    expected = singer.parse_message(line)
+    assert_that(msg, equal_to(expected))
+    assert_that(simplejson.loads(raw_record, use_decimal=True),
+                equal_to(expected.record))
+
+
+@pytest.mark.parametrize('line', RECORD_LINES)
+def test_parse_message_bytes(line):
+    assert_that(parse_message(line.encode('utf-8')),
+                equal_to(parse_message(line)))
+
+
+@pytest.mark.parametrize('line', RECORD_LINES)
+@pytest.mark.parametrize('version', [None, 1510120918000, '654321'])
+def test_splice(line, version):
+    msg, raw_record = parse_message(line)
+    timestamp = '2017-11-08T00:00:00.000000Z'
+
+    expected = singer.parse_message(line).record
+    expected.update({'singer_timestamp': timestamp,
+                     'singer_version': version})
+
+    spliced = to_jsonlines([splice(raw_record, timestamp, version)])
+    assert_that(simplejson.loads(spliced, use_decimal=True),
+                equal_to(expected))
+    # Original text is kept as is
+    assert_that(spliced.startswith(raw_record[:-1].rstrip()),
+                equal_to(True))
+
+
+def test_parse_fixtures(test_files_path):
+    for file_path in glob.glob(path.join(test_files_path, '*.jsonl')):
+        with open(file_path) as file:
+            for line in file:
+                try:
+                    expected = singer.parse_message(line)
+                except Exception as e:
+                    with pytest.raises(type(e)):
+                        parse_message(line)
+                    continue
+
+                msg, raw_record = parse_message(line)
+                assert_that(msg, equal_to(expected))
+                if isinstance(expected, singer.RecordMessage):
+                    assert_that(raw_record, instance_of(str))
+                    assert_that(raw_record in line, equal_to(True))
+                else:
+                    assert_that(raw_record, none())
+
+
+@pytest.mark.parametrize('line', [
+    '{"type": "SCHEMA", "stream": "s", "schema": {}, "key_properties": []}',
+    '{"type": "STATE", "value": {"a": 1}}',
+    '{"type": "ACTIVATE_VERSION", "stream": "s", "version": 1}',
+    '{"type": "RECORD", "stream": "s", "record": [1, 2]}',
+    '{"type": "RECORD", "stream": "s", "record": {"id": 1}, "\\u0061": 1}'
+])
+def test_parse_message_not_spliced(line):
+    msg, raw_record = parse_message(line)
+    assert_that(msg, equal_to(singer.parse_message(line)))
+    assert_that(raw_record, none())
+
+
+@pytest.mark.parametrize('line', [
+    '',
+    '[]',
+    '{"type": "RECORD"',
+    '{"type": "RECORD",}',
+    '{"type" "RECORD"}',
+    '{type: "RECORD"}',
+    '{"type": "RECORD"} {}',
+    '{"type": "RECORD" "stream": "s"}'
+])
+def test_parse_message_invalid(line):
+    with pytest.raises(Exception) as expected:
+        singer.parse_message(line)
+    with pytest.raises(expected.type):
+        parse_message(line)
@@ -0,0 +1,209 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from doublex import assert_that
+from hamcrest import equal_to, less_than_or_equal_to, \
+    greater_than_or_equal_to
+
+from target_datadotworld.exceptions import ConnectionError
+from target_datadotworld.flow_control import AdaptiveLimit, CircuitBreaker
+from target_datadotworld.scheduler import UploadScheduler, MAX_ATTEMPTS
+
+
+class TestUploadScheduler(object):
+    @pytest.fixture()
+    def executor(self):
+        executor = ThreadPoolExecutor(max_workers=4)
+        yield executor
+        executor.shutdown()
+
+    @staticmethod
+    async def run(scheduler, jobs, event_loop):
+        order = []
+
+        def upload(stream):
+            order.append(stream)
+            return stream
+
+        # Holds the only slot until all jobs are submitted
+        blocker = threading.Event()
+        first = asyncio.ensure_future(scheduler.submit(
+            'blocker', blocker.wait, loop=event_loop), loop=event_loop)
+        await asyncio.sleep(0.01)
+
+        tasks = [asyncio.ensure_future(scheduler.submit(
+            stream, lambda s=stream: upload(s), loop=event_loop),
+            loop=event_loop) for stream in jobs]
+        await asyncio.sleep(0.01)
+        blocker.set()
+
+        results = await asyncio.gather(*tasks)
+        await first
+        assert_that(results, equal_to(jobs))
+        return order
+
+    @pytest.mark.asyncio
+    async def test_fair_share(self, executor, event_loop):
+        scheduler = UploadScheduler(executor, 1)
+        order = await self.run(
+            scheduler, ['firehose'] * 10 + ['small'], event_loop)
+        assert_that(order.index('small'), less_than_or_equal_to(1))
+
+    @pytest.mark.asyncio
+    async def test_weights(self, executor, event_loop):
+        scheduler = UploadScheduler(executor, 1, weights={'heavy': 3})
+        order = await self.run(
+            scheduler, ['light'] * 8 + ['heavy'] * 8, event_loop)
+        assert_that(order[:8].count('heavy'), equal_to(6))
+
+    @pytest.mark.asyncio
+    async def test_max_concurrency(self, executor, event_loop):
+        scheduler = UploadScheduler(executor, 2)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def upload():
+            with lock:
+                running.append(None)
+                peak.append(len(running))
+            threading.Event().wait(0.01)
+            with lock:
+                running.pop()
+
+        await asyncio.gather(*[
+            scheduler.submit('stream-{}'.format(i % 3), upload,
+                             loop=event_loop)
+            for i in range(12)])
+        assert_that(max(peak), equal_to(2))
+
+    @pytest.mark.asyncio
+    async def test_stream_order(self, executor, event_loop):
+        scheduler = UploadScheduler(executor, 4,
+                                    breaker=CircuitBreaker(cooldown=0))
+        uploads = []
+
+        def upload(n):
+            uploads.append(n)
+            threading.Event().wait(0.01)
+            if uploads.count(n) == 1 and n == 1:
+                raise ConnectionError(None)
+
+        await asyncio.gather(*[
+            scheduler.submit('stream', lambda n=n: upload(n),
+                             loop=event_loop)
+            for n in range(4)])
+        # One at a time, with the retry ahead of later uploads
+        assert_that(uploads, equal_to([0, 1, 1, 2, 3]))
+
+    @pytest.mark.asyncio
+    async def test_error_and_cancellation(self, executor, event_loop):
+        scheduler = UploadScheduler(executor, 1)
+
+        def fail():
+            raise ValueError()
+
+        with pytest.raises(ValueError):
+            await scheduler.submit('stream', fail, loop=event_loop)
+
+        blocker = threading.Event()
+        first = asyncio.ensure_future(scheduler.submit(
+            'stream', blocker.wait, loop=event_loop), loop=event_loop)
+        cancelled = asyncio.ensure_future(scheduler.submit(
+            'stream', lambda: None, loop=event_loop), loop=event_loop)
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        blocker.set()
+        await first
+
+        # Slots were all given back
+        assert_that(await scheduler.submit('stream', lambda: 1,
+                                           loop=event_loop), equal_to(1))
+        assert_that(scheduler._running, equal_to(0))
+
+    @pytest.mark.asyncio
+    async def test_retry_with_circuit_breaker(self, executor, event_loop):
+        limit = AdaptiveLimit(2, maximum=4)
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+        scheduler = UploadScheduler(executor, 4, limit=limit,
+                                    breaker=breaker)
+        attempts = []
+
+        def flaky():
+            attempts.append(time.monotonic())
+            if len(attempts) <= 2:
+                raise ConnectionError(None)
+            return 'done'
+
+        assert_that(await scheduler.submit('stream', flaky, loop=event_loop),
+                    equal_to('done'))
+        assert_that(len(attempts), equal_to(3))
+        # Paused once the circuit opened, after the second failure
+        assert_that(attempts[2] - attempts[1],
+                    greater_than_or_equal_to(0.04))
+        assert_that(breaker.state, equal_to(CircuitBreaker.CLOSED))
+        # Lowered to 1 by failures, and raised back by the success
+        assert_that(limit.value, equal_to(2))
+
+    @pytest.mark.asyncio
+    async def test_retry_gives_up(self, executor, event_loop):
+        scheduler = UploadScheduler(
+            executor, 1, breaker=CircuitBreaker(cooldown=0))
+        attempts = []
+
+        def fail():
+            attempts.append(None)
+            raise ConnectionError(None)
+
+        with pytest.raises(ConnectionError):
+            await scheduler.submit('stream', fail, loop=event_loop)
+        assert_that(len(attempts), equal_to(MAX_ATTEMPTS))
+
+        def invalid():
+            raise ValueError()
+
+        with pytest.raises(ValueError):
+            await scheduler.submit('stream', invalid, loop=event_loop)
+        assert_that(scheduler._running, equal_to(0))
+
+    @pytest.mark.asyncio
+    async def test_failed_probe(self, executor, event_loop):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+        scheduler = UploadScheduler(executor, 1, breaker=breaker)
+        attempts = []
+
+        def flaky():
+            attempts.append(None)
+            if len(attempts) == 1:
+                raise ConnectionError(None)
+            raise ValueError()
+
+        # Opened by the first attempt and probed by the retry
+        with pytest.raises(ValueError):
+            await scheduler.submit('stream', flaky, loop=event_loop)
+
+        assert_that(await asyncio.wait_for(
+            scheduler.submit('other', lambda: 1, loop=event_loop), 1),
+            equal_to(1))
+        assert_that(breaker.state, equal_to(CircuitBreaker.CLOSED))
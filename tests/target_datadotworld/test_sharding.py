@@ -0,0 +1,217 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+
+import asyncio
+import multiprocessing
+from os import path
+
+import pytest
+from doublex import assert_that, ProxySpy, called
+from hamcrest import equal_to, contains_inanyorder, has_length, \
+    has_entries, greater_than
+from target_datadotworld.api_client import ApiClient
+from target_datadotworld.exceptions import WorkerError, \
+    UnparseableMessageError
+from target_datadotworld.sharding import ShardedTarget, shard_for
+
+
+class TestShardedTarget(object):
+    @pytest.fixture()
+    def uploads_file(self, tmpdir):
+        return str(tmpdir.join('uploads.txt'))
+
+    @pytest.fixture()
+    def api_client(self, monkeypatch, uploads_file):
+        async def append_stream_chunked(
+                self, owner, dataset, stream, queue, chunk_size, loop):
+            while True:
+                batch = await queue.get_batch()
+                if batch is None:
+                    break
+                with open(uploads_file, 'a') as f:
+                    for _ in batch:
+                        f.write('{}\n'.format(stream))
+
+        monkeypatch.setattr(ApiClient, 'append_stream_chunked',
+                            append_stream_chunked)
+        monkeypatch.setattr(ApiClient,
+                            'connection_check', lambda self: True)
+        monkeypatch.setattr(ApiClient, 'get_dataset',
+                            lambda self, o, d: {'status': 'LOADED'})
+        monkeypatch.setattr(ApiClient, 'set_stream_schema',
+                            lambda self, o, d, s, **k: {})
+        monkeypatch.setattr(ApiClient, 'sync',
+                            lambda self, o, d: {})
+
+        return ProxySpy(ApiClient('no_token_needed'))
+
+    @pytest.fixture()
+    def target(self, sample_config, api_client):
+        return ShardedTarget(sample_config, api_client=api_client,
+                             mp_context=multiprocessing.get_context('fork'))
+
+    @pytest.fixture()
+    def sample_config(self):
+        return {
+            'api_token': 'eyJhbGciOiJIUzUxMiJ9.eyJzdWIiOiJwcm9kLXVzZXItY2xpZW'
+                         '50OnJhZmFlbCIsImlzcyI6ImFnZW50OnJhZmFlbDo6YjY1NTgxO'
+                         'DItMjRkNy00MWZiLTkxNTAtNjZlNDBhNjNjNjQ5IiwiaWF0Ijox'
+                         'NTA1MTY0NTQ4LCJyb2xlIjpbInVzZXJfYXBpX3JlYWQiLCJ1c2V'
+                         'yX2FwaV93cml0ZSJdLCJnZW5lcmFsLXB1cnBvc2UiOnRydWV9.n'
+                         '9FsdsBZ03wx0A-QK1wq2tGyinaqUcjaotp-rnWCMoMOY83ivypu'
+                         'B3FcjTGzJPFIGZbJsES_bx0itijwz5mQvg',
+            'dataset_id': 'my-dataset',
+            'dataset_owner': 'rafael',
+            'worker_processes': 2
+        }
+
+    @pytest.mark.asyncio
+    async def test_process_multi_state(self, target, api_client,
+                                       uploads_file, test_files_path):
+        with open(path.join(test_files_path,
+                            'fixerio-multistate.jsonl')) as file:
+            states = [s async for s in target.process_lines(file)]
+
+        assert_that(states, has_length(3))
+        with open(uploads_file) as f:
+            assert_that(f.read().splitlines(), contains_inanyorder(
+                *(['exchange-rate'] * 3 + ['exchange-rate-2'] * 3)))
+        assert_that(api_client.sync, called().times(1))
+
+    @pytest.mark.asyncio
+    async def test_incremental_sync(self, sample_config, api_client,
+                                    test_files_path):
+        sample_config['sync_record_count'] = 1
+        target = ShardedTarget(sample_config, api_client=api_client,
+                               mp_context=multiprocessing.get_context('fork'))
+        with open(path.join(test_files_path,
+                            'fixerio-multistate.jsonl')) as file:
+            states = [s async for s in target.process_lines(file)]
+
+        assert_that(states, has_length(3))
+        assert_that(api_client.sync, called().times(greater_than(1)))
+
+    @pytest.mark.asyncio
+    async def test_process_bulk_load(self, sample_config, api_client,
+                                     monkeypatch, tmpdir):
+        monkeypatch.setattr(ApiClient, 'get_current_version',
+                            lambda self, o, d, s: 1)
+        monkeypatch.setattr(ApiClient, 'truncate_stream_records',
+                            lambda self, o, d, s: {})
+        monkeypatch.setattr(ApiClient, 'upload_file',
+                            lambda self, o, d, n, p: {})
+        sample_config['bulk_load'] = True
+        sample_config['bulk_load_dir'] = str(tmpdir)
+        target = ShardedTarget(sample_config, api_client=api_client,
+                               mp_context=multiprocessing.get_context('fork'))
+
+        lines = [
+            '{"type": "SCHEMA", "stream": "a", "key_properties": [], '
+            '"schema": {"properties": {"id": {"type": "integer"}}}}',
+            '{"type": "ACTIVATE_VERSION", "stream": "a", "version": 2}']
+        for n in range(3):
+            lines.append('{"type": "RECORD", "stream": "a", '
+                         '"record": {"id": %d}, "version": 2}' % n)
+            lines.append('{"type": "STATE", "value": {"n": %d}}' % n)
+        lines.extend([
+            '{"type": "ACTIVATE_VERSION", "stream": "a", "version": 2}',
+            '{"type": "STATE", "value": {"n": "final"}}'])
+        states = [s async for s in target.process_lines(lines)]
+
+        # States held back during the bulk load are emitted as well
+        assert_that(states, equal_to(
+            [{'n': 0}, {'n': 1}, {'n': 2}, {'n': 'final'}]))
+
+    @pytest.mark.asyncio
+    async def test_process_linger(self, sample_config, api_client,
+                                  monkeypatch, uploads_file, event_loop):
+        async def append_stream_chunked(
+                self, owner, dataset, stream, queue, chunk_size, loop):
+            while True:
+                batch = await queue.get_batch()
+                if batch is None:
+                    break
+                with open(uploads_file, 'a') as f:
+                    f.write('{}\n'.format(len(batch)))
+
+        monkeypatch.setattr(ApiClient, 'append_stream_chunked',
+                            append_stream_chunked)
+
+        async def slow_tap():
+            yield [b'{"type": "SCHEMA", "stream": "a", '
+                   b'"key_properties": [], "schema": {"properties": '
+                   b'{"id": {"type": "integer"}}}}\n']
+            for i in range(3):
+                yield [b'{"type": "RECORD", "stream": "a", '
+                       b'"record": {"id": %d}}\n' % i]
+                await asyncio.sleep(0.3)  # Slower than the linger time
+
+        sample_config['linger_seconds'] = 0.05
+        target = ShardedTarget(sample_config, api_client=api_client,
+                               mp_context=multiprocessing.get_context('fork'))
+        async for _ in target.process_lines(  # noqa: F841
+                slow_tap(), loop=event_loop):
+            pass
+
+        # Handed over as they lingered, not all at the end
+        with open(uploads_file) as f:
+            assert_that(f.read().splitlines(), equal_to(['1', '1', '1']))
+
+    @pytest.mark.asyncio
+    async def test_process_worker_error(self, target, api_client,
+                                        test_files_path):
+        with pytest.raises(WorkerError):
+            with open(path.join(test_files_path,
+                                'fixerio-noschema.jsonl')) as file:
+                async for _ in target.process_lines(file):  # noqa: F841
+                    pass
+        assert_that(api_client.sync, called().times(0))
+
+    def test_send_to_dead_worker(self, target):
+        context = multiprocessing.get_context('fork')
+        process = context.Process(target=lambda: None)
+        process.start()
+        process.join()
+
+        inbox = context.Queue(maxsize=1)
+        inbox.put(['line'])
+        target._workers = [process]
+        target._inboxes = [inbox]
+        target._outbox = context.Queue()
+        with pytest.raises(WorkerError):
+            target._put(0, ['line'])
+
+
+def test_shard_for():
+    assert_that(shard_for('exchange_rate', 4),
+                equal_to(shard_for('exchange_rate', 4)))
+    assert_that({shard_for('stream_{}'.format(i), 4) for i in range(20)},
+                equal_to({0, 1, 2, 3}))
+
+
+def test_parse():
+    for line in ('{"type": "RECORD", "stream": "s", "record": {"id": 1}}',
+                 b'{"type": "RECORD", "stream": "s", "record": {"id": 1}}',
+                 '{"stream": "s", "type": "RECORD", "record": {"id": 1}}'):
+        assert_that(ShardedTarget._parse(line), has_entries(
+            {'type': 'RECORD', 'stream': 's'}))
+    assert_that(ShardedTarget._parse('{"type": "STATE", "value": 1}'),
+                has_entries({'value': 1}))
+    with pytest.raises(UnparseableMessageError):
+        ShardedTarget._parse('{"type": "STATE"')
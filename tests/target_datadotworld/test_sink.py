@@ -0,0 +1,107 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import gzip
+import json
+from os import path
+
+import pytest
+from doublex import assert_that
+from hamcrest import equal_to, greater_than, has_entries, has_item, \
+    instance_of
+
+from target_datadotworld.memory import MemoryTracker
+from target_datadotworld.sink import LocalSinkClient
+from target_datadotworld.target import TargetDataDotWorld
+
+
+class TestLocalSinkClient(object):
+    @pytest.fixture()
+    def sample_config(self, tmpdir):
+        return {
+            'api_token': 'eyJhbGciOiJIUzUxMiJ9.eyJzdWIiOiJwcm9kLXVzZXItY2xpZW'
+                         '50OnJhZmFlbCIsImlzcyI6ImFnZW50OnJhZmFlbDo6YjY1NTgxO'
+                         'DItMjRkNy00MWZiLTkxNTAtNjZlNDBhNjNjNjQ5IiwiaWF0Ijox'
+                         'NTA1MTY0NTQ4LCJyb2xlIjpbInVzZXJfYXBpX3JlYWQiLCJ1c2V'
+                         'yX2FwaV93cml0ZSJdLCJnZW5lcmFsLXB1cnBvc2UiOnRydWV9.n'
+                         '9FsdsBZ03wx0A-QK1wq2tGyinaqUcjaotp-rnWCMoMOY83ivypu'
+                         'B3FcjTGzJPFIGZbJsES_bx0itijwz5mQvg',
+            'dataset_id': 'my-dataset',
+            'dataset_owner': 'rafael',
+            'sink_dir': str(tmpdir.join('sink'))
+        }
+
+    def test_config(self, sample_config):
+        target = TargetDataDotWorld(sample_config)
+        assert_that(target._api_client, instance_of(LocalSinkClient))
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('compress', [False, True])
+    async def test_process_lines(self, sample_config, test_files_path,
+                                 tmpdir, compress):
+        sample_config['sink_compress'] = compress
+        sample_config['sink_latency'] = 0.01
+        target = TargetDataDotWorld(sample_config, batch_size=2)
+
+        with open(path.join(test_files_path,
+                            'fixerio-multistate.jsonl')) as file:
+            states = [s async for s in target.process_lines(file)]
+        assert_that(len(states), equal_to(3))
+
+        stream_dir = tmpdir.join('sink', 'exchange-rate')
+        records = []
+        for batch in sorted(stream_dir.listdir()):
+            data = batch.read_binary()
+            if compress:
+                data = gzip.decompress(data)
+            records.extend(json.loads(line) for line in
+                           data.decode('utf-8').splitlines())
+        assert_that(len(records), equal_to(3))
+        assert_that(records[0], has_entries({'singer_version': None}))
+
+        with tmpdir.join('sink', 'acks.jsonl').open() as f:
+            acks = [json.loads(line) for line in f]
+        assert_that(acks, has_item(has_entries({
+            'operation': 'append', 'stream': 'exchange-rate'})))
+        assert_that(acks[-1], has_entries({'operation': 'sync'}))
+
+    @pytest.mark.asyncio
+    async def test_incremental_sync(self, sample_config, test_files_path,
+                                    tmpdir):
+        sample_config['sync_record_count'] = 1
+        sample_config['sync_wait'] = True
+        target = TargetDataDotWorld(sample_config, batch_size=2)
+
+        with open(path.join(test_files_path,
+                            'fixerio-multistate.jsonl')) as file:
+            states = [s async for s in target.process_lines(file)]
+        assert_that(len(states), equal_to(3))
+
+        with tmpdir.join('sink', 'acks.jsonl').open() as f:
+            operations = [json.loads(line)['operation'] for line in f]
+        assert_that(operations.count('sync'), greater_than(1))
+        assert_that(operations[-1], equal_to('dataset'))
+
+    def test_append_stream_memory(self, tmpdir):
+        tracker = MemoryTracker()
+        client = LocalSinkClient('no_token_needed', str(tmpdir.join('sink')),
+                                 compress=True, memory_tracker=tracker)
+        client.append_stream('rafael', 'my-dataset', 'exchange-rate',
+                             [{'id': i} for i in range(100)])
+
+        assert_that(tracker._total, equal_to(0))
@@ -0,0 +1,136 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import asyncio
+import threading
+
+import pytest
+from doublex import assert_that
+from hamcrest import equal_to, has_item, has_properties
+from singer import metrics
+
+from target_datadotworld.syncing import SyncTrigger
+
+
+class TestSyncTrigger(object):
+    @pytest.mark.asyncio
+    async def test_record_count(self, event_loop):
+        syncs = []
+        trigger = SyncTrigger(lambda: syncs.append(1), None, record_count=2)
+
+        trigger.record_received()
+        trigger.checkpoint(event_loop)
+        await asyncio.sleep(0.01)
+        assert_that(len(syncs), equal_to(0))
+
+        trigger.record_received()
+        trigger.checkpoint(event_loop)
+        await asyncio.sleep(0.01)
+        assert_that(len(syncs), equal_to(1))
+
+        await trigger.finish(event_loop)
+        assert_that(len(syncs), equal_to(2))
+
+    @pytest.mark.asyncio
+    async def test_interval(self, event_loop):
+        syncs = []
+        trigger = SyncTrigger(lambda: syncs.append(1), None, interval=0)
+
+        trigger.checkpoint(event_loop)  # Nothing to sync
+        trigger.record_received()
+        trigger.checkpoint(event_loop)
+        await trigger.finish(event_loop)
+        assert_that(len(syncs), equal_to(2))
+
+    @pytest.mark.asyncio
+    async def test_debounce(self, event_loop):
+        release = threading.Event()
+        syncs = []
+
+        def sync():
+            syncs.append(1)
+            release.wait(5)
+
+        trigger = SyncTrigger(sync, None, record_count=1)
+        trigger.record_received()
+        trigger.checkpoint(event_loop)
+        await asyncio.sleep(0.01)
+        trigger.record_received()
+        trigger.checkpoint(event_loop)
+        await asyncio.sleep(0.01)
+        assert_that(len(syncs), equal_to(1))
+
+        release.set()
+        await trigger.finish(event_loop)
+        assert_that(len(syncs), equal_to(2))
+
+    @pytest.mark.asyncio
+    async def test_started_at_checkpoint(self, event_loop):
+        started = threading.Event()
+        trigger = SyncTrigger(started.set, None, record_count=1)
+        trigger.record_received()
+        trigger.checkpoint(event_loop)
+
+        # Without giving control back to the event loop
+        assert_that(started.wait(1), equal_to(True))
+        await trigger.finish(event_loop)
+
+    @pytest.mark.asyncio
+    async def test_failure(self, event_loop):
+        def sync():
+            raise RuntimeError()
+
+        trigger = SyncTrigger(sync, None, record_count=1)
+        trigger.record_received()
+        trigger.checkpoint(event_loop)
+        await asyncio.sleep(0.01)
+        trigger.record_received()
+        with pytest.raises(RuntimeError):
+            trigger.checkpoint(event_loop)
+
+    @pytest.mark.asyncio
+    async def test_wait(self, event_loop, monkeypatch):
+        points = []
+        monkeypatch.setattr(metrics, 'log',
+                            lambda logger, point: points.append(point))
+        statuses = iter(['INGESTING', 'INGESTING', 'LOADED'])
+
+        trigger = SyncTrigger(lambda: None, lambda: next(statuses),
+                              wait=True, poll_interval=0)
+        trigger.record_received()
+        await trigger.finish(event_loop)
+
+        assert_that(points, has_item(has_properties(
+            metric='sync_freshness')))
+        assert_that(points, has_item(has_properties(
+            metric='sync_ingestion', tags={'status': 'succeeded'})))
+
+    @pytest.mark.asyncio
+    async def test_wait_timeout(self, event_loop, monkeypatch):
+        points = []
+        monkeypatch.setattr(metrics, 'log',
+                            lambda logger, point: points.append(point))
+
+        trigger = SyncTrigger(lambda: None, lambda: 'INGESTING',
+                              wait=True, poll_interval=0.01,
+                              wait_timeout=0.05)
+        trigger.record_received()
+        await trigger.finish(event_loop)
+
+        assert_that(points, has_item(has_properties(
+            metric='sync_ingestion', tags={'status': 'timeout'})))
@@ -17,19 +17,26 @@
 # This product includes software developed at
 # data.world, Inc.(http://data.world/).
 
+import gzip
 import json
+import os
+import threading
 import time
 from copy import copy
 from os import path
 
 import pytest
 from doublex import assert_that, ProxySpy, called, Stub, never
-from hamcrest import (has_entries, equal_to, not_none, only_contains, empty)
+from hamcrest import (has_entries, equal_to, not_none, only_contains, empty,
+                      greater_than, less_than, anything)
 from requests import Request, Response
 from target_datadotworld.api_client import ApiClient
 from target_datadotworld.exceptions import ConfigError, NotFoundError, \
-    UnparseableMessageError, MissingSchemaError
+    UnparseableMessageError, MissingSchemaError, InvalidRecordError, \
+    InvalidDatasetStateError, UnauthorizedError
+from target_datadotworld.flow_control import CircuitBreaker
 from target_datadotworld.target import TargetDataDotWorld
+from target_datadotworld.utils import read_file_blocks
 
 
 class TestTarget(object):
@@ -46,10 +53,9 @@ class TestTarget(object):
         async def append_stream_chunked(
                 self, owner, dataset, stream, queue, chunk_size, loop):
             while True:
-                item = await queue.get()
+                batch = await queue.get_batch()
                 time.sleep(2)  # Required delay
-                queue.task_done()
-                if item is None:
+                if batch is None:
                     break
 
         monkeypatch.setattr(ApiClient, 'append_stream_chunked',
@@ -116,6 +122,43 @@ class TestTarget(object):
         target = TargetDataDotWorld(sample_config)
         assert_that(target.config, has_entries(sample_config))
 
+    def test_config_flow_control(self, sample_config):
+        sample_config.update({'max_upload_threads': 16,
+                              'adaptive_concurrency': True,
+                              'circuit_breaker': True})
+        target = TargetDataDotWorld(sample_config)
+        scheduler = target._api_client._scheduler
+        assert_that(scheduler._max_concurrency, equal_to(16))
+        assert_that(scheduler._capacity(), equal_to(10))
+        assert_that(scheduler._breaker.state,
+                    equal_to(CircuitBreaker.CLOSED))
+
+    def test_config_adaptive_ceiling(self, sample_config):
+        sample_config['adaptive_concurrency'] = True
+        target = TargetDataDotWorld(sample_config)
+        scheduler = target._api_client._scheduler
+        assert_that(scheduler._max_concurrency, equal_to(50))
+        assert_that(scheduler._capacity(), equal_to(10))
+
+        sample_config.update({'max_upload_threads': 4,
+                              'adaptive_max_upload_threads': 40})
+        target = TargetDataDotWorld(sample_config)
+        scheduler = target._api_client._scheduler
+        assert_that(scheduler._max_concurrency, equal_to(40))
+        assert_that(scheduler._capacity(), equal_to(4))
+
+    def test_config_routes(self, sample_config):
+        sample_config['dataset_routes'] = [
+            {'streams': 'orders_*', 'dataset_id': 'orders'},
+            {'streams': 'users', 'dataset_id': 'users',
+             'dataset_owner': 'acme'}]
+        target = TargetDataDotWorld(sample_config)
+        assert_that(target._dataset_for('orders_2017'),
+                    equal_to(('rafael', 'orders')))
+        assert_that(target._dataset_for('users'), equal_to(('acme', 'users')))
+        assert_that(target._dataset_for('other'),
+                    equal_to(('rafael', 'my-dataset')))
+
     def test_config_incomplete(self, sample_config):
         incomplete_config = {
             'dataset_id': sample_config['dataset_id']
@@ -127,6 +170,33 @@ class TestTarget(object):
         with pytest.raises(ConfigError):
             TargetDataDotWorld(invalid_config)
 
+    def test_config_stream_weights(self, sample_config):
+        sample_config['stream_weights'] = {'Exchange Rate': 2.5}
+        target = TargetDataDotWorld(sample_config)
+        assert_that(target._api_client._scheduler.weight('exchange-rate'),
+                    equal_to(2.5))
+
+    @pytest.mark.asyncio
+    async def test_process_stream_linger(self, sample_config, api_client,
+                                         monkeypatch, test_files_path):
+        lingers = {}
+
+        async def append_stream_chunked(
+                self, owner, dataset, stream, queue, chunk_size, loop):
+            lingers[stream] = queue.linger
+            while await queue.get_batch() is not None:
+                pass
+
+        monkeypatch.setattr(ApiClient, 'append_stream_chunked',
+                            append_stream_chunked)
+        # Keyed by stream name, like stream_weights
+        sample_config['stream_linger_seconds'] = {'Exchange Rate': 0.5}
+        target = TargetDataDotWorld(sample_config, api_client=api_client)
+        with open(path.join(test_files_path, 'fixerio.jsonl')) as file:
+            async for _ in target.process_lines(file):  # noqa: F841
+                pass
+        assert_that(lingers, equal_to({'exchange-rate': 0.5}))
+
     @pytest.mark.asyncio
     async def test_process_lines(self, target, api_client, test_files_path):
         with open(path.join(test_files_path, 'fixerio.jsonl')) as file:
@@ -135,6 +205,15 @@ class TestTarget(object):
             assert_that(result[0], equal_to(
                 json.loads('{"start_date": "2017-11-09"}')))
 
+    @pytest.mark.asyncio
+    async def test_process_lines_binary(self, target, api_client,
+                                        test_files_path):
+        with open(path.join(test_files_path, 'fixerio.jsonl'), 'rb') as file:
+            result = [s async for s in target.process_lines(file)]
+            assert_that(api_client.append_stream_chunked, called().times(1))
+            assert_that(result[0], equal_to(
+                json.loads('{"start_date": "2017-11-09"}')))
+
     @pytest.mark.asyncio
     async def test_process_lines_new_dataset(self, target, api_client,
                                              test_files_path, monkeypatch):
@@ -212,3 +291,343 @@ class TestTarget(object):
             async for _ in target.process_lines(file):  # noqa: F841
                 pass
             assert_that(api_client.truncate_stream_records, called().times(1))
+
+    @pytest.mark.asyncio
+    async def test_process_invalid_record(self, target):
+        lines = [
+            '{"type": "SCHEMA", "stream": "s", "key_properties": [], '
+            '"schema": {"properties": {"id": {"type": "integer"}}}}',
+            '{"type": "RECORD", "stream": "s", "record": {"id": "a"}}'
+        ]
+        with pytest.raises(InvalidRecordError):
+            async for _ in target.process_lines(lines):  # noqa: F841
+                pass
+
+    @pytest.mark.asyncio
+    async def test_process_invalid_record_not_validated(
+            self, sample_config, api_client):
+        lines = [
+            '{"type": "SCHEMA", "stream": "s", "key_properties": [], '
+            '"schema": {"properties": {"id": {"type": "integer"}}}}',
+            '{"type": "RECORD", "stream": "s", "record": {"id": "a"}}'
+        ]
+        sample_config['validation_mode'] = 'off'
+        target = TargetDataDotWorld(sample_config, api_client=api_client)
+        async for _ in target.process_lines(lines):  # noqa: F841
+            pass
+        assert_that(api_client.append_stream_chunked, called().times(1))
+
+    @pytest.mark.asyncio
+    async def test_process_upload_error(self, sample_config, api_client,
+                                        monkeypatch):
+        async def append_stream_chunked(
+                self, owner, dataset, stream, queue, chunk_size, loop):
+            while True:
+                batch = await queue.get_batch()
+                if batch is None:
+                    break
+                if stream == 'a' and any(
+                        item.record['id'] > 0 for item in batch):
+                    raise UnauthorizedError(None, None)
+
+        monkeypatch.setattr(ApiClient, 'append_stream_chunked',
+                            append_stream_chunked)
+
+        lines_read = 0
+
+        def lines():
+            nonlocal lines_read
+            for stream in ('a', 'b'):
+                yield ('{"type": "SCHEMA", "stream": "%s", '
+                       '"key_properties": [], "schema": {"properties": '
+                       '{"id": {"type": "integer"}}}}' % stream)
+            for i in range(10000):
+                if i == 2:
+                    yield '{"type": "STATE", "value": {"id": 1}}'
+                lines_read += 1
+                yield ('{"type": "RECORD", "stream": "%s", '
+                       '"record": {"id": %d}}' % ('ab'[i % 2], i))
+
+        target = TargetDataDotWorld(sample_config, api_client=api_client,
+                                    batch_size=10)
+        states = []
+        with pytest.raises(UnauthorizedError):
+            async for state in target.process_lines(lines()):
+                states.append(state)
+
+        assert_that(states, equal_to([{'id': 1}]))
+        assert_that(lines_read, less_than(100))
+
+    @pytest.mark.asyncio
+    async def test_process_bulk_load(self, sample_config, api_client,
+                                     api_stub, test_files_path, tmpdir):
+        sample_config['bulk_load'] = True
+        sample_config['bulk_load_dir'] = str(tmpdir)
+        client = ProxySpy(ApiClient('no_token_needed', api_url=api_stub.url))
+        target = TargetDataDotWorld(sample_config, api_client=client)
+
+        with open(path.join(test_files_path,
+                            'fixerio-new-version.jsonl')) as file:
+            states = [s async for s in target.process_lines(file)]
+
+        assert_that(states, equal_to([{'start_date': '2017-11-09'}]))
+        assert_that(client.truncate_stream_records, called().times(1))
+        assert_that(client.append_stream_chunked, never(called()))
+        assert_that(client.upload_file, called().times(1))
+
+        method, url, _, body = api_stub.requests[0]
+        assert_that(url, equal_to('/v0/uploads/rafael/my-dataset/files/'
+                                  'exchange_rate.jsonl.gz'))
+        records = [json.loads(line) for line in
+                   gzip.decompress(body).decode('utf-8').splitlines()]
+        assert_that(records[0], has_entries({
+            'singer_version': '654321', 'USD': 1.0}))
+        assert_that(tmpdir.listdir(), empty())
+
+    @pytest.mark.asyncio
+    async def test_process_prefetch_versions(self, sample_config, api_client,
+                                             test_files_path):
+        sample_config['prefetch_versions'] = True
+        target = TargetDataDotWorld(sample_config, api_client=api_client)
+        with open(path.join(test_files_path,
+                            'fixerio-multistream.jsonl')) as file:
+            async for _ in target.process_lines(file):  # noqa: F841
+                pass
+            assert_that(api_client.get_current_version, called().times(2))
+
+    @pytest.mark.asyncio
+    async def test_process_cached_version(self, sample_config, api_client,
+                                          test_files_path, tmpdir):
+        sample_config['version_cache'] = str(tmpdir.join('versions.json'))
+        for _ in range(2):
+            target = TargetDataDotWorld(sample_config, api_client=api_client)
+            with open(path.join(test_files_path,
+                                'fixerio-new-version.jsonl')) as file:
+                async for _ in target.process_lines(file):  # noqa: F841
+                    pass
+        assert_that(api_client.get_current_version, called().times(1))
+        assert_that(api_client.truncate_stream_records, called().times(1))
+
+    @pytest.mark.asyncio
+    async def test_process_routed_streams(self, sample_config, api_client,
+                                          test_files_path):
+        sample_config['dataset_routes'] = [
+            {'streams': '*2', 'dataset_id': 'other-dataset'}]
+        target = TargetDataDotWorld(sample_config, api_client=api_client)
+        with open(path.join(test_files_path,
+                            'fixerio-multistream.jsonl')) as file:
+            async for _ in target.process_lines(file):  # noqa: F841
+                pass
+
+        assert_that(api_client.connection_check, called().times(1))
+        for dataset in ('my-dataset', 'other-dataset'):
+            assert_that(api_client.get_dataset,
+                        called().with_args('rafael', dataset))
+            assert_that(api_client.sync,
+                        called().with_args('rafael', dataset))
+        assert_that(api_client.append_stream_chunked, called().with_args(
+            'rafael', 'my-dataset', 'exchange-rate', anything(),
+            anything(), loop=anything()))
+        assert_that(api_client.append_stream_chunked, called().with_args(
+            'rafael', 'other-dataset', 'exchange-rate-2', anything(),
+            anything(), loop=anything()))
+
+    @pytest.mark.asyncio
+    async def test_process_repeated_schema(self, target, api_client):
+        schema = ('{"type": "SCHEMA", "stream": "s", "key_properties": '
+                  '["id"], "schema": {"properties": {"id": '
+                  '{"type": "%s"}}}}')
+        lines = [schema % 'integer',
+                 '{"type": "RECORD", "stream": "s", "record": {"id": 1}}',
+                 schema % 'integer',
+                 '{"type": "RECORD", "stream": "s", "record": {"id": 2}}',
+                 schema % 'number']
+        async for _ in target.process_lines(lines):  # noqa: F841
+            pass
+        assert_that(api_client.set_stream_schema, called().times(2))
+
+    @pytest.mark.asyncio
+    async def test_process_cached_schema(self, sample_config, api_client,
+                                         test_files_path, tmpdir):
+        sample_config['schema_cache'] = str(tmpdir.join('schemas.json'))
+        for _ in range(2):
+            target = TargetDataDotWorld(sample_config, api_client=api_client)
+            with open(path.join(test_files_path, 'fixerio.jsonl')) as file:
+                async for _ in target.process_lines(file):  # noqa: F841
+                    pass
+        assert_that(api_client.set_stream_schema, called().times(1))
+
+    @pytest.mark.asyncio
+    async def test_process_shared_schema_cache(self, sample_config,
+                                               api_client, tmpdir):
+        sample_config['schema_cache'] = str(tmpdir.join('schemas.json'))
+        schema = ('{"type": "SCHEMA", "stream": "s", "key_properties": '
+                  '["id"], "schema": {"properties": {"id": '
+                  '{"type": "%s"}}}}')
+        targets = [TargetDataDotWorld(sample_config, api_client=api_client)
+                   for _ in range(2)]
+
+        # Each sets the schema the other set last, in its own session
+        for target, schema_type in zip(targets * 2, ['integer', 'number'] * 2):
+            async for _ in target.process_lines(  # noqa: F841
+                    [schema % schema_type]):
+                pass
+        assert_that(api_client.set_stream_schema, called().times(4))
+
+    @pytest.mark.asyncio
+    async def test_process_lines_during_startup(self, target, monkeypatch,
+                                                test_files_path):
+        started = threading.Event()
+        checked = []
+        lines_read_before_check = []
+        started_before_end = []
+
+        def connection_check(self):
+            started.set()
+            time.sleep(1)
+            checked.append(True)
+
+        monkeypatch.setattr(ApiClient, 'connection_check', connection_check)
+
+        def read_lines(file):
+            lines = list(file)
+            for i, line in enumerate(lines):
+                if i == len(lines) - 1:
+                    # Checks run on their own, while input is still read
+                    started_before_end.append(started.wait(0.5))
+                if len(checked) == 0:
+                    lines_read_before_check.append(line)
+                yield line
+
+        with open(path.join(test_files_path, 'fixerio.jsonl')) as file:
+            states = [s async for s in target.process_lines(read_lines(file))]
+
+        assert_that(states, equal_to([{'start_date': '2017-11-09'}]))
+        assert_that(len(lines_read_before_check), equal_to(3))
+        assert_that(started_before_end, equal_to([True]))
+
+    @pytest.mark.asyncio
+    async def test_process_lines_linger(self, sample_config, api_client,
+                                        monkeypatch, event_loop):
+        batches = []
+
+        async def append_stream_chunked(
+                self, owner, dataset, stream, queue, chunk_size, loop):
+            while True:
+                batch = await queue.get_batch()
+                if batch is None:
+                    break
+                batches.append(len(batch))
+
+        monkeypatch.setattr(ApiClient, 'append_stream_chunked',
+                            append_stream_chunked)
+
+        read_fd, write_fd = os.pipe()
+
+        def write_lines():
+            with open(write_fd, 'wb') as f:
+                f.write(b'{"type": "SCHEMA", "stream": "a", '
+                        b'"key_properties": [], "schema": {"properties": '
+                        b'{"id": {"type": "integer"}}}}\n')
+                for i in range(3):
+                    # Slower than the linger time
+                    f.write(b'{"type": "RECORD", "stream": "a", '
+                            b'"record": {"id": %d}}\n' % i)
+                    f.flush()
+                    time.sleep(0.3)
+
+        writer = threading.Thread(target=write_lines)
+        writer.start()
+        sample_config['linger_seconds'] = 0.05
+        target = TargetDataDotWorld(sample_config, api_client=api_client)
+        with open(read_fd, 'rb') as file:
+            async for _ in target.process_lines(  # noqa: F841
+                    read_file_blocks(file, loop=event_loop),
+                    loop=event_loop):
+                pass
+        writer.join()
+
+        # Handed over as they lingered, not all at the end
+        assert_that(batches, equal_to([1, 1, 1]))
+
+    @pytest.mark.asyncio
+    async def test_process_lines_startup_error(self, target, monkeypatch,
+                                               test_files_path):
+        def get_dataset(self, owner, dataset):
+            return {'status': 'INGESTING'}
+
+        monkeypatch.setattr(ApiClient, 'get_dataset', get_dataset)
+
+        with pytest.raises(InvalidDatasetStateError):
+            with open(path.join(test_files_path, 'fixerio.jsonl')) as file:
+                async for _ in target.process_lines(file):  # noqa: F841
+                    pass
+
+    @pytest.mark.asyncio
+    async def test_process_cached_dataset(self, sample_config, api_client,
+                                          test_files_path, tmpdir):
+        sample_config['dataset_cache'] = str(tmpdir.join('datasets.json'))
+        for _ in range(2):
+            target = TargetDataDotWorld(sample_config, api_client=api_client)
+            with open(path.join(test_files_path, 'fixerio.jsonl')) as file:
+                async for _ in target.process_lines(file):  # noqa: F841
+                    pass
+        assert_that(api_client.connection_check, called().times(1))
+        assert_that(api_client.get_dataset, called().times(1))
+
+    @pytest.mark.asyncio
+    async def test_process_passthrough(self, sample_config, api_stub,
+                                       test_files_path):
+        def uploaded_records():
+            records = []
+            for method, url, _, body in api_stub.requests:
+                if method == 'POST' and url.startswith('/v0/streams/'):
+                    records.extend(json.loads(line) for line in
+                                   body.decode('utf-8').splitlines())
+                    del records[-1]['singer_timestamp']
+            return records
+
+        api_stub.bodies['/v0/datasets/rafael/my-dataset'] = {
+            'status': 'LOADED'}
+
+        results = []
+        for passthrough in [False, True]:
+            del api_stub.requests[:]
+            sample_config['passthrough_records'] = passthrough
+            client = ApiClient('no_token_needed', api_url=api_stub.url)
+            target = TargetDataDotWorld(sample_config, api_client=client)
+            with open(path.join(test_files_path,
+                                'fixerio-multistate.jsonl'), 'rb') as file:
+                async for _ in target.process_lines(file):  # noqa: F841
+                    pass
+            results.append(uploaded_records())
+
+        assert_that(len(results[1]), equal_to(6))
+        assert_that(results[1], equal_to(results[0]))
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('bulk_load', [False, True])
+    async def test_process_memory_accounting(self, sample_config, api_stub,
+                                             test_files_path, bulk_load,
+                                             tmpdir):
+        api_stub.bodies['/v0/datasets/rafael/my-dataset'] = {
+            'status': 'LOADED'}
+        sample_config['memory_accounting'] = True
+        sample_config['bulk_load'] = bulk_load
+        sample_config['bulk_load_dir'] = str(tmpdir)
+        sample_config['api_url'] = api_stub.url
+        target = TargetDataDotWorld(sample_config)
+
+        with open(path.join(test_files_path,
+                            'fixerio-new-version.jsonl')) as file:
+            async for _ in target.process_lines(file):  # noqa: F841
+                pass
+
+        tracker = target._memory_tracker
+        report = tracker.report()
+        assert_that(report['peak_rss'], greater_than(0))
+        assert_that(report['peak_buffered_by_stream']['exchange-rate'],
+                    has_entries({'queued': greater_than(0),
+                                 'batched': greater_than(0)}))
+        # Every record buffered was let go of
+        assert_that(tracker._total, equal_to(0))
@@ -0,0 +1,90 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+import json
+from collections import Counter
+
+import pytest
+from doublex import assert_that
+from hamcrest import equal_to, has_entries
+
+from target_datadotworld.target import TargetDataDotWorld
+from target_datadotworld.tracing import BatchTracer
+
+
+def test_tracer(tmpdir):
+    trace_file = str(tmpdir.join('trace.json'))
+    tracer = BatchTracer(trace_file)
+    for _ in range(3):
+        t = tracer.now()
+        tracer.record_queued('stream', t, t + 1, t + 3)
+    trace = tracer.start_batch('stream', 2)
+    trace.submitted()
+    trace.finish()
+    tracer.close()
+
+    with open(trace_file) as f:
+        events = json.load(f)
+    spans = {e['name']: e for e in events if e['ph'] == 'b'}
+    assert_that(spans['batch']['args'], has_entries(
+        {'stream': 'stream', 'records': 2}))
+    ends = {e['name']: e for e in events if e['ph'] == 'e'}
+    assert_that(ends['read']['ts'] - spans['read']['ts'],
+                equal_to(2 * 1e6))
+    assert_that(ends['parse']['ts'] - spans['parse']['ts'],
+                equal_to(4 * 1e6))
+    assert_that(ends['batch']['args'], equal_to({'failed': True}))
+
+
+@pytest.mark.asyncio
+async def test_process_traced_lines(tmpdir, api_stub):
+    trace_file = str(tmpdir.join('trace.json'))
+    config = {
+        'api_token': 'eyJhbGciOiJIUzUxMiJ9.eyJzdWIiOiJwcm9kLXVzZXItY2xpZW'
+                     '50OnJhZmFlbCIsImlzcyI6ImFnZW50OnJhZmFlbDo6YjY1NTgxO'
+                     'DItMjRkNy00MWZiLTkxNTAtNjZlNDBhNjNjNjQ5IiwiaWF0Ijox'
+                     'NTA1MTY0NTQ4LCJyb2xlIjpbInVzZXJfYXBpX3JlYWQiLCJ1c2V'
+                     'yX2FwaV93cml0ZSJdLCJnZW5lcmFsLXB1cnBvc2UiOnRydWV9.n'
+                     '9FsdsBZ03wx0A-QK1wq2tGyinaqUcjaotp-rnWCMoMOY83ivypu'
+                     'B3FcjTGzJPFIGZbJsES_bx0itijwz5mQvg',
+        'dataset_id': 'my-dataset',
+        'dataset_owner': 'rafael',
+        'api_url': api_stub.url,
+        'trace_file': trace_file
+    }
+    api_stub.bodies['/v0/datasets/rafael/my-dataset'] = {'status': 'LOADED'}
+
+    lines = ['{"type": "SCHEMA", "stream": "s", "key_properties": [], '
+             '"schema": {"properties": {"id": {"type": "integer"}}}}']
+    lines += ['{"type": "RECORD", "stream": "s", "record": {"id": %d}}' % i
+              for i in range(25)]
+    target = TargetDataDotWorld(config, batch_size=10)
+    async for _ in target.process_lines(lines):  # noqa: F841
+        pass
+
+    with open(trace_file) as f:
+        events = [e for e in json.load(f) if e['ph'] in ('b', 'e')]
+    assert_that(Counter(e['id'] for e in events if e['name'] == 'batch'),
+                equal_to({1: 2, 2: 2, 3: 2}))
+    assert_that(
+        sorted({e['name'] for e in events if e['id'] == 1}),
+        equal_to(['acknowledge', 'batch', 'executor_wait', 'http_request',
+                  'parse', 'queue_wait', 'read', 'serialize', 'validate']))
+    assert_that(sum(e['args']['records'] for e in events
+                    if e['name'] == 'batch' and e['ph'] == 'b'),
+                equal_to(25))
@@ -17,16 +17,19 @@
 # This product includes software developed at
 # data.world, Inc.(http://data.world/).
 
+import asyncio
+import io
 import json
+import sys
 from functools import reduce
 from math import ceil
 
 import pytest
 from doublex import assert_that
-from hamcrest import equal_to
+from hamcrest import equal_to, is_not, instance_of
 
 from target_datadotworld.utils import to_chunks, to_jsonlines, \
-    to_stream_id
+    to_stream_id, read_file_blocks, schema_fingerprint, new_event_loop
 
 
 def test_to_jsonline():
@@ -54,3 +57,65 @@ async def test_to_chunks(records_queue):
 ])
 def test_to_streamid(text, streamid):
     assert_that(to_stream_id(text), equal_to(streamid))
+
+
+@pytest.mark.parametrize('implementation', ['asyncio', 'uvloop'])
+def test_new_event_loop(implementation):
+    loop = new_event_loop(implementation)
+    try:
+        assert_that(loop.run_until_complete(asyncio.sleep(0, 'done')),
+                    equal_to('done'))
+    finally:
+        loop.close()
+
+
+def test_new_event_loop_uvloop_missing(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'uvloop', None)
+    loop = new_event_loop('uvloop')
+    try:
+        assert_that(loop, instance_of(asyncio.BaseEventLoop))
+    finally:
+        loop.close()
+
+
+def test_schema_fingerprint():
+    schema = {'properties': {'id': {'type': 'integer'},
+                             'name': {'type': 'string'}}}
+    reordered = {'properties': {'name': {'type': 'string'},
+                                'id': {'type': 'integer'}}}
+
+    assert_that(schema_fingerprint(['id'], 'id', schema),
+                equal_to(schema_fingerprint(['id'], 'id', reordered)))
+    assert_that(schema_fingerprint(['id'], 'id', schema),
+                is_not(schema_fingerprint(['name'], 'id', schema)))
+
+
+@pytest.mark.parametrize('block_size', [1, 3, 7, 1024])
+@pytest.mark.parametrize('data,lines', [
+    (b'', []),
+    (b'{"a": 1}', [b'{"a": 1}']),
+    (b'{"a": 1}\n', [b'{"a": 1}\n']),
+    (b'{"a": 1}\n{"b": "\xc3\xa9"}\n',
+     [b'{"a": 1}\n', b'{"b": "\xc3\xa9"}\n']),
+    (b'{"a": 1}\n\n{"b": 2}', [b'{"a": 1}\n', b'\n', b'{"b": 2}'])
+])
+@pytest.mark.asyncio
+async def test_read_file_blocks(tmpdir, data, lines, block_size, event_loop):
+    async def read(file):
+        return [line async for block in read_file_blocks(
+            file, loop=event_loop, block_size=block_size) for line in block]
+
+    path = tmpdir.join('input.jsonl')
+    path.write_binary(data)
+    with path.open('rb') as f:
+        assert_that(await read(f), equal_to(lines))
+    assert_that(await read(io.BytesIO(data)), equal_to(lines))
+
+
+@pytest.mark.asyncio
+async def test_read_file_blocks_unreferenced_file(tmpdir, event_loop):
+    path = tmpdir.join('input.jsonl')
+    path.write_binary(b'{"a": 1}\n{"b": 2}\n')
+    blocks = [block async for block in read_file_blocks(
+        open(str(path), 'rb'), loop=event_loop)]
+    assert_that(sum(len(block) for block in blocks), equal_to(2))
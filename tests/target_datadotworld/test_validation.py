@@ -0,0 +1,115 @@
+# target-datadotworld
+# Copyright 2017 data.world, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the
+# License.
+#
+# You may obtain a copy of the License at
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied. See the License for the specific language governing
+# permissions and limitations under the License.
+#
+# This product includes software developed at
+# data.world, Inc.(http://data.world/).
+
+import pytest
+from doublex import assert_that
+from hamcrest import equal_to, calling, raises, is_not
+from jsonschema import ValidationError, SchemaError, validate
+
+from target_datadotworld.validation import compile_validator, \
+    stream_validator
+
+SINGER_SCHEMA = {
+    'type': ['null', 'object'],
+    'properties': {
+        'id': {'type': 'integer', 'minimum': 0},
+        'name': {'type': ['null', 'string'], 'maxLength': 5},
+        'updated_at': {'type': ['null', 'string'], 'format': 'date-time'},
+        'price': {'type': ['null', 'number']},
+        'active': {'type': 'boolean'},
+        'tags': {'type': ['null', 'array'], 'items': {'type': 'string'}},
+        'address': {
+            'type': 'object',
+            'properties': {'zip': {'type': 'string'}},
+            'required': ['zip'],
+            'additionalProperties': False
+        }
+    }
+}
+
+
+@pytest.mark.parametrize('record', [
+    {},
+    {'id': 1, 'name': 'a', 'updated_at': '2017-11-08T00:00:00Z'},
+    {'id': 0, 'name': None, 'price': 1.5, 'active': False},
+    {'tags': ['a', 'b'], 'address': {'zip': '10001'}},
+    {'tags': None, 'unknown': {'anything': 'goes'}},
+    {'id': -1},
+    {'id': 1.0},
+    {'id': True},
+    {'name': 'too long'},
+    {'price': '1.5'},
+    {'active': 1},
+    {'tags': [1]},
+    {'address': {}},
+    {'address': {'zip': '10001', 'street': 'Main St'}},
+    None,
+    [],
+])
+def test_compile_validator(record):
+    validator = compile_validator(SINGER_SCHEMA)
+
+    try:
+        validate(record, SINGER_SCHEMA)
+        expected_error = None
+    except ValidationError as e:
+        expected_error = e.message
+
+    try:
+        validator(record)
+        actual_error = None
+    except ValidationError as e:
+        actual_error = e.message
+
+    assert_that(actual_error, equal_to(expected_error))
+
+
+def test_compile_validator_unsupported():
+    schema = {
+        'type': 'object',
+        'properties': {
+            'id': {'anyOf': [{'type': 'integer'}, {'type': 'string'}]}
+        }
+    }
+    validator = compile_validator(schema)
+    validator({'id': 'abc'})
+    assert_that(calling(validator).with_args({'id': 1.5}),
+                raises(ValidationError))
+
+
+def test_compile_validator_invalid_schema():
+    validator = compile_validator({'type': 'not_a_type'})
+    assert_that(calling(validator).with_args({}), raises(SchemaError))
+
+
+def test_stream_validator_sampled():
+    validator = stream_validator({'type': 'integer'},
+                                 mode='sampled', sample_rate=3)
+    assert_that(calling(validator).with_args('first'),
+                raises(ValidationError))
+    validator('second')
+    validator('third')
+    assert_that(calling(validator).with_args('fourth'),
+                raises(ValidationError))
+
+
+def test_stream_validator_off():
+    validator = stream_validator({'type': 'integer'}, mode='off')
+    assert_that(calling(validator).with_args('abc'),
+                is_not(raises(ValidationError)))